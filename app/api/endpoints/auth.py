@@ -1,54 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
-from fastapi.security import OAuth2PasswordRequestForm, HTTPBearer
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from app.core import security
 from app.models import models
 from app.schemas import schemas
-from app.models.database import get_db
-from typing import Optional
-from jose import JWTError, jwt
+from app.models.database import get_async_db
 
 router = APIRouter()
-security_scheme = HTTPBearer()
-
-async def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(security_scheme)
-) -> models.User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        # Verify JWT token
-        payload = jwt.decode(
-            token.credentials, 
-            security.SECRET_KEY, 
-            algorithms=[security.ALGORITHM]
-        )
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-
-    # Get user from database
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None:
-        raise credentials_exception
-    return user
 
 @router.post("/register", response_model=schemas.Token)
-async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(models.User).filter(models.User.email == user.email))
+    db_user = result.scalars().first()
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    hashed = security.get_password_hash(user.password)
+    hashed = await security.hash_password(user.password)
     db_user = models.User(
         email=user.email,
         username=user.username,
@@ -57,13 +28,13 @@ async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     
     try:
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
         access_token = security.create_access_token(data={"sub": user.email})
         return {"access_token": access_token, "token_type": "bearer"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating user: {str(e)}"
@@ -72,15 +43,24 @@ async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
 @router.post("/token", response_model=schemas.Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not security.verify_password(form_data.password, user.password_hash):
+    result = await db.execute(select(models.User).filter(models.User.email == form_data.username))
+    user = result.scalars().first()
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await security.verify_and_update_password(form_data.password, user.password_hash)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    if new_hash:
+        # Upgrade hashes made with an old cost setting
+        user.password_hash = new_hash
+        await db.commit()
     
     access_token = security.create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
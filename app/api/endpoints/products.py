@@ -1,114 +1,201 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Optional, Tuple
+from datetime import datetime
 from app.models import models
 from app.schemas import schemas
-from app.models.database import get_db
-from app.services.recommendation import RecommendationService
-from app.core.security import oauth2_scheme, verify_token
-from sqlalchemy import or_, func
+from app.models.database import get_async_db, SessionLocal, AsyncSessionLocal
+from app.services.interaction_buffer import InteractionBuffer, BufferFull
+from app.services.request_coalescer import RequestCoalescer, create_coalescer
+from app.services.product_search import (
+    search_page, stream_search, parse_expand, expand_items, InvalidSearchRequest, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+)
+from app.core.cache import redis_client, response_cache
+from app.core.auth import get_current_user
+from app.core.monitoring import PerformanceMonitor
+from app.core.serialization import (
+    FAST_RESPONSES, FastJSONResponse, PRODUCT_FIELDS, RECOMMENDATION_FIELDS, dumps, encode_item, encode_list, project
+)
+import asyncio
+import threading
 
 router = APIRouter()
-recommendation_service = RecommendationService()
-
-# Add this function to verify the current user
-async def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> models.User:
-    email = verify_token(token)
-    if email is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    return user
+SEARCH_CACHE_TTL = 60
+
+# Created on first use by get_recommendation_service()
+recommendation_service = None
+# Opt-in micro-batching of concurrent recommendation requests (RECOMMENDATION_COALESCE_MS)
+recommendation_coalescer: Optional[RequestCoalescer] = None
+_service_lock = threading.Lock()
+
+def get_recommendation_service():
+    """The recommendation service, created on first use.
+
+    Creating it imports NumPy, SciPy and the candidate pipeline, so the worker
+    does it as a warm-up step rather than while the API module is imported.
+    """
+    global recommendation_service, recommendation_coalescer
+    if recommendation_service is None:
+        with _service_lock:
+            if recommendation_service is None:
+                from app.services.recommendation import create_service
+                from app.services.precomputed import PrecomputedStore
+
+                service = create_service(
+                    redis_client=redis_client,
+                    precomputed=PrecomputedStore(redis_client=redis_client)
+                )
+                recommendation_coalescer = create_coalescer(service, AsyncSessionLocal)
+                recommendation_service = service
+    return recommendation_service
+
+async def _interactions_flushed(user_ids, product_ids):
+    """Bring in-memory structures up to date after buffered interactions are written."""
+    service = get_recommendation_service()
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(service.stats_index.refresh, product_ids)
+        scope_tags = await db.run_sync(service.products_changed, product_ids)
+    # Batched Redis writes, off the event loop
+    await asyncio.to_thread(service.users_changed, sorted(user_ids))
+    await response_cache.invalidate_tags(
+        [f"product:{product_id}" for product_id in product_ids]
+        + [f"user:{user_id}" for user_id in user_ids]
+        + scope_tags
+    )
+
+interaction_buffer = InteractionBuffer(AsyncSessionLocal, on_flush=_interactions_flushed)
 
 @router.get("/search", response_model=List[schemas.ProductResponse])
 async def search_products(
+    response: Response,
     query: str = Query(..., description="Search term in product name or description"),
     category: Optional[str] = Query(None, description="Category name"),
     min_price: Optional[float] = Query(None, description="Minimum price filter"),
     max_price: Optional[float] = Query(None, description="Maximum price filter"),
     sort_by: str = Query("relevance", description="Sorting criteria (relevance, price_asc, price_desc, rating)"),
-    db: Session = Depends(get_db)
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    expand: Optional[str] = Query(None, description="Comma-separated relationships to include (category, feedback)"),
+    output: str = Query("json", alias="format", description="json for one page, ndjson to stream every match"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Search products with filtering and sorting capabilities.
+    Results are paginated; the next page cursor is returned in the X-Next-Cursor header.
     No authentication required.
     """
     try:
-        products_query = db.query(models.Product)
+        params = dict(
+            query=query,
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            sort_by=sort_by,
+            expand=parse_expand(expand)
+        )
 
-        if query:
-            products_query = products_query.filter(
-                or_(
-                    models.Product.name.ilike(f"%{query}%"),
-                    models.Product.description.ilike(f"%{query}%")
-                )
+        if output == "ndjson":
+            return StreamingResponse(
+                _stream_ndjson(params),
+                media_type="application/x-ndjson"
             )
 
-        if category:
-            products_query = products_query.join(
-                models.Category,
-                models.Product.category_id == models.Category.category_id
-            ).filter(models.Category.name.ilike(f"%{category}%"))
-
-        if min_price is not None:
-            products_query = products_query.filter(models.Product.price >= min_price)
-        if max_price is not None:
-            products_query = products_query.filter(models.Product.price <= max_price)
-
-        if sort_by == "price_asc":
-            products_query = products_query.order_by(models.Product.price.asc())
-        elif sort_by == "price_desc":
-            products_query = products_query.order_by(models.Product.price.desc())
-        elif sort_by == "rating":
-            products_query = products_query.outerjoin(models.UserInteraction)\
-                .group_by(models.Product.product_id)\
-                .order_by(func.avg(models.UserInteraction.rating).desc())
-            
-        return products_query.all()
+        stats_index = get_recommendation_service().stats_index
+
+        async def compute():
+            products, next_cursor = await db.run_sync(
+                search_page, limit=limit, cursor=cursor, stats_index=stats_index, **params
+            )
+            return {"products": products, "next_cursor": next_cursor}
 
+        page = await response_cache.get_or_compute(
+            "search",
+            dict(params, limit=limit, cursor=cursor),
+            compute,
+            ttl=SEARCH_CACHE_TTL,
+            tags=lambda page: [f"product:{p['product_id']}" for p in page["products"]]
+        )
+        if page["next_cursor"]:
+            response.headers["X-Next-Cursor"] = page["next_cursor"]
+        if FAST_RESPONSES:
+            # Internal data already matches ProductResponse; skip re-validation
+            return FastJSONResponse(
+                encode_list(page["products"], PRODUCT_FIELDS),
+                headers=dict(response.headers)
+            )
+        return page["products"]
+
+    except InvalidSearchRequest as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error searching products: {str(e)}"
         )
 
+def _stream_ndjson(params: dict):
+    # The request session is closed before the body streams, so use our own
+    db = SessionLocal()
+    try:
+        for product in stream_search(db, stats_index=get_recommendation_service().stats_index, **params):
+            yield encode_item(product, PRODUCT_FIELDS) + b"\n"
+    finally:
+        db.close()
+
 @router.get("/recommendations", response_model=List[schemas.RecommendationResponse])
+@PerformanceMonitor.track_recommendation_performance
 async def get_recommendations(
     user_id: int = Query(..., description="User ID to get recommendations for"),
-    limit: int = Query(5, description="Number of recommendations to return"),
+    limit: int = Query(5, ge=1, le=50, description="Number of recommendations to return"),
     category: Optional[str] = Query(None, description="Filter recommendations by category"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get personalized product recommendations for a user.
     No authentication required.
     """
-    try:
+    service = get_recommendation_service()
+
+    async def compute():
+        if recommendation_coalescer is not None:
+            recommendations = await recommendation_coalescer.recommend(user_id, limit, category)
+            if recommendations is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User not found"
+                )
+            return recommendations
+
         # Verify user exists
-        user = db.query(models.User).filter(models.User.user_id == user_id).first()
+        user = await db.get(models.User, user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
 
-        recommendations = await recommendation_service.get_recommendations(
-            user_id=user_id,
-            db=db,
-            limit=limit,
-            category=category
+        return await service.recommend_async(db, user_id, limit, category)
+
+    try:
+        recommendations = await response_cache.get_or_compute(
+            "recommendations",
+            {"user_id": user_id, "limit": limit, "category": category},
+            compute,
+            ttl=service.cache_timeout,
+            # Rating changes can move any product of the category into the list,
+            # so lists are also tagged with their category scope
+            tags=lambda recommendations: [f"user:{user_id}", service.scope_tag(category)] + [
+                f"product:{r['product_id']}" for r in recommendations
+            ]
         )
+        if FAST_RESPONSES:
+            return FastJSONResponse(encode_list(recommendations, RECOMMENDATION_FIELDS))
         return recommendations
 
     except HTTPException as he:
@@ -118,93 +205,215 @@ async def get_recommendations(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error generating recommendations: {str(e)}"
         )
+
+@router.post("/recommendations/batch")
+async def get_batch_recommendations(
+    batch: schemas.BatchRecommendationRequest,
+    current_user: schemas.CurrentUser = Depends(get_current_user)
+):
+    """
+    Recommendations for many users in one call, streamed as NDJSON in request order.
+    Each line holds user_id, limit, category and recommendations (or an error).
+    Requires authentication.
+    """
+    requests = [(item.user_id, item.limit, item.category) for item in batch.requests]
+    return StreamingResponse(
+        _stream_batch_recommendations(requests),
+        media_type="application/x-ndjson"
+    )
+
+def _stream_batch_recommendations(requests: list):
+    db = SessionLocal()
+    try:
+        results = get_recommendation_service().recommend_many(db, requests)
+        for (user_id, limit, category), (_, recommendations) in zip(requests, results):
+            line = {"user_id": user_id, "limit": limit, "category": category}
+            if recommendations is None:
+                line["error"] = "User not found"
+            else:
+                line["recommendations"] = [project(r, RECOMMENDATION_FIELDS) for r in recommendations]
+            yield dumps(line) + b"\n"
+    finally:
+        db.close()
+
 @router.post("/feedback", response_model=schemas.FeedbackResponse)
 async def submit_feedback(
     feedback: schemas.FeedbackCreate,
-    current_user: models.User = Depends(get_current_user),  # Changed this line
-    db: Session = Depends(get_db)
+    current_user: schemas.CurrentUser = Depends(get_current_user),  # Changed this line
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Submit user feedback for a product.
     Requires authentication.
     """
+    service = get_recommendation_service()
     try:
-        # Verify product exists
-        product = db.query(models.Product).filter(
-            models.Product.product_id == feedback.product_id
-        ).first()
-        if not product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Product not found"
-            )
+        db_feedback, previous_rating, existed = await db.run_sync(_record_feedback, feedback)
+        await service.user_profiles.apply_rating_async(
+            db,
+            feedback.user_id,
+            feedback.product_id,
+            feedback.rating,
+            previous_rating=previous_rating,
+            existed=existed
+        )
+        scope_tags = await db.run_sync(service.products_changed, [feedback.product_id])
+        service.user_changed(feedback.user_id)
+        await response_cache.invalidate_tags([
+            f"product:{feedback.product_id}",
+            f"user:{feedback.user_id}"
+        ] + scope_tags)
+        return db_feedback
 
-        # Verify user exists
-        user = db.query(models.User).filter(
-            models.User.user_id == feedback.user_id
-        ).first()
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error submitting feedback: {str(e)}"
+        )
 
-        # Verify rating is within valid range
-        if feedback.rating < 1 or feedback.rating > 5:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Rating must be between 1 and 5"
-            )
+def _record_feedback(db: Session, feedback: schemas.FeedbackCreate) -> Tuple[models.UserFeedback, Optional[int], bool]:
+    """Store the feedback and update aggregates (run via `AsyncSession.run_sync`).
+
+    Returns the feedback, the interaction's previous rating and whether the
+    interaction existed, for updating the user's profile.
+    """
+    from app.services.product_stats import apply_interaction_delta
 
-        db_feedback = models.UserFeedback(
+    # Verify product exists
+    product = db.query(models.Product).filter(
+        models.Product.product_id == feedback.product_id
+    ).first()
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+
+    # Verify user exists
+    user = db.query(models.User).filter(
+        models.User.user_id == feedback.user_id
+    ).first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
+    # Verify rating is within valid range
+    if feedback.rating < 1 or feedback.rating > 5:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Rating must be between 1 and 5"
+        )
+
+    db_feedback = models.UserFeedback(
+        user_id=feedback.user_id,
+        product_id=feedback.product_id,
+        rating=feedback.rating,
+        feedback_text=feedback.feedback_text
+    )
+    db.add(db_feedback)
+    
+    interaction = db.query(models.UserInteraction).filter(
+        models.UserInteraction.user_id == feedback.user_id,
+        models.UserInteraction.product_id == feedback.product_id
+    ).first()
+    
+    previous_rating = interaction.rating if interaction else None
+    if interaction:
+        interaction.rating = feedback.rating
+        apply_interaction_delta(
+            db,
+            feedback.product_id,
+            rating_delta=feedback.rating - (previous_rating or 0),
+            rating_count_delta=0 if previous_rating is not None else 1
+        )
+    else:
+        new_interaction = models.UserInteraction(
             user_id=feedback.user_id,
             product_id=feedback.product_id,
             rating=feedback.rating,
-            feedback_text=feedback.feedback_text
-        )
-        db.add(db_feedback)
-        
-        interaction = db.query(models.UserInteraction).filter(
-            models.UserInteraction.user_id == feedback.user_id,
-            models.UserInteraction.product_id == feedback.product_id
-        ).first()
-        
-        if interaction:
-            interaction.rating = feedback.rating
-        else:
-            new_interaction = models.UserInteraction(
-                user_id=feedback.user_id,
-                product_id=feedback.product_id,
-                rating=feedback.rating,
-                view_count=1
-            )
-            db.add(new_interaction)
+            view_count=1
+        )
+        db.add(new_interaction)
+        apply_interaction_delta(
+            db,
+            feedback.product_id,
+            rating_delta=feedback.rating,
+            rating_count_delta=1,
+            interaction_delta=1,
+            view_delta=1
+        )
 
-        db.commit()
-        db.refresh(db_feedback)
-        return db_feedback
+    db.commit()
+    db.refresh(db_feedback)
+    get_recommendation_service().stats_index.refresh(db, [feedback.product_id])
+    return db_feedback, previous_rating, interaction is not None
 
-    except Exception as e:
-        db.rollback()
+@router.post(
+    "/interactions/batch",
+    response_model=schemas.InteractionBatchResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def ingest_interactions(
+    batch: schemas.InteractionBatch,
+    current_user: schemas.CurrentUser = Depends(get_current_user)
+):
+    """
+    Queue a batch of interaction events (views, purchases, ratings).
+    Events are coalesced per user and product and written in bulk shortly after.
+    Requires authentication.
+    """
+    try:
+        accepted = await interaction_buffer.add(batch.events)
+    except BufferFull as e:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error submitting feedback: {str(e)}"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"}
         )
+    return {"accepted": accepted, "pending": interaction_buffer.pending}
+
+async def _unchanged_since(db: AsyncSession, product_id: int, built_at: datetime) -> bool:
+    result = await db.execute(
+        select(models.Product.updated_at).filter(models.Product.product_id == product_id)
+    )
+    updated_at = result.scalar()
+    return updated_at is not None and updated_at < built_at
 
 @router.get("/{product_id}", response_model=schemas.ProductResponse)
 async def get_product(
     product_id: int,
-    current_user: models.User = Depends(get_current_user),  # Changed this line
-    db: Session = Depends(get_db)
+    current_user: schemas.CurrentUser = Depends(get_current_user),  # Changed this line
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get detailed information about a specific product.
     Requires authentication.
     """
+    from app.services.catalog_snapshot import catalog_snapshot
+
     try:
-        product = db.query(models.Product).filter(
-            models.Product.product_id == product_id
-        ).first()
+        # Product fields come from the shared catalog snapshot when it has them
+        # and the row has not been written since the snapshot was built;
+        # then only the feedback is read from the database
+        snapshot = catalog_snapshot.get()
+        item = snapshot.product(product_id) if snapshot is not None else None
+        if item is not None and await _unchanged_since(db, product_id, snapshot.built_at):
+            product = (await db.run_sync(expand_items, [item], ("category", "feedback")))[0]
+            if FAST_RESPONSES:
+                return FastJSONResponse(encode_item(product, PRODUCT_FIELDS))
+            return product
+
+        result = await db.execute(
+            select(models.Product)
+            .options(selectinload(models.Product.category), selectinload(models.Product.feedback))
+            .filter(models.Product.product_id == product_id)
+        )
+        product = result.scalars().first()
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -212,6 +421,8 @@ async def get_product(
             )
         return product
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -0,0 +1,102 @@
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import event, select
+from collections import OrderedDict
+from typing import Optional, Tuple
+from app.core import security
+from app.models import models
+from app.models.database import AsyncSessionLocal
+from app.schemas import schemas
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+# Upper bound on how long a user stays cached, so deletions made by other
+# processes are noticed before long-lived tokens expire
+AUTH_CACHE_MAX_AGE = float(os.getenv("AUTH_CACHE_MAX_AGE", "300"))
+
+class AuthCache:
+    """Bounded LRU of token -> user snapshot.
+
+    An entry expires with its token's `exp` claim (or after `max_age`,
+    whichever comes first), so a cached token is never honoured for longer
+    than decoding it would be.
+    """
+
+    def __init__(self, max_size: int = AUTH_CACHE_SIZE, max_age: float = AUTH_CACHE_MAX_AGE):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, schemas.CurrentUser]]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[schemas.CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: schemas.CurrentUser, token_exp: Optional[float]) -> None:
+        expires_at = time.time() + self.max_age
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            self._entries[token] = (expires_at, user)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in [token for token, (_, user) in self._entries.items() if user.user_id == user_id]:
+                del self._entries[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+auth_cache = AuthCache()
+
+async def get_current_user(token: str = Depends(security.oauth2_scheme)) -> schemas.CurrentUser:
+    """The user a bearer token belongs to; cached hits touch neither JWT nor database."""
+    user = auth_cache.get(token)
+    if user is not None:
+        return user
+
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    payload = security.decode_token(token)
+    if payload is None:
+        raise credentials_exception
+    email = payload.get("sub")
+    if email is None:
+        raise credentials_exception
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(models.User.user_id, models.User.email, models.User.username)
+            .filter(models.User.email == email)
+        )
+        row = result.first()
+    if row is None:
+        raise credentials_exception
+
+    user = schemas.CurrentUser(user_id=row.user_id, email=row.email, username=row.username)
+    auth_cache.put(token, user, payload.get("exp"))
+    return user
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    auth_cache.invalidate_user(target.user_id)
@@ -1,9 +1,222 @@
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-from fastapi_cache.decorator import cache
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+from fastapi.encoders import jsonable_encoder
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
 import redis
+import logging
 
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+logger = logging.getLogger(__name__)
 
-def init_cache():
-    FastAPICache.init(RedisBackend(redis_client), prefix="fastapi-cache")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Seconds before a Redis call gives up, so an unreachable Redis degrades to a cache miss
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+# Options for every client, sync or async
+REDIS_OPTIONS = {"socket_timeout": REDIS_SOCKET_TIMEOUT, "socket_connect_timeout": REDIS_SOCKET_TIMEOUT}
+
+# Sync client for binary values (user profile vectors)
+redis_client = redis.Redis.from_url(REDIS_URL, **REDIS_OPTIONS)
+
+def make_key(namespace: str, params: Dict[str, Any]) -> str:
+    """Cache key from normalized parameters: None dropped, strings lowercased and trimmed."""
+    normalized = {}
+    for name, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.lower().split())
+        normalized[name] = value
+    digest = hashlib.sha1(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{namespace}:{digest}"
+
+class ResponseCache:
+    """Two-tier cache: an in-process LRU in front of an optional async Redis.
+
+    Concurrent misses for the same key share one computation in this process
+    (a waiter takes over if the caller computing it is cancelled), and a short
+    Redis lock keeps other workers from recomputing it at the same time.
+    Entries carry tags (e.g. "product:42") for targeted invalidation. The
+    local tier is kept short-lived because other workers' invalidations
+    only reach it through expiry.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        prefix: str = "cache",
+        local_size: int = 1024,
+        local_ttl: float = 5.0,
+        lock_timeout: float = 10.0
+    ):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.local_size = local_size
+        self.local_ttl = local_ttl
+        self.lock_timeout = lock_timeout
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._local_tags: Dict[str, Set[str]] = {}
+        self._key_tags: Dict[str, Set[str]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int,
+        tags: Optional[Callable[[Any], Iterable[str]]] = None
+    ) -> Any:
+        key = make_key(namespace, params)
+        value = self._local_get(key)
+        if value is not None:
+            return value
+
+        while key in self._inflight:
+            inflight = self._inflight[key]
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # This caller was cancelled, not the computation
+            # The leader was cancelled; the first waiter to get here takes over
+            value = self._local_get(key)
+            if value is not None:
+                return value
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._fetch(key, compute, ttl, tags)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else is waiting
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            del self._inflight[key]
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        tags = set(tags)
+        for tag in tags:
+            for key in self._local_tags.pop(tag, set()):
+                self._local_drop(key)
+
+        if self.redis is None:
+            return
+        try:
+            for tag in tags:
+                tag_key = self._tag_key(tag)
+                keys = await self.redis.smembers(tag_key)
+                await self.redis.delete(tag_key, *keys)
+        except redis.RedisError as e:
+            logger.warning(f"Error invalidating cache tags: {str(e)}")
+
+    def clear_local(self) -> None:
+        self._local.clear()
+        self._local_tags.clear()
+        self._key_tags.clear()
+
+    async def _fetch(self, key, compute, ttl, tags) -> Any:
+        redis_key = f"{self.prefix}:{key}"
+        lock_key = f"{redis_key}:lock"
+        token = None
+
+        if self.redis is not None:
+            try:
+                cached = await self.redis.get(redis_key)
+                if cached is not None:
+                    value = json.loads(cached)
+                    self._local_put(key, value, tags)
+                    return value
+
+                token = uuid.uuid4().hex
+                acquired = await self.redis.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+                if not acquired:
+                    token = None
+                    value = await self._wait_for(redis_key)
+                    if value is not None:
+                        self._local_put(key, value, tags)
+                        return value
+            except redis.RedisError as e:
+                logger.warning(f"Error reading cache: {str(e)}")
+                token = None
+
+        value = jsonable_encoder(await compute())
+        self._local_put(key, value, tags)
+
+        if self.redis is not None:
+            try:
+                await self.redis.set(redis_key, json.dumps(value), ex=ttl)
+                for tag in self._tags_for(value, tags):
+                    tag_key = self._tag_key(tag)
+                    await self.redis.sadd(tag_key, redis_key)
+                    await self.redis.expire(tag_key, ttl)
+                if token is not None and await self.redis.get(lock_key) in (token, token.encode()):
+                    await self.redis.delete(lock_key)
+            except redis.RedisError as e:
+                logger.warning(f"Error writing cache: {str(e)}")
+
+        return value
+
+    async def _wait_for(self, redis_key: str) -> Any:
+        # Another worker holds the lock; poll briefly for its result
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.01
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            cached = await self.redis.get(redis_key)
+            if cached is not None:
+                return json.loads(cached)
+            delay = min(delay * 2, 0.2)
+        return None
+
+    def _local_get(self, key: str) -> Any:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._local_drop(key)
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _local_put(self, key: str, value: Any, tags) -> None:
+        if self.local_size <= 0:
+            return
+        self._local_drop(key)
+        self._local[key] = (time.monotonic() + self.local_ttl, value)
+        key_tags = set(self._tags_for(value, tags))
+        self._key_tags[key] = key_tags
+        for tag in key_tags:
+            self._local_tags.setdefault(tag, set()).add(key)
+        while len(self._local) > self.local_size:
+            self._local_drop(next(iter(self._local)))
+
+    def _local_drop(self, key: str) -> None:
+        self._local.pop(key, None)
+        for tag in self._key_tags.pop(key, set()):
+            keys = self._local_tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._local_tags[tag]
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}:tag:{tag}"
+
+    @staticmethod
+    def _tags_for(value: Any, tags) -> Iterable[str]:
+        return tags(value) if tags is not None else ()
+
+response_cache = ResponseCache()
+
+def init_cache(async_redis_client) -> None:
+    response_cache.redis = async_redis_client
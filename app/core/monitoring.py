@@ -1,4 +1,10 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.responses import Response
+from contextvars import ContextVar
+from typing import Optional
+import functools
 import time
 
 RECOMMENDATION_LATENCY = Histogram(
@@ -9,10 +15,139 @@ RECOMMENDATION_REQUESTS = Counter(
     'recommendation_requests_total',
     'Total number of recommendation requests'
 )
+RECOMMENDATION_STAGE_LATENCY = Histogram(
+    'recommendation_stage_seconds',
+    'Time spent in each stage of the recommendation pipeline',
+    ['stage']
+)
+RECOMMENDATION_GENERATOR_DROPPED = Counter(
+    'recommendation_generator_dropped_total',
+    'Candidate generators left out of a recommendation for running over budget or failing',
+    ['generator', 'reason']
+)
+RECOMMENDATION_BATCH_SIZE = Histogram(
+    'recommendation_coalesced_batch_size',
+    'Distinct recommendation requests scored together by the request coalescer',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+STARTUP_SECONDS = Gauge(
+    'startup_seconds',
+    'Seconds this worker spent importing the app and warming up',
+    ['phase']
+)
+PASSWORD_HASH_QUEUE_WAIT = Histogram(
+    'password_hash_queue_wait_seconds',
+    'Time password hash/verify jobs wait for a worker thread',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+HTTP_REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route template',
+    ['method', 'route']
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight',
+    'HTTP requests currently being served',
+    ['method']
+)
+HTTP_REQUEST_ERRORS = Counter(
+    'http_request_errors_total',
+    'HTTP requests that ended in a 5xx response or an unhandled exception',
+    ['method', 'route', 'status']
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request',
+    'Number of SQL statements executed per HTTP request',
+    ['route'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+DB_TIME_PER_REQUEST = Histogram(
+    'db_time_per_request_seconds',
+    'Time spent executing SQL statements per HTTP request',
+    ['route']
+)
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+# Set per request by MetricsMiddleware; the object is shared (not copied) with
+# threadpool workers and run_sync greenlets, so their queries are counted too
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_times"].pop()
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - started
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests, errors and DB usage per route.
+
+    Routes are labelled by their path template (e.g. "/products/{product_id}")
+    so ids do not blow up label cardinality. The template is only known once
+    routing has run, so the in-flight gauge is labelled by method alone.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status_code = 500
+            raise
+        finally:
+            route = self._route_template(scope)
+            HTTP_REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - start_time)
+            in_flight.dec()
+            if status_code >= 500:
+                HTTP_REQUEST_ERRORS.labels(method, route, str(status_code)).inc()
+            DB_QUERIES_PER_REQUEST.labels(route).observe(stats.count)
+            DB_TIME_PER_REQUEST.labels(route).observe(stats.seconds)
+            _query_stats.reset(token)
+
+    @staticmethod
+    def _route_template(scope) -> str:
+        # Routing stores the matched route in the scope; its path is the template
+        route = scope.get("route")
+        if route is None:
+            return "unmatched"
+        # Recent FastAPI versions keep routers' routes unprefixed and record the
+        # prefixed template of the match separately
+        effective = scope.get("fastapi", {}).get("effective_route_context")
+        return getattr(effective, "path_format", None) or route.path
 
 class PerformanceMonitor:
     @staticmethod
-    async def track_recommendation_performance(func):
+    def track_recommendation_performance(func):
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             start_time = time.time()
             RECOMMENDATION_REQUESTS.inc()
@@ -22,4 +157,12 @@ class PerformanceMonitor:
                 return result
             finally:
                 RECOMMENDATION_LATENCY.observe(time.time() - start_time)
-        return wrapper
\ No newline at end of file
+        return wrapper
+
+    @staticmethod
+    def stage(name: str):
+        """Context manager timing one stage of the recommendation pipeline."""
+        return RECOMMENDATION_STAGE_LATENCY.labels(name).time()
+
+def metrics_response() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
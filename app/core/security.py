@@ -1,15 +1,40 @@
 
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from fastapi.security import OAuth2PasswordBearer  
+from app.core.monitoring import PASSWORD_HASH_QUEUE_WAIT
+import asyncio
+import functools
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
 
 # OAuth2 configuration
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")  
 
-# Password hashing configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing configuration; stored hashes with a different cost are
+# upgraded on the next successful login
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+@functools.lru_cache(maxsize=None)
+def pwd_context():
+    # passlib and python-jose (with its cryptography backends) are slow to
+    # import, so they are loaded on first use or by the startup warm-up
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=PASSWORD_HASH_ROUNDS)
+
+def preload() -> None:
+    """Import the password hashing and JWT libraries ahead of the first request."""
+    pwd_context()
+    import jose.jwt  # noqa: F401
+
+# bcrypt releases the GIL, so a small thread pool keeps it off the event loop
+# while capping how many hashes run at once
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 
 # JWT settings
 SECRET_KEY = "your-secret-key-keep-it-secret"
@@ -19,7 +44,7 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        return pwd_context().verify(plain_password, hashed_password)
     except Exception as e:
         print(f"Error verifying password: {e}")
         return False
@@ -27,13 +52,43 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     """Generate password hash."""
     try:
-        return pwd_context.hash(password)
+        return pwd_context().hash(password)
     except Exception as e:
         print(f"Error hashing password: {e}")
         raise
 
+async def hash_password(password: str) -> str:
+    """Hash a password on the hashing pool."""
+    return await _run_in_hash_pool(get_password_hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the hashing pool.
+
+    Returns (valid, new_hash); new_hash is set when the stored hash should be
+    replaced, e.g. after PASSWORD_HASH_ROUNDS changed.
+    """
+    return await _run_in_hash_pool(_verify_and_update, plain_password, hashed_password)
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    try:
+        return pwd_context().verify_and_update(plain_password, hashed_password)
+    except Exception as e:
+        logger.error(f"Error verifying password: {str(e)}")
+        return False, None
+
+async def _run_in_hash_pool(func, *args):
+    submitted = time.perf_counter()
+
+    def job():
+        PASSWORD_HASH_QUEUE_WAIT.observe(time.perf_counter() - submitted)
+        return func(*args)
+
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, job)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token."""
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -48,13 +103,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         print(f"Error creating token: {e}")
         raise
 
-def verify_token(token: str) -> Optional[str]:
-    """Verify JWT token."""
+def decode_token(token: str) -> Optional[dict]:
+    """Claims of a valid JWT, or None when it is invalid or expired."""
+    from jose import JWTError, jwt
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+def verify_token(token: str) -> Optional[str]:
+    """Verify JWT token."""
+    payload = decode_token(token)
+    if payload is None:
+        return None
+    email: str = payload.get("sub")
+    if email is None:
+        return None
+    return email
\ No newline at end of file
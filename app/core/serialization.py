@@ -0,0 +1,41 @@
+from typing import Any, Dict, Iterable, Tuple
+from starlette.responses import Response
+from app.schemas import schemas
+import decimal
+import os
+import orjson
+
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "1") == "1"
+
+# Keys each response model serves; anything else in the internal dicts is dropped
+RECOMMENDATION_FIELDS = tuple(schemas.RecommendationResponse.model_fields)
+PRODUCT_FIELDS = tuple(schemas.ProductResponse.model_fields)
+
+def _default(value: Any) -> Any:
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(value: Any) -> bytes:
+    """JSON bytes; datetimes are encoded like `jsonable_encoder` (ISO 8601)."""
+    return orjson.dumps(value, default=_default)
+
+def project(item: Dict, fields: Tuple[str, ...]) -> Dict:
+    # Every optional field of these models defaults to None
+    return {field: item.get(field) for field in fields}
+
+def encode_item(item: Dict, fields: Tuple[str, ...]) -> bytes:
+    return dumps(project(item, fields))
+
+def encode_list(items: Iterable[Dict], fields: Tuple[str, ...]) -> bytes:
+    """One orjson call for the whole list, without re-validating trusted data."""
+    return dumps([project(item, fields) for item in items])
+
+class FastJSONResponse(Response):
+    """JSON response for content that already matches its response model."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
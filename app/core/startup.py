@@ -0,0 +1,94 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.monitoring import STARTUP_SECONDS
+import asyncio
+import importlib
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "10"))
+
+def with_session(load: Callable) -> Callable[[], None]:
+    """Warm-up step that runs `load(db)` on a short-lived session."""
+    def step() -> None:
+        from app.models.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            load(db)
+        finally:
+            db.close()
+    return step
+
+def deferred(module: str, attribute: str) -> Callable[..., Any]:
+    """Calls `module.attribute` (a dotted path), importing the module on the first call."""
+    def call(*args, **kwargs):
+        target = importlib.import_module(module)
+        for name in attribute.split("."):
+            target = getattr(target, name)
+        return target(*args, **kwargs)
+    return call
+
+class Warmup:
+    """Preloads in-memory structures in the background, one step at a time.
+
+    Steps run in order on a worker thread so the event loop keeps answering
+    probes; coroutine functions are awaited on the loop instead. A failing step is retried every `retry_interval` seconds without
+    repeating the steps before it; the worker is ready once all succeeded.
+    """
+
+    def __init__(
+        self,
+        steps: List[Tuple[str, Callable[[], None]]],
+        retry_interval: float = WARMUP_RETRY_SECONDS
+    ):
+        self.steps = steps
+        self.retry_interval = retry_interval
+        self.ready = False
+        self.error: Optional[str] = None
+        self.seconds_to_ready: Optional[float] = None
+        self.completed: Dict[str, float] = {}  # step -> seconds it took
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "seconds_to_ready": self.seconds_to_ready,
+            "steps": {name: self.completed.get(name) for name, _ in self.steps},
+            "error": self.error
+        }
+
+    async def _run(self) -> None:
+        started = time.perf_counter()
+        for name, step in self.steps:
+            while True:
+                step_started = time.perf_counter()
+                try:
+                    if asyncio.iscoroutinefunction(step):
+                        await step()
+                    else:
+                        await asyncio.to_thread(step)
+                    break
+                except Exception as e:
+                    self.error = f"{name}: {str(e)}"
+                    logger.error(f"Warm-up step {name} failed, retrying in {self.retry_interval}s: {str(e)}")
+                    await asyncio.sleep(self.retry_interval)
+            self.completed[name] = round(time.perf_counter() - step_started, 3)
+            logger.info(f"Warm-up step {name} took {self.completed[name]}s")
+
+        self.error = None
+        self.seconds_to_ready = round(time.perf_counter() - started, 3)
+        STARTUP_SECONDS.labels(phase="warmup").set(self.seconds_to_ready)
+        self.ready = True
+        logger.info(f"Ready after {self.seconds_to_ready}s of warm-up")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Boolean, LargeBinary, Index
+from sqlalchemy import event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -25,6 +26,7 @@ class Product(Base):
     price = Column(Float, nullable=False)
     category_id = Column(Integer, ForeignKey("categories.category_id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     image_url = Column(String(255))
     
     # Relationships
@@ -32,6 +34,32 @@ class Product(Base):
     interactions = relationship("UserInteraction", back_populates="product")
     feedback = relationship("UserFeedback", back_populates="product")
 
+class ProductStats(Base):
+    __tablename__ = "product_stats"
+    
+    product_id = Column(Integer, ForeignKey("products.product_id"), primary_key=True)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    interaction_count = Column(Integer, nullable=False, default=0)
+    view_count = Column(Integer, nullable=False, default=0)
+    purchase_count = Column(Integer, nullable=False, default=0)
+    avg_rating = Column(Float, nullable=False, default=0, index=True)  # 0 when unrated
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+@event.listens_for(Product, "after_insert")
+def _create_product_stats(mapper, connection, target):
+    # Every product gets a stats row so rating sorts can inner join on it
+    connection.execute(ProductStats.__table__.insert().values(product_id=target.product_id))
+
+class ProductEmbedding(Base):
+    __tablename__ = "product_embeddings"
+    
+    product_id = Column(Integer, ForeignKey("products.product_id"), primary_key=True)
+    vector = Column(LargeBinary, nullable=False)  # float32 bytes
+    dim = Column(Integer, nullable=False)
+    content_hash = Column(String(40), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class Category(Base):
     __tablename__ = "categories"
     
@@ -45,6 +73,10 @@ class Category(Base):
 
 class UserInteraction(Base):
     __tablename__ = "user_interactions"
+    __table_args__ = (
+        # One row per user and product; interaction writes upsert against it
+        Index("ix_user_interactions_user_product", "user_id", "product_id", unique=True),
+    )
     
     interaction_id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.user_id"))
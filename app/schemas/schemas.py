@@ -18,6 +18,16 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+class CurrentUser(BaseModel):
+    """Snapshot of the authenticated user, safe to share between requests."""
+    user_id: int
+    email: str
+    username: str
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
 # Product related schemas
 class CategoryBase(BaseModel):
     name: str
@@ -58,7 +68,7 @@ class FeedbackCreate(FeedbackBase):
     user_id: int
 
 class FeedbackResponse(FeedbackBase):
-    interaction_id: int  # Changed from id to interaction_id
+    feedback_id: int
     created_at: datetime
     user_id: int
 
@@ -83,6 +93,14 @@ class RecommendationRequest(BaseModel):
     limit: int = Field(default=5, ge=1, le=50)
     category: Optional[str] = None
 
+class BatchRecommendationItem(BaseModel):
+    user_id: int
+    limit: int = Field(default=5, ge=1, le=50)
+    category: Optional[str] = None
+
+class BatchRecommendationRequest(BaseModel):
+    requests: List[BatchRecommendationItem] = Field(..., min_length=1, max_length=10000)
+
 # User Interaction Schema
 class UserInteractionBase(BaseModel):
     user_id: int
@@ -99,4 +117,19 @@ class UserInteractionResponse(UserInteractionBase):
     interaction_date: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Bulk interaction ingestion
+class InteractionEvent(BaseModel):
+    user_id: int
+    product_id: int
+    views: int = Field(default=0, ge=0)
+    purchases: int = Field(default=0, ge=0)
+    rating: Optional[int] = Field(None, ge=1, le=5)
+
+class InteractionBatch(BaseModel):
+    events: List[InteractionEvent] = Field(..., min_length=1, max_length=10000)
+
+class InteractionBatchResponse(BaseModel):
+    accepted: int
+    pending: int
\ No newline at end of file
@@ -0,0 +1,20 @@
+import argparse
+import logging
+from app.models.database import SessionLocal
+from app.services.catalog_snapshot import build_and_publish
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish a memory-mapped snapshot of the product catalog")
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        version = build_and_publish(db)
+    finally:
+        db.close()
+
+    print(f"Published catalog snapshot version {version}")
+
+if __name__ == "__main__":
+    main()
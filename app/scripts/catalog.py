@@ -0,0 +1,56 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from app.models.database import SessionLocal
+from app.services.catalog_io import import_catalog, export_catalog, IMPORT_CHUNK_SIZE
+from app.services.embedding_updater import update_product_embeddings
+from app.services.catalog_snapshot import build_and_publish
+
+def _format(path, fmt):
+    if fmt:
+        return fmt
+    return "jsonl" if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson") else "csv"
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import or export the product catalog")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="Insert new products and update changed ones")
+    importer.add_argument("path")
+    importer.add_argument("--format", choices=("csv", "jsonl"), default=None)
+    importer.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    importer.add_argument("--skip-embeddings", action="store_true", help="Leave changed products for the nightly embedding job")
+
+    exporter = commands.add_parser("export", help="Write every product to a file ('-' for stdout)")
+    exporter.add_argument("path")
+    exporter.add_argument("--format", choices=("csv", "jsonl"), default=None)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    fmt = _format(args.path, args.format)
+
+    db = SessionLocal()
+    try:
+        if args.command == "import":
+            with open(args.path, newline="", encoding="utf-8") as f:
+                report = import_catalog(db, f, fmt, chunk_size=args.chunk_size)
+            result = report.as_dict()
+            if not args.skip_embeddings and (report.inserted or report.updated):
+                # Only rows touched by this import are re-encoded
+                result["embeddings_updated"] = update_product_embeddings(db, since=report.changed_since)
+            if report.inserted or report.updated:
+                result["catalog_snapshot"] = build_and_publish(db)
+            print(json.dumps(result, indent=2))
+        else:
+            if args.path == "-":
+                print(json.dumps(export_catalog(db, sys.stdout, fmt)), file=sys.stderr)
+            else:
+                with open(args.path, "w", newline="", encoding="utf-8") as f:
+                    print(json.dumps(export_catalog(db, f, fmt), indent=2))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import argparse
+import logging
+from app.models.database import Base, engine
+from app.models import models  # noqa: F401  (registers the tables on Base.metadata)
+
+def main():
+    parser = argparse.ArgumentParser(description="Create any missing database tables and indexes")
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    # create_all skips the indexes of tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    print(f"Created missing tables and indexes on {engine.url.render_as_string(hide_password=True)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import argparse
+import logging
+from app.models.database import SessionLocal
+from app.services.precomputed import precompute_and_publish
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute recommendation lists for active users and categories")
+    parser.add_argument("--full", action="store_true", help="Recompute every active user instead of only changed ones")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        version = precompute_and_publish(db, full=args.full)
+    finally:
+        db.close()
+
+    print(f"Published precomputed recommendations version {version}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import argparse
+import asyncio
+import logging
+from app.services.embedding_updater import schedule_embedding_updates
+
+async def run():
+    scheduler = schedule_embedding_updates()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        scheduler.shutdown(wait=False)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the periodic rebuilds (embeddings, factors, stats, precomputed lists, catalog snapshot)"
+    )
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
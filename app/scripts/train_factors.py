@@ -0,0 +1,36 @@
+import argparse
+import json
+import logging
+from app.models.database import SessionLocal
+from app.services.factorization import train_and_publish, load_current_model
+
+def main():
+    parser = argparse.ArgumentParser(description="Train collaborative-filtering factors")
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--iterations", type=int, default=15)
+    parser.add_argument("--regularization", type=float, default=0.05)
+    parser.add_argument("--alpha", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--full", action="store_true", help="Ignore the previous model and retrain from scratch")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        version = train_and_publish(
+            db,
+            factors=args.factors,
+            iterations=args.iterations,
+            regularization=args.regularization,
+            alpha=args.alpha,
+            warm_start=not args.full,
+            workers=args.workers
+        )
+    finally:
+        db.close()
+
+    print(f"Published factors version {version}")
+    print(json.dumps(load_current_model().meta, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+from typing import Any, Callable, Optional
+from datetime import datetime
+import os
+import shutil
+import tempfile
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = os.getenv("RECSYS_ARTIFACT_DIR", "artifacts")
+CURRENT_FILE = "CURRENT"
+
+def new_version_dir(name: str) -> str:
+    """Scratch directory for building a new version of an artifact."""
+    base = os.path.join(ARTIFACT_DIR, name)
+    os.makedirs(base, exist_ok=True)
+    return tempfile.mkdtemp(prefix=".build-", dir=base)
+
+def publish(name: str, build_dir: str, keep: int = 2) -> str:
+    """Move a finished build into place and atomically point CURRENT at it."""
+    base = os.path.join(ARTIFACT_DIR, name)
+    version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    os.rename(build_dir, os.path.join(base, version))
+
+    # os.replace is atomic, so readers see either the old or the new version
+    fd, pointer = tempfile.mkstemp(prefix=".current-", dir=base)
+    with os.fdopen(fd, "w") as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(base, CURRENT_FILE))
+
+    _prune(base, keep)
+    logger.info(f"Published {name} version {version}")
+    return version
+
+def current_version(name: str) -> Optional[str]:
+    try:
+        with open(os.path.join(ARTIFACT_DIR, name, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def version_path(name: str, version: str) -> str:
+    return os.path.join(ARTIFACT_DIR, name, version)
+
+class ArtifactStore:
+    """Hands out the currently published version of an artifact, reloading on change."""
+
+    def __init__(self, name: str, loader: Callable[[str], Any], check_interval: float = 30.0):
+        self.name = name
+        self.loader = loader
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._version
+
+    def get(self) -> Any:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self.reload()
+        return self._value
+
+    def reload(self) -> None:
+        version = current_version(self.name)
+        if version is None or version == self._version:
+            return
+        value = self.loader(version_path(self.name, version))
+        with self._lock:
+            self._value, self._version = value, version
+        logger.info(f"Loaded {self.name} version {version}")
+
+def _prune(base: str, keep: int) -> None:
+    # Older versions stay around briefly for workers that still map them
+    versions = sorted(
+        entry for entry in os.listdir(base)
+        if not entry.startswith(".") and entry != CURRENT_FILE
+    )
+    for version in versions[:-keep]:
+        shutil.rmtree(os.path.join(base, version), ignore_errors=True)
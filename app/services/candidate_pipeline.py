@@ -0,0 +1,341 @@
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import desc, func
+from typing import Callable, Dict, List, Optional, Set
+from app.models import models
+from app.core.monitoring import RECOMMENDATION_GENERATOR_DROPPED
+import numpy as np
+import asyncio
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+CANDIDATES_PER_GENERATOR = int(os.getenv("CANDIDATES_PER_GENERATOR", "200"))
+GENERATOR_BUDGET = float(os.getenv("CANDIDATE_GENERATOR_BUDGET_MS", "50")) / 1000
+SEED_PRODUCTS = 20  # Recent products of the user that seed co-purchase lookups
+CATEGORY_OVERSAMPLE = 5  # Extra neighbours fetched when results are filtered by category
+
+class CandidateRequest:
+    def __init__(self, user_id: int, limit: int, category_ids: List[int], vector_index=None):
+        self.user_id = user_id
+        self.limit = limit
+        self.category_ids = category_ids
+        self.vector_index = vector_index
+
+class Candidates:
+    """Products proposed by one generator, plus the user profile if it loaded one.
+
+    `affinity` optionally rates each product for the user in [0, 1]; the
+    re-ranker treats it like profile similarity.
+    """
+
+    def __init__(self, product_ids, profile: Optional[np.ndarray] = None, affinity=None):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.profile = profile
+        self.affinity = None if affinity is None else np.clip(np.asarray(affinity, dtype=np.float64), 0, 1)
+
+class CandidateSet:
+    """Merged, de-duplicated output of all generators that finished in time.
+
+    `affinity` holds, per product, the strongest weighted affinity any
+    generator gave it (0 when none did).
+    """
+
+    def __init__(
+        self,
+        product_ids: np.ndarray,
+        profile: Optional[np.ndarray],
+        personalized: bool,
+        sources: Dict[str, int],
+        affinity: Optional[np.ndarray] = None
+    ):
+        self.product_ids = product_ids
+        self.profile = profile
+        self.personalized = personalized
+        self.sources = sources
+        self.affinity = affinity if affinity is not None else np.zeros(len(product_ids))
+
+class CandidateGenerator:
+    """Proposes a few hundred products worth scoring for a request.
+
+    Generators marked `inline` are cheap in-memory lookups run on the caller's
+    session. On the async path the others run concurrently, each on a session
+    of its own (none when `uses_session` is False), and are cancelled when
+    they exceed `budget` seconds; they override `generate_async` when they
+    have I/O besides the database or CPU work to move off the event loop.
+    `weight` scales the affinity they report.
+    """
+
+    name = "generator"
+    inline = False
+    uses_session = True
+    personalized = True
+    weight = 1.0
+
+    def __init__(self, size: int = CANDIDATES_PER_GENERATOR, budget: float = GENERATOR_BUDGET):
+        self.size = size
+        self.budget = budget
+
+    def generate(self, db: Session, request: CandidateRequest) -> Candidates:
+        raise NotImplementedError
+
+    async def generate_async(self, db, request: CandidateRequest) -> Candidates:
+        """`generate` on an `AsyncSession`."""
+        return await db.run_sync(self.generate, request)
+
+    def generate_many(self, db: Session, requests: List[CandidateRequest]) -> List[Candidates]:
+        """`generate` for each request; overridden where requests can share work."""
+        return [self.generate(db, request) for request in requests]
+
+class PopularGenerator(CandidateGenerator):
+    """Best scored products in the requested categories; also the fallback for cold users."""
+
+    name = "popular"
+    inline = True
+    personalized = False
+
+    def __init__(self, stats_index, size: int = CANDIDATES_PER_GENERATOR):
+        super().__init__(size)
+        self.stats_index = stats_index
+
+    def generate(self, db: Session, request: CandidateRequest) -> Candidates:
+        positions = self.stats_index.top_k(max(self.size, request.limit), request.category_ids)
+        return Candidates(self.stats_index.product_ids[positions])
+
+    async def generate_async(self, db, request: CandidateRequest) -> Candidates:
+        return self.generate(None, request)  # In memory; coalesced requests share `db`
+
+    def generate_many(self, db: Session, requests: List[CandidateRequest]) -> List[Candidates]:
+        # Requests for the same categories and size share one ranking
+        found: Dict[tuple, Candidates] = {}
+        for request in requests:
+            key = (tuple(request.category_ids), max(self.size, request.limit))
+            if key not in found:
+                found[key] = self.generate(db, request)
+        return [found[(tuple(request.category_ids), max(self.size, request.limit))] for request in requests]
+
+class VectorNeighbourGenerator(CandidateGenerator):
+    """Nearest neighbours of the user's preference vector."""
+
+    name = "vector"
+
+    def __init__(self, user_profiles, size: int = CANDIDATES_PER_GENERATOR, budget: float = GENERATOR_BUDGET):
+        super().__init__(size, budget)
+        self.user_profiles = user_profiles
+
+    def generate(self, db: Session, request: CandidateRequest) -> Candidates:
+        vector_index = request.vector_index
+        if vector_index is None:
+            return Candidates([])
+        return self._search(vector_index, request, self.user_profiles.get(db, request.user_id, vector_index.dim))
+
+    async def generate_async(self, db, request: CandidateRequest) -> Candidates:
+        # Profiles come from Redis, which must not block the event loop
+        vector_index = request.vector_index
+        if vector_index is None:
+            return Candidates([])
+        profile = await self.user_profiles.get_async(db, request.user_id, vector_index.dim)
+        return await asyncio.to_thread(self._search, vector_index, request, profile)
+
+    def generate_many(self, db: Session, requests: List[CandidateRequest]) -> List[Candidates]:
+        # Profiles missing from the cache are built with one query per chunk of users
+        vector_index = next((r.vector_index for r in requests if r.vector_index is not None), None)
+        if vector_index is None:
+            return [Candidates([]) for _ in requests]
+        profiles = self.user_profiles.get_many(db, sorted({r.user_id for r in requests}), vector_index.dim)
+        return [
+            self._search(request.vector_index, request, profiles.get(request.user_id))
+            if request.vector_index is not None else Candidates([])
+            for request in requests
+        ]
+
+    def _search(self, vector_index, request: CandidateRequest, profile: Optional[np.ndarray]) -> Candidates:
+        if profile is None:
+            return Candidates([])
+        k = self.size * (CATEGORY_OVERSAMPLE if request.category_ids else 1)
+        product_ids, _ = vector_index.search(profile, k)
+        return Candidates(product_ids, profile)
+
+class FactorGenerator(CandidateGenerator):
+    """Best scoring items for the user's collaborative-filtering factors.
+
+    Affinity is the model's predicted preference, clipped to [0, 1].
+    """
+
+    name = "factors"
+    uses_session = False
+
+    def __init__(self, model_store, size: int = CANDIDATES_PER_GENERATOR, budget: float = GENERATOR_BUDGET):
+        super().__init__(size, budget)
+        self.model_store = model_store
+
+    def generate(self, db: Session, request: CandidateRequest) -> Candidates:
+        model = self.model_store.get()
+        if model is None:
+            return Candidates([])
+        k = self.size * (CATEGORY_OVERSAMPLE if request.category_ids else 1)
+        product_ids, scores = model.recommend(request.user_id, k)
+        return Candidates(product_ids, affinity=scores)
+
+    async def generate_async(self, db, request: CandidateRequest) -> Candidates:
+        # Scores every item in the catalog: run in a thread, within the budget
+        return await asyncio.to_thread(self.generate, db, request)
+
+class CoPurchaseGenerator(CandidateGenerator):
+    """Products bought by other users who bought what this user bought recently.
+
+    Affinity is the number of such buyers relative to the most co-purchased product.
+    """
+
+    name = "co_purchase"
+    weight = 0.8
+
+    def generate(self, db: Session, request: CandidateRequest) -> Candidates:
+        interactions = models.UserInteraction
+        seeds = [row[0] for row in db.query(interactions.product_id).filter(
+            interactions.user_id == request.user_id,
+            interactions.purchase_count > 0
+        ).order_by(interactions.interaction_date.desc()).limit(SEED_PRODUCTS)]
+        if not seeds:
+            return Candidates([])
+
+        buyer = aliased(interactions)
+        other = aliased(interactions)
+        buyers = func.count(other.user_id).label("buyers")
+        rows = db.query(other.product_id, buyers).join(
+            buyer, buyer.user_id == other.user_id
+        ).filter(
+            buyer.product_id.in_(seeds),
+            buyer.purchase_count > 0,
+            buyer.user_id != request.user_id,
+            other.purchase_count > 0,
+            other.product_id.notin_(seeds)
+        ).group_by(other.product_id).order_by(desc(buyers), other.product_id).limit(self.size).all()
+        if not rows:
+            return Candidates([])
+        counts = np.array([count for _, count in rows], dtype=np.float64)
+        return Candidates([row[0] for row in rows], affinity=counts / counts.max())
+
+class RecentlyViewedGenerator(CandidateGenerator):
+    """The user's most recently viewed products, with affinity fading by recency."""
+
+    name = "recently_viewed"
+    weight = 0.5
+
+    def generate(self, db: Session, request: CandidateRequest) -> Candidates:
+        interactions = models.UserInteraction
+        rows = db.query(interactions.product_id).filter(
+            interactions.user_id == request.user_id,
+            interactions.view_count > 0
+        ).order_by(interactions.interaction_date.desc()).limit(self.size).all()
+        return Candidates([row[0] for row in rows], affinity=1.0 - np.arange(len(rows)) / max(len(rows), 1))
+
+class CandidatePipeline:
+    """Runs candidate generators and merges their proposals.
+
+    `generate_async` serves requests: generators run as concurrent tasks on
+    their own async sessions, and one that overruns its budget is cancelled,
+    which releases its connection. Sessions connect on their first query, so
+    a request holds at most one connection per generator that queries
+    (vector on a profile cache miss, co_purchase, recently_viewed) on top of
+    the caller's; size the pool for that. `generate` runs every generator to
+    completion on the caller's session, for offline jobs.
+    """
+
+    def __init__(self, generators: List[CandidateGenerator], session_factory: Callable):
+        self.generators = generators
+        self.session_factory = session_factory
+        self._cancelled: Set[asyncio.Task] = set()
+
+    def generate(self, db: Session, request: CandidateRequest) -> CandidateSet:
+        return self._merge([(generator, generator.generate(db, request)) for generator in self.generators])
+
+    def generate_many(self, db: Session, requests: List[CandidateRequest]) -> List[CandidateSet]:
+        """`generate` for several requests, letting each generator work on all of them at once."""
+        results: List[list] = [[] for _ in requests]
+        for generator in self.generators:
+            for offset, candidates in enumerate(generator.generate_many(db, requests)):
+                results[offset].append((generator, candidates))
+        return [self._merge(result) for result in results]
+
+    async def generate_async(self, db, request: CandidateRequest) -> CandidateSet:
+        """Candidates within budget; `db` is the caller's `AsyncSession`, used by inline generators."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        tasks = {
+            generator: loop.create_task(self._run(generator, request))
+            for generator in self.generators if not generator.inline
+        }
+
+        results = []
+        try:
+            for generator in self.generators:
+                if generator.inline:
+                    results.append((generator, await generator.generate_async(db, request)))
+            for generator, task in sorted(tasks.items(), key=lambda item: item[0].budget):
+                await asyncio.wait([task], timeout=max(0.0, started + generator.budget - loop.time()))
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    # Not awaited: the request goes on while the task unwinds and closes its session
+                    task.cancel()
+                    self._cancelled.add(task)
+                    task.add_done_callback(self._cancelled.discard)
+
+        for generator, task in tasks.items():
+            if task.cancelled() or not task.done():
+                RECOMMENDATION_GENERATOR_DROPPED.labels(generator.name, "timeout").inc()
+                logger.warning(f"Dropped {generator.name} candidates: over {generator.budget * 1000:.0f}ms budget")
+            elif task.exception() is not None:
+                RECOMMENDATION_GENERATOR_DROPPED.labels(generator.name, "error").inc()
+                logger.error(f"Error generating {generator.name} candidates: {str(task.exception())}")
+            else:
+                results.append((generator, task.result()))
+        return self._merge(results)
+
+    async def stop(self) -> None:
+        """Wait for cancelled generators to release their sessions."""
+        if self._cancelled:
+            await asyncio.wait(list(self._cancelled))
+
+    async def _run(self, generator: CandidateGenerator, request: CandidateRequest) -> Candidates:
+        if not generator.uses_session:
+            return await generator.generate_async(None, request)
+        async with self.session_factory() as db:
+            return await generator.generate_async(db, request)
+
+    @staticmethod
+    def _merge(results) -> CandidateSet:
+        profile = next((c.profile for _, c in results if c.profile is not None), None)
+        arrays = [c.product_ids for _, c in results]
+        if not arrays:
+            return CandidateSet(np.empty(0, dtype=np.int64), profile, profile is not None, {})
+
+        product_ids, inverse = np.unique(np.concatenate(arrays), return_inverse=True)
+        affinity = np.zeros(len(product_ids))
+        weighted = np.concatenate([
+            generator.weight * c.affinity if c.affinity is not None else np.zeros(len(c.product_ids))
+            for generator, c in results
+        ])
+        np.maximum.at(affinity, inverse, weighted)
+        return CandidateSet(
+            product_ids,
+            profile,
+            profile is not None or any(g.personalized and len(c.product_ids) for g, c in results),
+            {generator.name: len(candidates.product_ids) for generator, candidates in results},
+            affinity
+        )
+
+def default_pipeline(stats_index, user_profiles, session_factory: Callable) -> CandidatePipeline:
+    from app.services.factorization import FactorModelStore
+
+    return CandidatePipeline(
+        [
+            PopularGenerator(stats_index),
+            VectorNeighbourGenerator(user_profiles),
+            FactorGenerator(FactorModelStore()),
+            CoPurchaseGenerator(),
+            RecentlyViewedGenerator()
+        ],
+        session_factory
+    )
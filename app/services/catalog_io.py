@@ -0,0 +1,196 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, insert, select, update
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+from pydantic import ValidationError
+from app.models import models
+from app.schemas import schemas
+from app.services.category_tree import category_tree
+import csv
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 5000
+EXPORT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+PRODUCT_FIELDS = ("name", "description", "price", "category_id", "image_url")
+EXPORT_FIELDS = ("product_id",) + PRODUCT_FIELDS + ("category",)
+
+def read_rows(f: TextIO, fmt: str) -> Iterator[Dict]:
+    if fmt == "csv":
+        for row in csv.DictReader(f):
+            yield {key: (value if value != "" else None) for key, value in row.items()}
+    elif fmt == "jsonl":
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+class ImportReport:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rejected = 0
+        self.errors: List[str] = []
+        self.seconds = 0.0
+        self.changed_since: Optional[datetime] = None
+
+    def reject(self, line: int, message: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"row {line}: {message}")
+
+    def as_dict(self) -> Dict:
+        return {
+            "read": self.read,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "rejected": self.rejected,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.read / self.seconds) if self.seconds else None,
+            "errors": self.errors
+        }
+
+def import_catalog(db: Session, f: TextIO, fmt: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> ImportReport:
+    """Validate and upsert products chunk by chunk, only touching rows that changed."""
+    report = ImportReport()
+    # Whole seconds, since some backends truncate stored timestamps
+    report.changed_since = datetime.utcnow().replace(microsecond=0)
+    started = time.perf_counter()
+
+    chunk: List[Tuple[Optional[int], Dict]] = []
+    for line, raw in enumerate(read_rows(f, fmt), start=1):
+        report.read += 1
+        parsed = _validate(db, raw)
+        if isinstance(parsed, str):
+            report.reject(line, parsed)
+            continue
+        chunk.append(parsed)
+        if len(chunk) >= chunk_size:
+            _write_chunk(db, chunk, report)
+            chunk = []
+    if chunk:
+        _write_chunk(db, chunk, report)
+
+    _create_missing_stats(db)
+    db.commit()
+    report.seconds = time.perf_counter() - started
+    logger.info(f"Imported catalog: {report.as_dict()}")
+    return report
+
+def export_catalog(db: Session, f: TextIO, fmt: str) -> Dict:
+    """Stream every product (with its category name) to a CSV or JSONL file."""
+    started = time.perf_counter()
+    rows = db.query(
+        models.Product.product_id,
+        models.Product.name,
+        models.Product.description,
+        models.Product.price,
+        models.Product.category_id,
+        models.Product.image_url,
+        models.Category.name
+    ).outerjoin(
+        models.Category,
+        models.Product.category_id == models.Category.category_id
+    ).order_by(models.Product.product_id).yield_per(EXPORT_CHUNK_SIZE)
+
+    writer = csv.writer(f) if fmt == "csv" else None
+    if writer is not None:
+        writer.writerow(EXPORT_FIELDS)
+    elif fmt != "jsonl":
+        raise ValueError(f"Unsupported format: {fmt}")
+
+    count = 0
+    for row in rows:
+        if writer is not None:
+            writer.writerow(["" if value is None else value for value in row])
+        else:
+            f.write(json.dumps(dict(zip(EXPORT_FIELDS, row))) + "\n")
+        count += 1
+
+    seconds = time.perf_counter() - started
+    return {
+        "exported": count,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(count / seconds) if seconds else None
+    }
+
+def _validate(db: Session, raw: Dict):
+    """(product_id, fields) for a valid row, or an error message."""
+    row = dict(raw)
+    category_name = row.pop("category", None)
+    if row.get("category_id") is None and category_name:
+        row["category_id"] = category_tree.lookup(db, category_name)
+        if row["category_id"] is None:
+            return f"unknown category {category_name!r}"
+
+    product_id = row.pop("product_id", None)
+    try:
+        product_id = int(product_id) if product_id is not None else None
+        product = schemas.ProductCreate(**row)
+    except ValidationError as e:
+        return "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+    except ValueError as e:
+        return str(e)
+    return product_id, product.model_dump(include=set(PRODUCT_FIELDS))
+
+def _write_chunk(db: Session, chunk: List[Tuple[Optional[int], Dict]], report: ImportReport) -> None:
+    product_ids = [product_id for product_id, _ in chunk if product_id is not None]
+    existing = {}
+    if product_ids:
+        for row in db.query(
+            models.Product.product_id,
+            *(getattr(models.Product, field) for field in PRODUCT_FIELDS)
+        ).filter(models.Product.product_id.in_(product_ids)):
+            existing[row[0]] = dict(zip(PRODUCT_FIELDS, row[1:]))
+
+    now = datetime.utcnow()
+    inserts, updates = [], []
+    for product_id, fields in chunk:
+        current = existing.get(product_id)
+        if current is None:
+            row = dict(fields, created_at=now, updated_at=now)
+            if product_id is not None:
+                row["product_id"] = product_id
+                existing[product_id] = fields  # Later duplicates in the chunk become updates
+            inserts.append(row)
+        elif current != fields:
+            updates.append(dict({f"b_{field}": value for field, value in fields.items()}, b_id=product_id, b_now=now))
+            existing[product_id] = fields
+        else:
+            report.unchanged += 1
+
+    # Rows with and without explicit ids need separate executemany batches
+    for rows in (
+        [row for row in inserts if "product_id" in row],
+        [row for row in inserts if "product_id" not in row]
+    ):
+        if rows:
+            db.execute(insert(models.Product.__table__), rows)
+    if updates:
+        table = models.Product.__table__
+        db.execute(
+            update(table).where(table.c.product_id == bindparam("b_id")).values(
+                updated_at=bindparam("b_now"),
+                **{field: bindparam(f"b_{field}") for field in PRODUCT_FIELDS}
+            ),
+            updates
+        )
+    db.commit()
+    report.inserted += len(inserts)
+    report.updated += len(updates)
+
+def _create_missing_stats(db: Session) -> None:
+    # Bulk inserts bypass the ORM hook that gives each product a stats row
+    missing = select(models.Product.product_id).outerjoin(
+        models.ProductStats,
+        models.Product.product_id == models.ProductStats.product_id
+    ).where(models.ProductStats.product_id.is_(None))
+    db.execute(insert(models.ProductStats).from_select(["product_id"], missing))
@@ -0,0 +1,228 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from app.models import models
+from app.services import artifacts
+import numpy as np
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SNAPSHOT_NAME = "catalog_snapshot"
+READ_CHUNK_SIZE = 5000
+STRING_FIELDS = ("name", "description", "image_url")
+COLUMNS = ("product_ids", "price", "category_id", "avg_rating", "interaction_count", "created_at", "name_rank")
+
+class CatalogSnapshot:
+    """Read-only columnar copy of the catalog, memory-mapped by every worker.
+
+    Numeric fields are one array each, ordered by product id. Strings live
+    in one UTF-8 blob: field f of the product at position i is
+    `strings[string_offsets[k]:string_offsets[k + 1]]` with
+    k = i * len(STRING_FIELDS) + f, and `string_nulls[k]` marks NULLs.
+    The OS page cache shares the mapped files between processes.
+    """
+
+    def __init__(
+        self,
+        meta: Dict,
+        product_ids: np.ndarray,
+        price: np.ndarray,
+        category_id: np.ndarray,
+        avg_rating: np.ndarray,
+        interaction_count: np.ndarray,
+        created_at: np.ndarray,
+        name_rank: np.ndarray,
+        string_offsets: np.ndarray,
+        string_nulls: np.ndarray,
+        strings: np.ndarray
+    ):
+        self.meta = meta
+        self.product_ids = product_ids
+        self.price = price
+        self.category_id = category_id  # -1 when the product has no category
+        self.avg_rating = avg_rating
+        self.interaction_count = interaction_count
+        self.created_at = created_at
+        self.name_rank = name_rank
+        self.string_offsets = string_offsets
+        self.string_nulls = string_nulls
+        self.strings = strings
+
+    @property
+    def built_at(self) -> datetime:
+        return datetime.fromisoformat(self.meta["built_at"])
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def position(self, product_id: int) -> Optional[int]:
+        position = int(np.searchsorted(self.product_ids, product_id))
+        if position < len(self.product_ids) and self.product_ids[position] == product_id:
+            return position
+        return None
+
+    def string(self, position: int, field: str) -> Optional[str]:
+        k = position * len(STRING_FIELDS) + STRING_FIELDS.index(field)
+        if self.string_nulls[k]:
+            return None
+        return self.strings[self.string_offsets[k]:self.string_offsets[k + 1]].tobytes().decode("utf-8")
+
+    def product(self, product_id: int) -> Optional[Dict]:
+        """Product fields as served by `schemas.ProductResponse` (without relationships)."""
+        position = self.position(product_id)
+        if position is None:
+            return None
+        category_id = int(self.category_id[position])
+        created_at = self.created_at[position]
+        return {
+            "product_id": int(product_id),
+            "name": self.string(position, "name"),
+            "description": self.string(position, "description"),
+            "price": float(self.price[position]),
+            "category_id": category_id if category_id >= 0 else None,
+            "image_url": self.string(position, "image_url"),
+            "created_at": None if np.isnat(created_at) else created_at.astype(datetime)
+        }
+
+    def names(self) -> "SnapshotNames":
+        return SnapshotNames(self)
+
+    def save(self, directory: str) -> None:
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(self.meta, f)
+        for name in COLUMNS + ("string_offsets", "string_nulls"):
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "strings.bin"), "wb") as f:
+            f.write(self.strings.tobytes())
+
+    @classmethod
+    def load(cls, directory: str) -> "CatalogSnapshot":
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in COLUMNS + ("string_offsets", "string_nulls")
+        }
+        path = os.path.join(directory, "strings.bin")
+        # numpy cannot map an empty file
+        strings = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.empty(0, dtype=np.uint8)
+        return cls(meta, strings=strings, **arrays)
+
+class SnapshotNames:
+    """List-like view of the snapshot's product names.
+
+    Renames and appended products are kept in this process, so the stats
+    index can track catalog changes without copying every name.
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.snapshot = snapshot
+        self._changed: Dict[int, str] = {}
+        self._appended: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.snapshot) + len(self._appended)
+
+    def __getitem__(self, position: int) -> str:
+        if position >= len(self.snapshot):
+            return self._appended[position - len(self.snapshot)]
+        if position in self._changed:
+            return self._changed[position]
+        return self.snapshot.string(position, "name") or ""
+
+    def __setitem__(self, position: int, name: str) -> None:
+        if position >= len(self.snapshot):
+            self._appended[position - len(self.snapshot)] = name
+        else:
+            self._changed[position] = name
+
+    def extend(self, names: List[str]) -> None:
+        self._appended.extend(names)
+
+class CatalogSnapshotStore(artifacts.ArtifactStore):
+    def __init__(self, check_interval: float = 30.0):
+        super().__init__(CATALOG_SNAPSHOT_NAME, CatalogSnapshot.load, check_interval)
+
+def build_catalog_snapshot(db: Session) -> CatalogSnapshot:
+    """Read the catalog (with its stats) into a snapshot, streaming rows in id order."""
+    # Whole seconds, since some backends truncate stored timestamps
+    built_at = datetime.utcnow().replace(microsecond=0)
+    rows = db.query(
+        models.Product.product_id,
+        models.Product.price,
+        models.Product.category_id,
+        models.ProductStats.avg_rating,
+        models.ProductStats.interaction_count,
+        models.Product.created_at,
+        *(getattr(models.Product, field) for field in STRING_FIELDS)
+    ).outerjoin(
+        models.ProductStats,
+        models.Product.product_id == models.ProductStats.product_id
+    ).order_by(models.Product.product_id).yield_per(READ_CHUNK_SIZE)
+
+    columns = {name: [] for name in COLUMNS[:-1]}
+    names, offsets, nulls = [], [0], []
+    blob = bytearray()
+    for product_id, price, category_id, avg_rating, interaction_count, created_at, *strings in rows:
+        columns["product_ids"].append(product_id)
+        columns["price"].append(price)
+        columns["category_id"].append(category_id if category_id is not None else -1)
+        columns["avg_rating"].append(float(avg_rating or 0))
+        columns["interaction_count"].append(int(interaction_count or 0))
+        columns["created_at"].append(created_at)
+        names.append(strings[0] or "")
+        for value in strings:
+            nulls.append(value is None)
+            blob += (value or "").encode("utf-8")
+            offsets.append(len(blob))
+
+    # Same tie-break order as ProductStatsIndex._rank_names
+    order = sorted(range(len(names)), key=names.__getitem__)
+    name_rank = np.empty(len(order), dtype=np.int64)
+    name_rank[order] = np.arange(len(order), dtype=np.int64)
+
+    snapshot = CatalogSnapshot(
+        {"built_at": built_at.isoformat(), "string_fields": list(STRING_FIELDS)},
+        product_ids=np.array(columns["product_ids"], dtype=np.int64),
+        price=np.array(columns["price"], dtype=np.float64),
+        category_id=np.array(columns["category_id"], dtype=np.int64),
+        avg_rating=np.array(columns["avg_rating"], dtype=np.float64),
+        interaction_count=np.array(columns["interaction_count"], dtype=np.int64),
+        created_at=np.array(columns["created_at"], dtype="datetime64[us]"),
+        name_rank=name_rank,
+        string_offsets=np.array(offsets, dtype=np.int64),
+        string_nulls=np.array(nulls, dtype=bool),
+        strings=np.frombuffer(bytes(blob), dtype=np.uint8)
+    )
+    logger.info(f"Built catalog snapshot of {len(snapshot)} products ({len(blob)} bytes of text)")
+    return snapshot
+
+def changed_product_ids(db: Session, since: datetime) -> Set[int]:
+    """Products whose row or stats were written at or after `since`."""
+    product_ids = {row[0] for row in db.query(models.Product.product_id).filter(
+        models.Product.updated_at >= since
+    )}
+    product_ids.update(row[0] for row in db.query(models.ProductStats.product_id).filter(
+        models.ProductStats.updated_at >= since
+    ))
+    return product_ids
+
+def build_and_publish(db: Session) -> str:
+    snapshot = build_catalog_snapshot(db)
+    build_dir = artifacts.new_version_dir(CATALOG_SNAPSHOT_NAME)
+    snapshot.save(build_dir)
+    return artifacts.publish(CATALOG_SNAPSHOT_NAME, build_dir)
+
+def run_catalog_snapshot():
+    from app.models.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        build_and_publish(db)
+    finally:
+        db.close()
+
+catalog_snapshot = CatalogSnapshotStore()
@@ -0,0 +1,130 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import event
+from typing import Dict, FrozenSet, List, Optional
+from app.models import models
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CategoryTree:
+    """In-memory category hierarchy with precomputed descendant sets.
+
+    Reloaded lazily after a local change to `models.Category`, and every
+    `max_age` seconds to pick up changes made by other processes.
+    """
+
+    def __init__(self, max_age: float = 300.0):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._stale = True
+        self._loaded_at = 0.0
+        self._names: Dict[int, str] = {}
+        self._parents: Dict[int, Optional[int]] = {}
+        self._by_name: Dict[str, List[int]] = {}
+        self._descendants: Dict[int, FrozenSet[int]] = {}
+
+    def invalidate(self) -> None:
+        self._stale = True
+
+    def load(self, db: Session) -> None:
+        rows = db.query(
+            models.Category.category_id,
+            models.Category.name,
+            models.Category.parent_category_id
+        ).all()
+
+        names, parents, by_name = {}, {}, {}
+        children: Dict[int, List[int]] = {}
+        for category_id, name, parent_id in rows:
+            names[category_id] = name
+            parents[category_id] = parent_id
+            by_name.setdefault(name.lower(), []).append(category_id)
+            if parent_id is not None:
+                children.setdefault(parent_id, []).append(category_id)
+
+        descendants = {}
+        for category_id in names:
+            found = {category_id}
+            stack = [category_id]
+            while stack:
+                for child in children.get(stack.pop(), []):
+                    if child not in found:  # Guards against cycles in bad data
+                        found.add(child)
+                        stack.append(child)
+            descendants[category_id] = frozenset(found)
+
+        with self._lock:
+            self._names = names
+            self._parents = parents
+            self._by_name = by_name
+            self._descendants = descendants
+            self._stale = False
+            self._loaded_at = time.monotonic()
+        logger.info(f"Loaded category tree with {len(names)} categories")
+
+    def ensure_loaded(self, db: Session) -> None:
+        if self._stale or time.monotonic() - self._loaded_at > self.max_age:
+            self.load(db)
+
+    def resolve(self, db: Session, name: str) -> List[int]:
+        """Ids of categories named `name` (case-insensitive) and all their descendants."""
+        self.ensure_loaded(db)
+        category_ids = set()
+        for category_id in self._by_name.get(name.lower(), []):
+            category_ids |= self._descendants[category_id]
+        return sorted(category_ids)
+
+    def lookup(self, db: Session, name: str) -> Optional[int]:
+        """Id of the category named `name` (case-insensitive); the oldest wins on duplicates."""
+        self.ensure_loaded(db)
+        category_ids = self._by_name.get(name.strip().lower())
+        return min(category_ids) if category_ids else None
+
+    def ancestors(self, db: Session, category_id: int) -> List[int]:
+        """The category and its parents up to the root, nearest first."""
+        self.ensure_loaded(db)
+        chain = []
+        while category_id in self._names and category_id not in chain:  # Guards against cycles
+            chain.append(category_id)
+            category_id = self._parents[category_id]
+        return chain
+
+    def matching(self, db: Session, fragment: str) -> List[int]:
+        """Ids of categories whose name contains `fragment` (case-insensitive)."""
+        self.ensure_loaded(db)
+        fragment = fragment.lower()
+        return sorted(
+            category_id
+            for name, category_ids in self._by_name.items() if fragment in name
+            for category_id in category_ids
+        )
+
+    def names(self, db: Session) -> List[str]:
+        """Distinct category names, lowercased."""
+        self.ensure_loaded(db)
+        return sorted(self._by_name)
+
+    def get(self, db: Session, category_id: Optional[int]) -> Optional[Dict]:
+        """Category fields as served by `schemas.CategoryResponse`."""
+        self.ensure_loaded(db)
+        if category_id not in self._names:
+            return None
+        return {
+            "category_id": category_id,
+            "name": self._names[category_id],
+            "parent_category_id": self._parents[category_id]
+        }
+
+    def name(self, db: Session, category_id: int) -> Optional[str]:
+        self.ensure_loaded(db)
+        return self._names.get(category_id)
+
+category_tree = CategoryTree()
+
+@event.listens_for(models.Category, "after_insert")
+@event.listens_for(models.Category, "after_update")
+@event.listens_for(models.Category, "after_delete")
+def _invalidate_category_tree(mapper, connection, target):
+    category_tree.invalidate()
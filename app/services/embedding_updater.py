@@ -1,20 +1,137 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+from datetime import datetime
 from app.models import models
-from app.services.recommendation import RecommendationService
-
-async def update_product_embeddings(db: Session):
-    recommendation_service = RecommendationService()
-    products = db.query(models.Product).all()
-    
-    for product in products:
-        product_text = f"{product.name} {product.description}"
-        embedding = await recommendation_service.get_product_embedding(product_text)
-        product.embedding = embedding.tolist()
-    
+from app.models.database import SessionLocal
+from app.services.vector_index import build_vector_index
+from app.services.factorization import run_factor_training
+from app.services.product_stats import run_stats_rebuild
+from app.services.precomputed import run_precompute
+from app.services.catalog_snapshot import run_catalog_snapshot
+from app.services.embeddings import (
+    Encoder, get_encoder, product_text, content_hash, vector_to_bytes, bytes_to_vector
+)
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BATCH_SIZE = 256
+READ_CHUNK_SIZE = 1000
+PRECOMPUTE_REFRESH_MINUTES = 15
+CATALOG_SNAPSHOT_REFRESH_MINUTES = 60
+
+def update_product_embeddings(
+    db: Session,
+    encoder: Optional[Encoder] = None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    since: Optional[datetime] = None
+) -> int:
+    """Encode products whose name/description changed since the last run.
+
+    `since` limits the scan to products updated at or after that time.
+    """
+    encoder = encoder or get_encoder()
+    pending = []
+    updated = 0
+    last_id = 0
+    try:
+        while True:
+            # Each page is fetched completely before anything is written, so
+            # no cursor stays open across the commits (SQLite would lock)
+            rows = _read_page(db, last_id, since)
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            for product_id, name, description, stored_hash in rows:
+                text = product_text(name, description)
+                digest = content_hash(text, encoder)
+                if digest == stored_hash:
+                    continue
+                pending.append((product_id, text, digest, stored_hash is not None))
+                if len(pending) >= batch_size:
+                    updated += _write_batch(db, encoder, pending)
+                    pending = []
+        if pending:
+            updated += _write_batch(db, encoder, pending)
+    except Exception:
+        db.rollback()
+        raise
+
+    logger.info(f"Updated embeddings for {updated} products")
+    return updated
+
+def _read_page(db: Session, after_id: int, since: Optional[datetime]) -> List[Tuple]:
+    query = db.query(
+        models.Product.product_id,
+        models.Product.name,
+        models.Product.description,
+        models.ProductEmbedding.content_hash
+    ).outerjoin(
+        models.ProductEmbedding,
+        models.Product.product_id == models.ProductEmbedding.product_id
+    ).filter(models.Product.product_id > after_id)
+    if since is not None:
+        query = query.filter(models.Product.updated_at >= since)
+    return query.order_by(models.Product.product_id).limit(READ_CHUNK_SIZE).all()
+
+def _write_batch(db: Session, encoder: Encoder, batch: List[Tuple]) -> int:
+    vectors = encoder.encode([text for _, text, _, _ in batch])
+    now = datetime.utcnow()
+    inserts, updates = [], []
+    for (product_id, _, digest, exists), vector in zip(batch, vectors):
+        row = {
+            "product_id": product_id,
+            "vector": vector_to_bytes(vector),
+            "dim": encoder.dim,
+            "content_hash": digest,
+            "updated_at": now
+        }
+        (updates if exists else inserts).append(row)
+
+    if inserts:
+        db.bulk_insert_mappings(models.ProductEmbedding, inserts)
+    if updates:
+        db.bulk_update_mappings(models.ProductEmbedding, updates)
     db.commit()
+    return len(batch)
+
+def load_product_embeddings(db: Session, dim: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Read stored vectors as (product_ids, matrix), skipping other dimensions."""
+    dim = dim or get_encoder().dim
+    rows = db.query(
+        models.ProductEmbedding.product_id,
+        models.ProductEmbedding.vector
+    ).filter(
+        models.ProductEmbedding.dim == dim
+    ).order_by(models.ProductEmbedding.product_id).yield_per(READ_CHUNK_SIZE)
+
+    product_ids, vectors = [], []
+    for product_id, vector in rows:
+        product_ids.append(product_id)
+        vectors.append(bytes_to_vector(vector))
+
+    if not vectors:
+        return np.empty(0, dtype=np.int64), np.empty((0, dim), dtype=np.float32)
+    return np.asarray(product_ids, dtype=np.int64), np.vstack(vectors)
+
+def run_embedding_update():
+    db = SessionLocal()
+    try:
+        update_product_embeddings(db)
+        build_vector_index(db)
+    finally:
+        db.close()
 
 def schedule_embedding_updates():
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(update_product_embeddings, 'interval', hours=24)
-    scheduler.start()
\ No newline at end of file
+    scheduler.add_job(run_embedding_update, 'interval', hours=24)
+    scheduler.add_job(run_factor_training, 'interval', hours=24)
+    scheduler.add_job(run_stats_rebuild, 'interval', hours=24)
+    # Full rebuild daily; in between only users with new activity are recomputed
+    scheduler.add_job(run_precompute, 'interval', hours=24, kwargs={"full": True})
+    scheduler.add_job(run_precompute, 'interval', minutes=PRECOMPUTE_REFRESH_MINUTES)
+    scheduler.add_job(run_catalog_snapshot, 'interval', minutes=CATALOG_SNAPSHOT_REFRESH_MINUTES)
+    scheduler.start()
+    return scheduler
@@ -0,0 +1,94 @@
+from typing import List, Optional, Protocol, Tuple
+import numpy as np
+import hashlib
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+class Encoder(Protocol):
+    """Anything that turns a batch of texts into an (n, dim) float32 matrix."""
+    name: str
+    dim: int
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        ...
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+class HashingEncoder:
+    """Deterministic bag-of-words encoder using signed feature hashing.
+
+    Needs no model download, so it is the default for local runs and tests.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.name = "hashing"
+        self.dim = dim
+
+    def _bucket(self, token: str) -> Tuple[int, float]:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if value >> 63 else -1.0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                col, sign = self._bucket(token)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+        if rows:
+            np.add.at(vectors, (np.asarray(rows), np.asarray(cols)), np.asarray(signs, dtype=np.float32))
+        return normalize(vectors)
+
+class SentenceTransformerEncoder:
+    """Encoder backed by a local sentence-transformers model (optional dependency)."""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = f"st:{model_name}"
+        self._model = SentenceTransformer(model_name)
+        self.dim = self._model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self._model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+        return normalize(vectors.astype(np.float32))
+
+_default_encoder: Optional[Encoder] = None
+
+def get_encoder() -> Encoder:
+    global _default_encoder
+    if _default_encoder is None:
+        _default_encoder = HashingEncoder()
+    return _default_encoder
+
+def set_encoder(encoder: Encoder) -> None:
+    global _default_encoder
+    _default_encoder = encoder
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+def product_text(name: Optional[str], description: Optional[str]) -> str:
+    return f"{name or ''} {description or ''}".strip()
+
+def content_hash(text: str, encoder: Encoder) -> str:
+    """Hash of the encoded text and encoder, so a model change forces re-encoding."""
+    key = f"{encoder.name}:{encoder.dim}:{text}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def vector_to_bytes(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+def bytes_to_vector(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.float32)
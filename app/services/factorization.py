@@ -0,0 +1,275 @@
+from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from app.models import models
+from app.services import artifacts
+import scipy.sparse as sp
+import numpy as np
+import json
+import os
+import resource
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "factors"
+READ_CHUNK_SIZE = 10000
+SOLVE_CHUNK_SIZE = 128  # Most rows solved in one batched LAPACK call; small blocks stay in cache
+SOLVE_BLOCK_ENTRIES = 1 << 16  # Cap on rows x padded interactions per block, bounding its memory
+
+# Interaction strength feeding the implicit-feedback confidence
+VIEW_WEIGHT = 1.0
+PURCHASE_WEIGHT = 5.0
+RATING_WEIGHT = 1.0
+
+class FactorModel:
+    """User and item factors produced by the trainer."""
+
+    def __init__(
+        self,
+        user_ids: np.ndarray,
+        user_factors: np.ndarray,
+        item_ids: np.ndarray,
+        item_factors: np.ndarray,
+        meta: Optional[Dict] = None
+    ):
+        self.user_ids = user_ids
+        self.user_factors = user_factors
+        self.item_ids = item_ids
+        self.item_factors = item_factors
+        self.meta = meta or {}
+        self._user_rows = {int(u): i for i, u in enumerate(user_ids)}
+
+    def user_vector(self, user_id: int) -> Optional[np.ndarray]:
+        row = self._user_rows.get(user_id)
+        return None if row is None else np.asarray(self.user_factors[row])
+
+    def recommend(self, user_id: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (product_ids, scores) of the k highest scoring items for the user."""
+        vector = self.user_vector(user_id)
+        if vector is None or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.item_factors @ vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return np.asarray(self.item_ids[top]), scores[top]
+
+    def save(self, directory: str) -> None:
+        np.save(os.path.join(directory, "user_ids.npy"), self.user_ids)
+        np.save(os.path.join(directory, "user_factors.npy"), self.user_factors)
+        np.save(os.path.join(directory, "item_ids.npy"), self.item_ids)
+        np.save(os.path.join(directory, "item_factors.npy"), self.item_factors)
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(self.meta, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str) -> "FactorModel":
+        meta = {}
+        if os.path.exists(os.path.join(directory, "meta.json")):
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+        return cls(
+            np.load(os.path.join(directory, "user_ids.npy")),
+            np.load(os.path.join(directory, "user_factors.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "item_ids.npy")),
+            np.load(os.path.join(directory, "item_factors.npy"), mmap_mode="r"),
+            meta
+        )
+
+class FactorModelStore(artifacts.ArtifactStore):
+    def __init__(self, check_interval: float = 60.0):
+        super().__init__(MODEL_NAME, FactorModel.load, check_interval)
+
+def load_current_model() -> Optional[FactorModel]:
+    version = artifacts.current_version(MODEL_NAME)
+    if version is None:
+        return None
+    return FactorModel.load(artifacts.version_path(MODEL_NAME, version))
+
+def load_interactions(db: Session) -> Tuple[sp.csr_matrix, np.ndarray, np.ndarray]:
+    """Stream interactions into a sparse user x item strength matrix."""
+    rows = db.query(
+        models.UserInteraction.user_id,
+        models.UserInteraction.product_id,
+        models.UserInteraction.rating,
+        models.UserInteraction.view_count,
+        models.UserInteraction.purchase_count
+    ).yield_per(READ_CHUNK_SIZE)
+
+    users, items, values = [], [], []
+    chunk_users, chunk_items, chunk_values = [], [], []
+    for user_id, product_id, rating, view_count, purchase_count in rows:
+        chunk_users.append(user_id)
+        chunk_items.append(product_id)
+        chunk_values.append(
+            VIEW_WEIGHT * (view_count or 0)
+            + PURCHASE_WEIGHT * (purchase_count or 0)
+            + RATING_WEIGHT * (rating or 0)
+        )
+        if len(chunk_users) >= READ_CHUNK_SIZE:
+            users.append(np.asarray(chunk_users, dtype=np.int64))
+            items.append(np.asarray(chunk_items, dtype=np.int64))
+            values.append(np.asarray(chunk_values, dtype=np.float32))
+            chunk_users, chunk_items, chunk_values = [], [], []
+    if chunk_users:
+        users.append(np.asarray(chunk_users, dtype=np.int64))
+        items.append(np.asarray(chunk_items, dtype=np.int64))
+        values.append(np.asarray(chunk_values, dtype=np.float32))
+
+    if not users:
+        return sp.csr_matrix((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    user_ids, user_rows = np.unique(np.concatenate(users), return_inverse=True)
+    item_ids, item_cols = np.unique(np.concatenate(items), return_inverse=True)
+    matrix = sp.csr_matrix(
+        (np.concatenate(values), (user_rows, item_cols)),
+        shape=(len(user_ids), len(item_ids)),
+        dtype=np.float32
+    )
+    matrix.sum_duplicates()
+    return matrix, user_ids, item_ids
+
+def train(
+    db: Session,
+    factors: int = 64,
+    iterations: int = 15,
+    regularization: float = 0.05,
+    alpha: float = 10.0,
+    warm_start: bool = True,
+    warm_iterations: int = 3,
+    workers: Optional[int] = None,
+    seed: int = 0
+) -> Tuple[FactorModel, Dict]:
+    """Fit implicit-feedback ALS factors, optionally continuing from the published model."""
+    started = time.perf_counter()
+    strengths, user_ids, item_ids = load_interactions(db)
+    loaded = time.perf_counter()
+
+    # Hu, Koren & Volinsky confidence: c = 1 + alpha * strength, preference 1 where observed
+    confidence = strengths.copy()
+    confidence.data = 1.0 + alpha * confidence.data
+    confidence_t = confidence.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+    user_factors = (rng.standard_normal((len(user_ids), factors)) * 0.01).astype(np.float32)
+    item_factors = (rng.standard_normal((len(item_ids), factors)) * 0.01).astype(np.float32)
+
+    previous = load_current_model() if warm_start else None
+    if previous is not None and previous.item_factors.shape[1] == factors:
+        _copy_rows(user_factors, user_ids, previous.user_factors, previous.user_ids)
+        _copy_rows(item_factors, item_ids, previous.item_factors, previous.item_ids)
+        iterations = warm_iterations
+    else:
+        previous = None
+
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(iterations):
+            user_factors = _solve(confidence, item_factors, regularization, pool)
+            item_factors = _solve(confidence_t, user_factors, regularization, pool)
+
+    finished = time.perf_counter()
+    report = {
+        "users": int(len(user_ids)),
+        "items": int(len(item_ids)),
+        "interactions": int(strengths.nnz),
+        "factors": factors,
+        "iterations": iterations,
+        "regularization": regularization,
+        "alpha": alpha,
+        "warm_start": previous is not None,
+        "load_seconds": round(loaded - started, 3),
+        "train_seconds": round(finished - loaded, 3),
+        "matrix_bytes": int(confidence.data.nbytes + confidence.indices.nbytes + confidence.indptr.nbytes) * 2,
+        "factor_bytes": int(user_factors.nbytes + item_factors.nbytes),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+    logger.info(f"Trained factors: {report}")
+    return FactorModel(user_ids, user_factors, item_ids, item_factors, report), report
+
+def train_and_publish(db: Session, **kwargs) -> str:
+    model, _ = train(db, **kwargs)
+    build_dir = artifacts.new_version_dir(MODEL_NAME)
+    model.save(build_dir)
+    return artifacts.publish(MODEL_NAME, build_dir)
+
+def run_factor_training():
+    from app.models.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        train_and_publish(db)
+    finally:
+        db.close()
+
+def _solve(
+    confidence: sp.csr_matrix,
+    fixed: np.ndarray,
+    regularization: float,
+    pool: ThreadPoolExecutor
+) -> np.ndarray:
+    """One ALS half-step: solve every row of `confidence` against the fixed factors.
+
+    Rows are grouped by interaction count into blocks, and each block is
+    solved with one batched `np.linalg.solve`. BLAS and LAPACK release the
+    GIL, so the pool's threads run blocks in parallel.
+    """
+    n_rows, factors = confidence.shape[0], fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(factors, dtype=np.float32)
+    solved = np.zeros((n_rows, factors), dtype=np.float32)
+
+    # Rows of similar length share a block, so little of it is padding
+    lengths = np.diff(confidence.indptr)
+    order = np.argsort(lengths, kind="stable")
+    order = order[lengths[order] > 0]
+    blocks = []
+    start = 0
+    while start < len(order):
+        longest = int(lengths[order[min(start + SOLVE_CHUNK_SIZE, len(order)) - 1]])
+        size = max(1, min(SOLVE_CHUNK_SIZE, SOLVE_BLOCK_ENTRIES // longest))
+        blocks.append(order[start:start + size])
+        start += size
+
+    # Padding points at this extra zero row
+    fixed = np.vstack([fixed, np.zeros((1, factors), dtype=fixed.dtype)])
+
+    def solve_block(rows: np.ndarray) -> None:
+        solved[rows] = _solve_block(confidence, fixed, gram, rows, lengths[rows])
+
+    list(pool.map(solve_block, blocks))
+    return solved
+
+def _solve_block(
+    confidence: sp.csr_matrix,
+    fixed: np.ndarray,
+    gram: np.ndarray,
+    rows: np.ndarray,
+    lengths: np.ndarray
+) -> np.ndarray:
+    """Factors for `rows`, with their interactions padded to the longest row.
+
+    Padding has weight 0 and reads the zero last row of `fixed`.
+    """
+    slots = np.arange(lengths.max())
+    mask = slots < lengths[:, None]
+    entries = (confidence.indptr[rows][:, None] + slots)[mask]
+
+    columns = np.full(mask.shape, len(fixed) - 1, dtype=np.int64)
+    columns[mask] = confidence.indices[entries]
+    observed = fixed[columns]
+    weights = np.zeros(mask.shape, dtype=np.float32)
+    weights[mask] = confidence.data[entries]
+
+    observed_t = observed.transpose(0, 2, 1)
+    a = gram + np.matmul(observed_t * (weights - 1.0)[:, None, :], observed)
+    b = np.matmul(observed_t, weights[:, :, None])
+    return np.linalg.solve(a, b)[:, :, 0]
+
+def _copy_rows(target: np.ndarray, target_ids: np.ndarray, source: np.ndarray, source_ids: np.ndarray) -> None:
+    positions = {int(i): row for row, i in enumerate(source_ids)}
+    for row, i in enumerate(target_ids):
+        source_row = positions.get(int(i))
+        if source_row is not None:
+            target[row] = source[source_row]
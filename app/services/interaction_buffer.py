@@ -0,0 +1,251 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, tuple_
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from app.models import models
+from app.models.database import upsert
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_CHUNK_SIZE = 500
+
+class BufferFull(Exception):
+    pass
+
+class InteractionBuffer:
+    """Write-behind buffer for interaction events.
+
+    Events are coalesced per (user_id, product_id) and written with bulk
+    upserts when `flush_size` keys are pending or every `flush_interval`
+    seconds. At most `max_pending` keys are held; producers wait up to
+    `enqueue_timeout` for space and then get `BufferFull`.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        max_pending: int = 50000,
+        flush_size: int = 5000,
+        flush_interval: float = 1.0,
+        enqueue_timeout: float = 2.0,
+        on_flush: Optional[Callable[[Set[int], Set[int]], Awaitable[None]]] = None
+    ):
+        self.session_factory = session_factory
+        self.max_pending = max_pending
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.on_flush = on_flush
+        # (user_id, product_id) -> [views, purchases, rating]
+        self._pending: Dict[Tuple[int, int], List] = {}
+        self._space: Optional[asyncio.Condition] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def add(self, events: List) -> int:
+        """Queue events (objects with user_id, product_id, views, purchases, rating).
+
+        All or nothing: either every event is queued or `BufferFull` is raised.
+        """
+        if self._stopped:
+            raise BufferFull("Interaction buffer is stopped")
+        self._ensure_started()
+        deadline = time.monotonic() + self.enqueue_timeout
+        keys = {(event.user_id, event.product_id) for event in events}
+        if len(keys) > self.max_pending:
+            raise BufferFull("Batch is larger than the interaction buffer")
+
+        async with self._space:
+            while len(self._pending) + sum(1 for key in keys if key not in self._pending) > self.max_pending:
+                self._wakeup.set()
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    await asyncio.wait_for(self._space.wait(), remaining)
+                except asyncio.TimeoutError:
+                    raise BufferFull("Interaction buffer full")
+
+            for event in events:
+                entry = self._pending.setdefault((event.user_id, event.product_id), [0, 0, None])
+                entry[0] += event.views
+                entry[1] += event.purchases
+                if event.rating is not None:
+                    entry[2] = event.rating
+
+        if len(self._pending) >= self.flush_size:
+            self._wakeup.set()
+        return len(events)
+
+    async def flush(self) -> int:
+        """Write everything pending; returns the number of (user, product) rows touched."""
+        self._ensure_started()
+        async with self._flush_lock:
+            batch, self._pending = self._pending, {}
+            async with self._space:
+                self._space.notify_all()
+            if not batch:
+                return 0
+
+            written = False
+            try:
+                async with self.session_factory() as db:
+                    await db.run_sync(write_interactions, batch)
+                    written = True
+            except Exception as e:
+                logger.error(f"Error flushing {len(batch)} interactions: {str(e)}")
+                raise
+            finally:
+                # Also on cancellation, so a flush cut short by shutdown loses nothing
+                if not written:
+                    self._requeue(batch)
+
+            if self.on_flush is not None:
+                await self.on_flush({key[0] for key in batch}, {key[1] for key in batch})
+            return len(batch)
+
+    async def stop(self) -> None:
+        """Stop the background flusher for good and write what is still pending."""
+        self._stopped = True
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def _ensure_started(self) -> None:
+        if self._flush_lock is None:
+            self._space = asyncio.Condition()
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+        if self._task is None and not self._stopped:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                await asyncio.sleep(self.flush_interval)  # Retry the requeued batch later
+
+    def _requeue(self, batch: Dict[Tuple[int, int], List]) -> None:
+        for key, (views, purchases, rating) in batch.items():
+            entry = self._pending.setdefault(key, [0, 0, None])
+            entry[0] += views
+            entry[1] += purchases
+            if entry[2] is None:
+                entry[2] = rating
+
+def write_interactions(db: Session, batch: Dict[Tuple[int, int], List]) -> None:
+    """Bulk upsert coalesced interaction increments and their product stats.
+
+    Rows are written with one upsert on (user_id, product_id), increments
+    applied in SQL, so concurrent writers neither lose counts nor create
+    duplicates. Existing rows are only read to work out the stats deltas.
+    """
+    from app.services.product_stats import apply_interaction_delta
+
+    interactions = models.UserInteraction
+    batch = _drop_unknown(db, batch)
+    if not batch:
+        return
+    keys = list(batch)
+    existing = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+        rows = db.query(
+            interactions.user_id,
+            interactions.product_id,
+            interactions.rating
+        ).filter(tuple_(interactions.user_id, interactions.product_id).in_(chunk)).all()
+        for user_id, product_id, rating in rows:
+            existing[(user_id, product_id)] = rating
+
+    now = datetime.utcnow()
+    rows = []
+    deltas: Dict[int, List[int]] = {}  # product_id -> [rating, rating_count, interactions, views, purchases]
+    for (user_id, product_id), (views, purchases, rating) in batch.items():
+        rows.append({
+            "user_id": user_id,
+            "product_id": product_id,
+            "rating": rating,
+            "view_count": views,
+            "purchase_count": purchases,
+            "interaction_date": now
+        })
+        delta = deltas.setdefault(product_id, [0, 0, 0, 0, 0])
+        delta[3] += views
+        delta[4] += purchases
+        if (user_id, product_id) in existing:
+            previous_rating = existing[(user_id, product_id)]
+            if rating is not None:
+                delta[0] += rating - (previous_rating or 0)
+                delta[1] += 0 if previous_rating is not None else 1
+        else:
+            delta[2] += 1
+            if rating is not None:
+                delta[0] += rating
+                delta[1] += 1
+
+    table = interactions.__table__
+    statement = upsert(db, table, ("user_id", "product_id"), lambda new: {
+        "view_count": func.coalesce(table.c.view_count, 0) + new.view_count,
+        "purchase_count": func.coalesce(table.c.purchase_count, 0) + new.purchase_count,
+        "rating": func.coalesce(new.rating, table.c.rating),
+        "interaction_date": new.interaction_date
+    })
+    try:
+        db.execute(statement, rows)
+        for product_id, (rating, rating_count, interaction_count, views, purchases) in deltas.items():
+            apply_interaction_delta(
+                db,
+                product_id,
+                rating_delta=rating,
+                rating_count_delta=rating_count,
+                interaction_delta=interaction_count,
+                view_delta=views,
+                purchase_delta=purchases
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def _drop_unknown(db: Session, batch: Dict[Tuple[int, int], List]) -> Dict[Tuple[int, int], List]:
+    # One bad id must not make the whole batch fail (and be retried) forever
+    user_ids = list({user_id for user_id, _ in batch})
+    product_ids = list({product_id for _, product_id in batch})
+    known_users, known_products = set(), set()
+    for start in range(0, len(user_ids), LOOKUP_CHUNK_SIZE):
+        known_users.update(row[0] for row in db.query(models.User.user_id).filter(
+            models.User.user_id.in_(user_ids[start:start + LOOKUP_CHUNK_SIZE])
+        ))
+    for start in range(0, len(product_ids), LOOKUP_CHUNK_SIZE):
+        known_products.update(row[0] for row in db.query(models.Product.product_id).filter(
+            models.Product.product_id.in_(product_ids[start:start + LOOKUP_CHUNK_SIZE])
+        ))
+
+    valid = {
+        key: value for key, value in batch.items()
+        if key[0] in known_users and key[1] in known_products
+    }
+    if len(valid) < len(batch):
+        logger.warning(f"Dropped {len(batch) - len(valid)} interactions for unknown users or products")
+    return valid
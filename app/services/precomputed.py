@@ -0,0 +1,408 @@
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from app.models import models
+from app.services import artifacts
+import numpy as np
+import asyncio
+import json
+import os
+import redis
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTED_NAME = "precomputed_recommendations"
+PRECOMPUTE_TOP_N = int(os.getenv("PRECOMPUTE_TOP_N", "20"))
+ACTIVE_USER_DAYS = int(os.getenv("PRECOMPUTE_ACTIVE_DAYS", "30"))
+ALL_CATEGORIES = ""  # Category key of the unfiltered list
+# Redis sorted sets of user ids / category keys scored by the time of their last change,
+# shared by all workers
+CHANGED_USERS_KEY = "precomputed:user_changes"
+CHANGED_SCOPES_KEY = "precomputed:scope_changes"
+CHANGED_TTL = 2 * 86400  # Longer than the full rebuild interval
+CHANGED_SYNC_INTERVAL = float(os.getenv("PRECOMPUTED_SYNC_INTERVAL", "1.0"))
+CHANGED_SYNC_OVERLAP = 60.0  # Seconds re-read on each sync, covering clock skew between workers
+EPOCH = datetime(1970, 1, 1)
+
+class PrecomputedRecommendations:
+    """Top-N recommendation lists for active users and for every category.
+
+    Lists are stored as flat arrays: the user at position i of the sorted
+    `user_ids` owns `user_products[user_offsets[i]:user_offsets[i + 1]]`.
+    Users without a personalized ranking have no list of their own; the live
+    service would give them the popularity list of the category, so that is
+    what they are served.
+    """
+
+    def __init__(
+        self,
+        meta: Dict,
+        user_ids: np.ndarray,
+        personalized: np.ndarray,
+        user_offsets: np.ndarray,
+        user_products: np.ndarray,
+        user_scores: np.ndarray,
+        category_offsets: np.ndarray,
+        category_products: np.ndarray,
+        category_scores: np.ndarray
+    ):
+        self.meta = meta
+        self.user_ids = user_ids
+        self.personalized = personalized
+        self.user_offsets = user_offsets
+        self.user_products = user_products
+        self.user_scores = user_scores
+        self.category_offsets = category_offsets
+        self.category_products = category_products
+        self.category_scores = category_scores
+        self._categories = {name: i for i, name in enumerate(meta["categories"])}
+
+    @property
+    def top_n(self) -> int:
+        return self.meta["top_n"]
+
+    @property
+    def built_at(self) -> datetime:
+        return datetime.fromisoformat(self.meta["built_at"])
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def lookup(
+        self,
+        user_id: int,
+        category: Optional[str],
+        limit: int
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(product_ids, scores) for the request, or None when it must be computed live."""
+        if limit > self.top_n:
+            return None
+        position = self._user_position(user_id)
+        if position is None:
+            return None  # Cold or inactive user
+
+        if self.personalized[position]:
+            if category:
+                return None  # Personalized rankings are only kept unfiltered
+            start, end = self.user_offsets[position], self.user_offsets[position + 1]
+            return self.user_products[start:end][:limit], self.user_scores[start:end][:limit]
+
+        index = self._categories.get((category or ALL_CATEGORIES).lower())
+        if index is None:
+            return None
+        start, end = self.category_offsets[index], self.category_offsets[index + 1]
+        return self.category_products[start:end][:limit], self.category_scores[start:end][:limit]
+
+    def is_personalized(self, user_id: int) -> Optional[bool]:
+        """Whether the user has a list of their own (None when the user has no entry)."""
+        position = self._user_position(user_id)
+        return None if position is None else bool(self.personalized[position])
+
+    def user_lists(self) -> Iterable[Tuple[int, bool, np.ndarray, np.ndarray]]:
+        for position, user_id in enumerate(self.user_ids):
+            start, end = self.user_offsets[position], self.user_offsets[position + 1]
+            yield (
+                int(user_id),
+                bool(self.personalized[position]),
+                self.user_products[start:end],
+                self.user_scores[start:end]
+            )
+
+    def _user_position(self, user_id: int) -> Optional[int]:
+        position = int(np.searchsorted(self.user_ids, user_id))
+        if position < len(self.user_ids) and self.user_ids[position] == user_id:
+            return position
+        return None
+
+    def save(self, directory: str) -> None:
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(self.meta, f)
+        for name in (
+            "user_ids", "personalized", "user_offsets", "user_products", "user_scores",
+            "category_offsets", "category_products", "category_scores"
+        ):
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str) -> "PrecomputedRecommendations":
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in (
+                "user_ids", "personalized", "user_offsets", "user_products", "user_scores",
+                "category_offsets", "category_products", "category_scores"
+            )
+        }
+        return cls(meta, **arrays)
+
+    @classmethod
+    def from_lists(
+        cls,
+        built_at: datetime,
+        top_n: int,
+        users: Dict[int, Tuple[bool, np.ndarray, np.ndarray]],
+        categories: Dict[str, Tuple[np.ndarray, np.ndarray]]
+    ) -> "PrecomputedRecommendations":
+        user_ids = np.array(sorted(users), dtype=np.int64)
+        user_lists = [users[int(user_id)] for user_id in user_ids]
+        user_products, user_scores, user_offsets = _flatten([(p, s) for _, p, s in user_lists])
+        names = list(categories)
+        category_products, category_scores, category_offsets = _flatten([categories[name] for name in names])
+        return cls(
+            {"built_at": built_at.isoformat(), "top_n": top_n, "categories": names},
+            user_ids,
+            np.array([personalized for personalized, _, _ in user_lists], dtype=bool),
+            user_offsets,
+            user_products,
+            user_scores,
+            category_offsets,
+            category_products,
+            category_scores
+        )
+
+class PrecomputedStore(artifacts.ArtifactStore):
+    """Serves the published lists, except for users and categories changed since they were built.
+
+    Changes are recorded in this process and, with a Redis client, shared
+    with the other workers through two sorted sets scored by change time.
+    Lookups only read local state: a background task (`start_sync`) pushes
+    local changes and pulls other workers' every `sync_interval` seconds,
+    so their changes take effect here within about that long.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        check_interval: float = 30.0,
+        sync_interval: float = CHANGED_SYNC_INTERVAL
+    ):
+        super().__init__(PRECOMPUTED_NAME, PrecomputedRecommendations.load, check_interval)
+        self.redis_client = redis_client
+        self.sync_interval = sync_interval
+        self._changed: Dict[int, datetime] = {}
+        self._changed_scopes: Dict[str, datetime] = {}
+        # Local changes not yet shared, per sorted set
+        self._unshared: Dict[str, Dict[str, datetime]] = {CHANGED_USERS_KEY: {}, CHANGED_SCOPES_KEY: {}}
+        self._pulled_at: Optional[float] = None  # Score up to which other workers' changes are known
+        self._changed_lock = threading.Lock()
+        self._sync_task: Optional[asyncio.Task] = None
+
+    def mark_changed(self, user_ids: Iterable[int]) -> None:
+        """Stop serving the users' lists until the next build."""
+        changed_at = datetime.utcnow()
+        with self._changed_lock:
+            for user_id in user_ids:
+                self._changed[user_id] = changed_at
+                if self.redis_client is not None:
+                    self._unshared[CHANGED_USERS_KEY][str(user_id)] = changed_at
+
+    def mark_scopes_changed(self, categories: Iterable[Optional[str]]) -> None:
+        """Stop serving the category lists (None for unfiltered) until the next build."""
+        changed_at = datetime.utcnow()
+        with self._changed_lock:
+            for category in categories:
+                key = (category or ALL_CATEGORIES).lower()
+                self._changed_scopes[key] = changed_at
+                if self.redis_client is not None:
+                    self._unshared[CHANGED_SCOPES_KEY][key] = changed_at
+
+    def lookup(
+        self,
+        user_id: int,
+        category: Optional[str],
+        limit: int
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        store = self.get()
+        if store is None:
+            return None
+        personalized = store.is_personalized(user_id)
+        if personalized is None:
+            return None  # Cold or inactive user
+        # Users without a list of their own are served the category list
+        scope = None if personalized else (category or ALL_CATEGORIES).lower()
+        user_changed_at = self._changed.get(user_id)
+        if user_changed_at is not None and user_changed_at >= store.built_at:
+            return None  # Newer activity than the published list
+        scope_changed_at = self._changed_scopes.get(scope) if scope is not None else None
+        if scope_changed_at is not None and scope_changed_at >= store.built_at:
+            return None  # Product stats in the category changed since the build
+        return store.lookup(user_id, category, limit)
+
+    def reload(self) -> None:
+        super().reload()
+        store = self._value
+        if store is not None:
+            with self._changed_lock:
+                self._changed = {
+                    user_id: changed_at for user_id, changed_at in self._changed.items()
+                    if changed_at >= store.built_at
+                }
+                self._changed_scopes = {
+                    key: changed_at for key, changed_at in self._changed_scopes.items()
+                    if changed_at >= store.built_at
+                }
+
+    def sync(self) -> None:
+        """Share local changes and fetch other workers' (blocking; run in a thread)."""
+        if self.redis_client is None:
+            return
+        with self._changed_lock:
+            unshared = self._unshared
+            self._unshared = {CHANGED_USERS_KEY: {}, CHANGED_SCOPES_KEY: {}}
+        now = _score(datetime.utcnow())
+        # Overlap, so changes written late by a worker with a lagging clock are still seen
+        since = self._pulled_at - CHANGED_SYNC_OVERLAP if self._pulled_at is not None else "-inf"
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, changes in unshared.items():
+                if changes:
+                    pipe.zadd(key, {member: _score(changed_at) for member, changed_at in changes.items()}, gt=True)
+                pipe.zremrangebyscore(key, "-inf", now - CHANGED_TTL)
+            pipe.zrangebyscore(CHANGED_USERS_KEY, since, "+inf", withscores=True)
+            pipe.zrangebyscore(CHANGED_SCOPES_KEY, since, "+inf", withscores=True)
+            users, scopes = pipe.execute()[-2:]
+        except redis.RedisError as e:
+            with self._changed_lock:
+                for key, changes in unshared.items():
+                    for member, changed_at in changes.items():
+                        self._unshared[key].setdefault(member, changed_at)
+            logger.warning(f"Error syncing precomputed changes with redis: {str(e)}")
+            return
+
+        with self._changed_lock:
+            for member, score in users:
+                _keep_latest(self._changed, int(member), _changed_at(score))
+            for member, score in scopes:
+                _keep_latest(self._changed_scopes, member.decode(), _changed_at(score))
+        self._pulled_at = now
+
+    def start_sync(self) -> None:
+        """Run `sync` every `sync_interval` seconds on the running event loop, off its thread."""
+        if self.redis_client is not None and self._sync_task is None:
+            self._sync_task = asyncio.get_running_loop().create_task(self._run_sync())
+
+    async def stop_sync(self) -> None:
+        task, self._sync_task = self._sync_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.to_thread(self.sync)  # Share what is left
+
+    async def _run_sync(self) -> None:
+        while True:
+            await asyncio.to_thread(self.sync)
+            await asyncio.sleep(self.sync_interval)
+
+def active_user_ids(db: Session, since: datetime) -> Set[int]:
+    """Users with interactions or feedback at or after `since`."""
+    user_ids = {
+        row[0] for row in db.query(models.UserInteraction.user_id).filter(
+            models.UserInteraction.interaction_date >= since
+        ).distinct()
+    }
+    user_ids.update(
+        row[0] for row in db.query(models.UserFeedback.user_id).filter(
+            models.UserFeedback.created_at >= since
+        ).distinct()
+    )
+    return user_ids
+
+def build_precomputed(
+    db: Session,
+    service,
+    previous: Optional[PrecomputedRecommendations] = None,
+    top_n: int = PRECOMPUTE_TOP_N
+) -> PrecomputedRecommendations:
+    """Compute lists for every active user, or only changed users when `previous` is given.
+
+    `service` is a `RecommendationService` with a stats index; its rankings
+    are stored as-is so lookups match what it would return live.
+    """
+    # Taken before reading anything, so activity during the build is picked up next time
+    built_at = datetime.utcnow().replace(microsecond=0)
+    service.stats_index.load(db)
+    service.categories.load(db)
+
+    users: Dict[int, Tuple[bool, np.ndarray, np.ndarray]] = {}
+    if previous is not None and previous.top_n == top_n:
+        for user_id, personalized, products, scores in previous.user_lists():
+            users[user_id] = (personalized, np.array(products), np.array(scores))
+        changed = active_user_ids(db, previous.built_at)
+    else:
+        changed = active_user_ids(db, built_at - timedelta(days=ACTIVE_USER_DAYS))
+
+    index = service.stats_index
+    for user_id in changed:
+        positions, scores, personalized = service.rank(db, user_id, top_n, [])
+        if not personalized:
+            users[user_id] = (False, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+            continue
+        users[user_id] = (
+            True,
+            index.product_ids[positions].astype(np.int64),
+            np.asarray(scores if scores is not None else index.scores(positions), dtype=np.float32)
+        )
+
+    categories = {}
+    for name in [ALL_CATEGORIES] + service.categories.names(db):
+        category_ids = service.categories.resolve(db, name) if name else []
+        positions = index.top_k(top_n, category_ids)
+        categories[name] = (
+            index.product_ids[positions].astype(np.int64),
+            index.scores(positions).astype(np.float32)
+        )
+
+    logger.info(
+        f"Precomputed recommendations for {len(changed)} users "
+        f"({len(users)} stored) and {len(categories)} categories"
+    )
+    return PrecomputedRecommendations.from_lists(built_at, top_n, users, categories)
+
+def precompute_and_publish(db: Session, full: bool = False) -> str:
+    from app.core.cache import redis_client
+    from app.services.recommendation import create_service
+
+    service = create_service(redis_client=redis_client)
+    previous = None
+    version = artifacts.current_version(PRECOMPUTED_NAME)
+    if not full and version is not None:
+        previous = PrecomputedRecommendations.load(artifacts.version_path(PRECOMPUTED_NAME, version))
+
+    store = build_precomputed(db, service, previous)
+    build_dir = artifacts.new_version_dir(PRECOMPUTED_NAME)
+    store.save(build_dir)
+    return artifacts.publish(PRECOMPUTED_NAME, build_dir)
+
+def run_precompute(full: bool = False):
+    from app.models.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        precompute_and_publish(db, full=full)
+    finally:
+        db.close()
+
+def _flatten(lists: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    lengths = [len(products) for products, _ in lists]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    if not lists:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), offsets
+    products = np.concatenate([np.asarray(p, dtype=np.int64) for p, _ in lists])
+    scores = np.concatenate([np.asarray(s, dtype=np.float32) for _, s in lists])
+    return products, scores, offsets
+
+def _score(changed_at: datetime) -> float:
+    return (changed_at - EPOCH).total_seconds()
+
+def _changed_at(score: float) -> datetime:
+    return EPOCH + timedelta(seconds=score)
+
+def _keep_latest(changes: Dict, key, changed_at: datetime) -> None:
+    if key not in changes or changes[key] < changed_at:
+        changes[key] = changed_at
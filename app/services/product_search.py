@@ -0,0 +1,349 @@
+from sqlalchemy.orm import Session, Query
+from sqlalchemy import and_, or_
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from app.models import models
+from app.services.category_tree import category_tree
+import base64
+import bisect
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+STREAM_PAGE_SIZE = 500
+SORT_READ_CHUNK_SIZE = 5000  # Ranked ids per sort-key query when no stats index is available
+SORTS = ("price_asc", "price_desc", "rating")
+EXPANDABLE = ("category", "feedback")
+
+# Columns of the lightweight projection; relationships are only loaded on request
+PRODUCT_COLUMNS = (
+    models.Product.product_id,
+    models.Product.name,
+    models.Product.description,
+    models.Product.price,
+    models.Product.category_id,
+    models.Product.image_url,
+    models.Product.created_at
+)
+
+class InvalidSearchRequest(ValueError):
+    pass
+
+def encode_cursor(sort_by: str, value, product_id: int) -> str:
+    data = json.dumps([sort_by, value, product_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+def decode_cursor(cursor: str, sort_by: str) -> Tuple[Optional[float], int]:
+    try:
+        cursor_sort, value, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise InvalidSearchRequest("Malformed cursor")
+    if cursor_sort != sort_by:
+        raise InvalidSearchRequest("Cursor was issued for a different sort order")
+    return value, int(product_id)
+
+def parse_expand(expand: Optional[str]) -> Tuple[str, ...]:
+    if not expand:
+        return ()
+    fields = tuple(field.strip() for field in expand.split(",") if field.strip())
+    unknown = [field for field in fields if field not in EXPANDABLE]
+    if unknown:
+        raise InvalidSearchRequest(f"Cannot expand: {', '.join(unknown)}")
+    return fields
+
+def search_page(
+    db: Session,
+    query: Optional[str],
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort_by: str = "relevance",
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    expand: Sequence[str] = (),
+    stats_index=None
+) -> Tuple[List[Dict], Optional[str]]:
+    """One page of search results and the cursor for the next page (None at the end).
+
+    With a loaded `stats_index`, ranked matches are sorted by price or rating
+    in memory and only the page itself is read from the database.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor, sort_by) if cursor else None
+
+    plan = _plan(db, query, category, min_price, max_price, sort_by, stats_index)
+    if plan is None:
+        return [], None
+    products_query, ordered = plan
+    if ordered is None:
+        rows, next_cursor = _keyset_page(products_query, sort_by, limit, after)
+        return _to_items(db, rows, expand), next_cursor
+
+    start = _position_after(ordered, sort_by, after) if after is not None else 0
+    rows, keys, position = _ordered_page(products_query, ordered, start, limit)
+    next_cursor = None
+    if len(rows) == limit and position < len(ordered):
+        next_cursor = encode_cursor(sort_by, keys[-1], rows[-1].product_id)
+    return _to_items(db, rows, expand), next_cursor
+
+def stream_search(
+    db: Session,
+    query: Optional[str],
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort_by: str = "relevance",
+    expand: Sequence[str] = (),
+    stats_index=None,
+    page_size: int = STREAM_PAGE_SIZE
+) -> Iterator[Dict]:
+    """Every matching product, ranked once and then fetched page by page."""
+    plan = _plan(db, query, category, min_price, max_price, sort_by, stats_index)
+    if plan is None:
+        return
+    products_query, ordered = plan
+    if ordered is None:
+        after = None
+        while True:
+            rows, cursor = _keyset_page(products_query, sort_by, page_size, after)
+            yield from _to_items(db, rows, expand)
+            if cursor is None:
+                return
+            after = decode_cursor(cursor, sort_by)
+
+    position = 0
+    while position < len(ordered):
+        rows, _, position = _ordered_page(products_query, ordered, position, page_size)
+        yield from _to_items(db, rows, expand)
+
+def _plan(
+    db: Session,
+    query: Optional[str],
+    category: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    sort_by: str,
+    stats_index
+) -> Optional[Tuple[Query, Optional[List[Tuple[int, float]]]]]:
+    """The filtered query and, for indexed matches, every (product_id, sort key) in page order.
+
+    None when nothing can match. Without an ordered list the query pages by keyset.
+    """
+    from app.services.search_index import search_index
+
+    products_query = db.query(*PRODUCT_COLUMNS)
+
+    category_ids = []
+    if category:
+        category_ids = category_tree.matching(db, category)
+        if not category_ids:
+            return None
+        products_query = products_query.filter(
+            models.Product.category_id.in_(category_ids)
+        )
+
+    if min_price is not None:
+        products_query = products_query.filter(models.Product.price >= min_price)
+    if max_price is not None:
+        products_query = products_query.filter(models.Product.price <= max_price)
+
+    # Ranked matches from the inverted index; None falls back to ILIKE
+    ranking = search_index.search(db, query) if query else None
+    if ranking is not None:
+        if not ranking:
+            return None
+        if sort_by not in SORTS:
+            return products_query, ranking
+        ordered = _index_order(ranking, sort_by, stats_index, category_ids, min_price, max_price)
+        if ordered is None:
+            ordered = _query_order(products_query, ranking, sort_by)
+        return products_query, ordered
+
+    if query:
+        products_query = products_query.filter(
+            or_(
+                models.Product.name.ilike(f"%{query}%"),
+                models.Product.description.ilike(f"%{query}%")
+            )
+        )
+    return products_query, None
+
+def _index_order(
+    ranking: List[Tuple[int, float]],
+    sort_by: str,
+    stats_index,
+    category_ids: List[int],
+    min_price: Optional[float],
+    max_price: Optional[float]
+) -> Optional[List[Tuple[int, float]]]:
+    """Ranked matches filtered and sorted by price or rating from the stats index arrays.
+
+    None when there is no loaded index or it does not know every match yet.
+    """
+    import numpy as np
+
+    if stats_index is None or not stats_index.loaded:
+        return None
+    positions = stats_index.positions(product_id for product_id, _ in ranking)
+    if None in positions:
+        return None
+    positions = np.asarray(positions, dtype=np.int64)
+    price = stats_index.price[positions]
+
+    keep = np.ones(len(positions), dtype=bool)
+    if category_ids:
+        keep &= np.isin(stats_index.category_id[positions], category_ids)
+    if min_price is not None:
+        keep &= price >= min_price
+    if max_price is not None:
+        keep &= price <= max_price
+
+    product_ids = stats_index.product_ids[positions][keep]
+    keys = (stats_index.avg_rating[positions] if sort_by == "rating" else price)[keep]
+    order = np.lexsort((product_ids, keys if sort_by == "price_asc" else -keys))
+    return list(zip(product_ids[order].tolist(), keys[order].tolist()))
+
+def _query_order(products_query: Query, ranking: List[Tuple[int, float]], sort_by: str) -> List[Tuple[int, float]]:
+    """Ranked matches sorted by price or rating, reading the sort key a chunk of ids at a time."""
+    if sort_by == "rating":
+        products_query = products_query.join(
+            models.ProductStats,
+            models.Product.product_id == models.ProductStats.product_id
+        )
+        sort_key = models.ProductStats.avg_rating
+    else:
+        sort_key = models.Product.price
+    products_query = products_query.with_entities(models.Product.product_id, sort_key)
+
+    ordered = []
+    for start in range(0, len(ranking), SORT_READ_CHUNK_SIZE):
+        chunk = [product_id for product_id, _ in ranking[start:start + SORT_READ_CHUNK_SIZE]]
+        ordered.extend(
+            (product_id, float(key or 0))
+            for product_id, key in products_query.filter(models.Product.product_id.in_(chunk))
+        )
+    sign = 1 if sort_by == "price_asc" else -1
+    ordered.sort(key=lambda item: (sign * item[1], item[0]))
+    return ordered
+
+def _position_after(ordered: List[Tuple[int, float]], sort_by: str, after: Tuple[Optional[float], int]) -> int:
+    # Relevance and the descending sorts order by (-key, id), price_asc by (key, id)
+    sign = 1 if sort_by == "price_asc" else -1
+    value, last_id = after
+    return bisect.bisect_right(
+        ordered,
+        (sign * float(value or 0), last_id),
+        key=lambda item: (sign * item[1], item[0])
+    )
+
+def _keyset_page(
+    products_query: Query,
+    sort_by: str,
+    limit: int,
+    after: Optional[Tuple[Optional[float], int]]
+) -> Tuple[list, Optional[str]]:
+    descending = sort_by in ("price_desc", "rating")
+    if sort_by in ("price_asc", "price_desc"):
+        sort_key = models.Product.price
+    elif sort_by == "rating":
+        # Every product has a stats row, so this walks the avg_rating index
+        products_query = products_query.join(
+            models.ProductStats,
+            models.Product.product_id == models.ProductStats.product_id
+        )
+        sort_key = models.ProductStats.avg_rating
+    else:
+        sort_key = None  # Unranked results page in id order
+
+    if sort_key is not None:
+        products_query = products_query.add_columns(sort_key.label('sort_key'))
+
+    if after is not None:
+        value, last_id = after
+        if sort_key is None:
+            products_query = products_query.filter(models.Product.product_id > last_id)
+        else:
+            beyond = sort_key < value if descending else sort_key > value
+            products_query = products_query.filter(
+                or_(beyond, and_(sort_key == value, models.Product.product_id > last_id))
+            )
+
+    if sort_key is not None:
+        products_query = products_query.order_by(
+            sort_key.desc() if descending else sort_key.asc(),
+            models.Product.product_id.asc()
+        )
+    else:
+        products_query = products_query.order_by(models.Product.product_id.asc())
+
+    rows = products_query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    value = float(last.sort_key) if sort_key is not None else None
+    return rows, encode_cursor(sort_by, value, last.product_id)
+
+def _ordered_page(
+    products_query: Query,
+    ordered: List[Tuple[int, float]],
+    start: int,
+    limit: int
+) -> Tuple[list, List[float], int]:
+    """Walk an ordered id list from `start`, checking filters in the database a chunk at a time.
+
+    Returns the rows, their sort keys and the position to continue from.
+    """
+    page, keys = [], []
+    position = start
+    chunk_size = max(limit * 2, 100)
+    while position < len(ordered) and len(page) < limit:
+        chunk = ordered[position:position + chunk_size]
+        rows = products_query.filter(
+            models.Product.product_id.in_([product_id for product_id, _ in chunk])
+        ).all()
+        by_id = {row.product_id: row for row in rows}
+        for offset, (product_id, key) in enumerate(chunk):
+            if product_id in by_id:
+                page.append(by_id[product_id])
+                keys.append(key)
+                if len(page) == limit:
+                    position += offset + 1
+                    break
+        else:
+            position += len(chunk)
+    return page, keys, position
+
+def _to_items(db: Session, rows: Iterable, expand: Sequence[str]) -> List[Dict]:
+    items = [{column.key: getattr(row, column.key) for column in PRODUCT_COLUMNS} for row in rows]
+    return expand_items(db, items, expand)
+
+def expand_items(db: Session, items: List[Dict], expand: Sequence[str]) -> List[Dict]:
+    """Fill `category` and `feedback` of product dicts (None unless expanded)."""
+    for item in items:
+        item["category"] = None
+        item["feedback"] = None
+
+    if "category" in expand:
+        for item in items:
+            item["category"] = category_tree.get(db, item["category_id"])
+
+    if "feedback" in expand and items:
+        feedback: Dict[int, List[Dict]] = {item["product_id"]: [] for item in items}
+        for row in db.query(models.UserFeedback).filter(
+            models.UserFeedback.product_id.in_(list(feedback))
+        ):
+            feedback[row.product_id].append({
+                "feedback_id": row.feedback_id,
+                "user_id": row.user_id,
+                "product_id": row.product_id,
+                "rating": row.rating,
+                "feedback_text": row.feedback_text,
+                "created_at": row.created_at
+            })
+        for item in items:
+            item["feedback"] = feedback[item["product_id"]]
+
+    return items
@@ -0,0 +1,337 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import DateTime, case, func, literal, select, true
+from typing import Dict, Iterable, List, Optional
+from datetime import datetime
+from app.models import models
+from app.models.database import upsert
+from app.services.catalog_snapshot import CatalogSnapshot, CatalogSnapshotStore, changed_product_ids
+import numpy as np
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ProductStatsIndex:
+    """In-memory per-product stats held as NumPy arrays for vectorized scoring.
+
+    With a published catalog snapshot, ids, categories, prices and name order
+    are the snapshot's read-only mapped arrays, copied only once a refresh
+    has to change them.
+    """
+
+    def __init__(self, snapshot_store: Optional[CatalogSnapshotStore] = None):
+        self.snapshot_store = snapshot_store
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.product_ids = np.empty(0, dtype=np.int64)
+        self.avg_rating = np.empty(0, dtype=np.float64)
+        self.interaction_count = np.empty(0, dtype=np.int64)
+        self.category_id = np.empty(0, dtype=np.int64)
+        self.price = np.empty(0, dtype=np.float64)
+        self.name_rank = np.empty(0, dtype=np.int64)
+        self._names: List[str] = []
+        self._positions: Dict[int, int] = {}
+        self._snapshot: Optional[CatalogSnapshot] = None  # The snapshot loaded from, if any
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def sync(self, db: Session) -> None:
+        """Load on first use, and again whenever a newer catalog snapshot has been published.
+
+        Imports in other processes publish a snapshot, so this is how they reach this worker.
+        """
+        if not self.loaded:
+            self.load(db)
+            return
+        snapshot = self.snapshot_store.get() if self.snapshot_store is not None else None
+        if snapshot is not None and snapshot is not self._snapshot:
+            self._load_snapshot(db, snapshot)
+
+    def load(self, db: Session) -> None:
+        """Load stats for the whole catalog."""
+        snapshot = self.snapshot_store.get() if self.snapshot_store is not None else None
+        if snapshot is not None:
+            self._load_snapshot(db, snapshot)
+            return
+
+        products = db.query(
+            models.Product.product_id,
+            models.Product.name,
+            models.Product.category_id,
+            models.Product.price
+        ).order_by(models.Product.product_id).all()
+
+        stats = dict(
+            (row[0], row[1:]) for row in self._query_stats(db)
+        )
+
+        size = len(products)
+        product_ids = np.fromiter((p[0] for p in products), dtype=np.int64, count=size)
+        category_id = np.fromiter(
+            (p[2] if p[2] is not None else -1 for p in products), dtype=np.int64, count=size
+        )
+        price = np.fromiter((p[3] for p in products), dtype=np.float64, count=size)
+        avg_rating = np.zeros(size, dtype=np.float64)
+        interaction_count = np.zeros(size, dtype=np.int64)
+        for position, product_id in enumerate(product_ids.tolist()):
+            if product_id in stats:
+                avg, count = stats[product_id]
+                avg_rating[position] = float(avg or 0)
+                interaction_count[position] = int(count or 0)
+
+        with self._lock:
+            self.product_ids = product_ids
+            self.avg_rating = avg_rating
+            self.interaction_count = interaction_count
+            self.category_id = category_id
+            self.price = price
+            self._names = [p[1] for p in products]
+            self._positions = {pid: i for i, pid in enumerate(product_ids.tolist())}
+            self._rank_names()
+            self._snapshot = None
+            self.loaded = True
+
+        logger.info(f"Loaded stats for {size} products")
+
+    def _load_snapshot(self, db: Session, snapshot: CatalogSnapshot) -> None:
+        with self._lock:
+            self.product_ids = snapshot.product_ids
+            self.category_id = snapshot.category_id
+            self.price = snapshot.price
+            self.name_rank = snapshot.name_rank
+            # Stats change with every interaction flush, so they are private copies
+            self.avg_rating = np.array(snapshot.avg_rating)
+            self.interaction_count = np.array(snapshot.interaction_count)
+            self._names = snapshot.names()
+            self._positions = {pid: i for i, pid in enumerate(snapshot.product_ids.tolist())}
+            self._snapshot = snapshot
+            self.loaded = True
+
+        # Catch up on whatever changed after the snapshot was built
+        changed = changed_product_ids(db, snapshot.built_at)
+        self.refresh(db, changed)
+        logger.info(f"Loaded stats for {len(snapshot)} products from snapshot, {len(changed)} refreshed")
+
+    def refresh(self, db: Session, product_ids: Iterable[int]) -> None:
+        """Re-read product rows and stats for the given ids only."""
+        product_ids = list(set(product_ids))
+        if not product_ids:
+            return
+        if not self.loaded:
+            self.load(db)
+            return
+
+        products = db.query(
+            models.Product.product_id,
+            models.Product.name,
+            models.Product.category_id,
+            models.Product.price
+        ).filter(models.Product.product_id.in_(product_ids)).all()
+        stats = dict(
+            (row[0], row[1:]) for row in self._query_stats(db, product_ids)
+        )
+
+        with self._lock:
+            new_rows = [p for p in products if p[0] not in self._positions]
+            if new_rows:
+                self._append([p[0] for p in new_rows])
+
+            names_changed = bool(new_rows)
+            for product_id, name, category_id, price in products:
+                position = self._positions[product_id]
+                avg, count = stats.get(product_id, (0, 0))
+                self.avg_rating[position] = float(avg or 0)
+                self.interaction_count[position] = int(count or 0)
+                category_id = category_id if category_id is not None else -1
+                if self.category_id[position] != category_id or self.price[position] != price:
+                    self._own_catalog_columns()
+                    self.category_id[position] = category_id
+                    self.price[position] = price
+                if self._names[position] != name:
+                    self._names[position] = name
+                    names_changed = True
+
+            if names_changed:
+                self._rank_names()
+
+    def positions(self, product_ids: Iterable[int]) -> List[Optional[int]]:
+        """Array positions for the given product ids (None when not indexed)."""
+        return [self._positions.get(int(product_id)) for product_id in product_ids]
+
+    def scores(self, positions: Optional[List[int]] = None) -> np.ndarray:
+        """Recommendation score for every product (or the given positions), rounded to two decimals."""
+        avg_rating = self.avg_rating
+        interaction_count = self.interaction_count
+        if positions is not None:
+            avg_rating = avg_rating[positions]
+            interaction_count = interaction_count[positions]
+        score = 0.5  # Base score
+        score = score + np.minimum(avg_rating / 5.0 * 0.3, 0.3)  # Rating contribution (up to 0.3)
+        score = score + np.minimum(interaction_count / 10 * 0.2, 0.2)  # Popularity contribution (up to 0.2)
+        return np.round(score, 2)
+
+    def top_k(self, limit: int, category_ids: Optional[List[int]] = None) -> List[int]:
+        """Positions of the best `limit` products, by score desc then name asc."""
+        with self._lock:
+            if limit <= 0 or not len(self):
+                return []
+
+            scores = self.scores()
+            # Fold the name order into the score so a single partition is exact
+            size = len(self)
+            keys = np.rint(scores * 100).astype(np.int64) * size + (size - 1 - self.name_rank)
+
+            candidates = np.arange(size)
+            if category_ids:
+                candidates = np.flatnonzero(np.isin(self.category_id, category_ids))
+                keys = keys[candidates]
+        if not len(candidates):
+            return []
+
+        if len(candidates) > limit:
+            top = np.argpartition(-keys, limit - 1)[:limit]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-keys[top])]
+        return candidates[top].tolist()
+
+    def _append(self, product_ids: List[int]) -> None:
+        count = len(product_ids)
+        start = len(self.product_ids)
+        self.product_ids = np.concatenate([self.product_ids, np.asarray(product_ids, dtype=np.int64)])
+        self.avg_rating = np.concatenate([self.avg_rating, np.zeros(count, dtype=np.float64)])
+        self.interaction_count = np.concatenate([self.interaction_count, np.zeros(count, dtype=np.int64)])
+        self.category_id = np.concatenate([self.category_id, np.full(count, -1, dtype=np.int64)])
+        self.price = np.concatenate([self.price, np.zeros(count, dtype=np.float64)])
+        self._names.extend([""] * count)
+        for offset, product_id in enumerate(product_ids):
+            self._positions[product_id] = start + offset
+
+    def _own_catalog_columns(self) -> None:
+        # Snapshot arrays are mapped read-only; copy before the first write
+        if not self.category_id.flags.writeable:
+            self.category_id = np.array(self.category_id)
+        if not self.price.flags.writeable:
+            self.price = np.array(self.price)
+
+    def _rank_names(self) -> None:
+        order = sorted(range(len(self._names)), key=self._names.__getitem__)
+        name_rank = np.empty(len(order), dtype=np.int64)
+        name_rank[order] = np.arange(len(order), dtype=np.int64)
+        self.name_rank = name_rank
+
+    @staticmethod
+    def _query_stats(db: Session, product_ids: Optional[List[int]] = None):
+        query = db.query(
+            models.ProductStats.product_id,
+            models.ProductStats.avg_rating,
+            models.ProductStats.interaction_count
+        )
+        if product_ids is not None:
+            query = query.filter(models.ProductStats.product_id.in_(product_ids))
+        return query.all()
+
+def apply_interaction_delta(
+    db: Session,
+    product_id: int,
+    rating_delta: int = 0,
+    rating_count_delta: int = 0,
+    interaction_delta: int = 0,
+    view_delta: int = 0,
+    purchase_delta: int = 0
+) -> None:
+    """Adjust a product's aggregate row in the caller's transaction (no commit)."""
+    stats = models.ProductStats
+    updated = db.query(stats).filter(stats.product_id == product_id).update({
+        stats.rating_sum: stats.rating_sum + rating_delta,
+        stats.rating_count: stats.rating_count + rating_count_delta,
+        stats.interaction_count: stats.interaction_count + interaction_delta,
+        stats.view_count: stats.view_count + view_delta,
+        stats.purchase_count: stats.purchase_count + purchase_delta
+    }, synchronize_session=False)
+
+    if not updated:
+        db.add(stats(
+            product_id=product_id,
+            rating_sum=rating_delta,
+            rating_count=rating_count_delta,
+            interaction_count=interaction_delta,
+            view_count=view_delta,
+            purchase_count=purchase_delta,
+            avg_rating=rating_delta / rating_count_delta if rating_count_delta else 0
+        ))
+        db.flush()
+        return
+
+    # Separate statement: databases disagree on whether SET sees updated sums
+    db.query(stats).filter(stats.product_id == product_id).update({
+        stats.avg_rating: case(
+            (stats.rating_count > 0, stats.rating_sum * 1.0 / stats.rating_count),
+            else_=0
+        )
+    }, synchronize_session=False)
+
+STATS_COLUMNS = (
+    "rating_sum", "rating_count", "interaction_count", "view_count", "purchase_count", "avg_rating", "updated_at"
+)
+
+def rebuild_product_stats(db: Session) -> int:
+    """Recompute every aggregate row from user_interactions in bulk.
+
+    Rows are overwritten in place with one upsert rather than deleted and
+    re-inserted, so deltas applied concurrently by feedback and interaction
+    flushes always find their row (and wait on its lock) instead of being lost.
+    """
+    interactions = models.UserInteraction
+    totals = select(
+        interactions.product_id.label("product_id"),
+        func.coalesce(func.sum(interactions.rating), 0).label("rating_sum"),
+        func.count(interactions.rating).label("rating_count"),
+        func.count(interactions.interaction_id).label("interaction_count"),
+        func.coalesce(func.sum(interactions.view_count), 0).label("view_count"),
+        func.coalesce(func.sum(interactions.purchase_count), 0).label("purchase_count"),
+        func.coalesce(func.avg(interactions.rating), 0).label("avg_rating")
+    ).group_by(interactions.product_id).subquery()
+
+    # Products without interactions get a zero row too
+    rows = select(
+        models.Product.product_id,
+        func.coalesce(totals.c.rating_sum, 0),
+        func.coalesce(totals.c.rating_count, 0),
+        func.coalesce(totals.c.interaction_count, 0),
+        func.coalesce(totals.c.view_count, 0),
+        func.coalesce(totals.c.purchase_count, 0),
+        func.coalesce(totals.c.avg_rating, 0),
+        literal(datetime.utcnow(), DateTime)
+    ).outerjoin(
+        totals, models.Product.product_id == totals.c.product_id
+    ).where(true())  # SQLite needs a WHERE to tell the upsert's ON from the join's
+
+    stats = models.ProductStats
+    try:
+        statement = upsert(db, stats.__table__, ["product_id"], lambda new: {
+            column: new[column] for column in STATS_COLUMNS
+        })
+        db.execute(statement.from_select(("product_id",) + STATS_COLUMNS, rows))
+        # Rows left behind by deleted products
+        db.query(stats).filter(
+            stats.product_id.notin_(select(models.Product.product_id))
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    count = db.query(func.count(models.ProductStats.product_id)).scalar()
+    logger.info(f"Rebuilt product stats for {count} products")
+    return count
+
+def run_stats_rebuild():
+    from app.models.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rebuild_product_stats(db)
+    finally:
+        db.close()
@@ -1,14 +1,102 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, or_
-from typing import List, Dict, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, or_, case
+from typing import List, Dict, Iterator, Optional, Set, Tuple
 from app.models import models
+from app.services.product_stats import ProductStatsIndex
+from app.services.catalog_snapshot import catalog_snapshot
+from app.services.vector_index import VectorIndexStore
+from app.services.user_profiles import UserProfileStore
+from app.services.category_tree import CategoryTree, category_tree
+from app.services.precomputed import PrecomputedStore
+from app.services.candidate_pipeline import CandidatePipeline, CandidateRequest, CandidateSet, default_pipeline
+from app.services.embeddings import normalize
+from app.core.monitoring import PerformanceMonitor
+import numpy as np
+import asyncio
+import os
 import logging
 
 logger = logging.getLogger(__name__)
 
+SIMILARITY_WEIGHT = 0.6  # Share of the score taken by profile similarity
+SIMILARITY_OVERSAMPLE = 10  # Neighbours fetched per slot when filtering by category
+# Neighbour pool never smaller than this, so a short list is a prefix of a longer one
+# (precomputed top-N lists rely on it)
+SIMILARITY_MIN_CANDIDATES = 50
+# Rank through the multi-source candidate pipeline instead of vector neighbours alone
+USE_CANDIDATE_PIPELINE = os.getenv("RECOMMENDATION_PIPELINE", "1") == "1"
+BATCH_CHUNK_SIZE = 32  # Requests ranked together in recommend_many
+
 class RecommendationService:
-    def __init__(self):
+    def __init__(
+        self,
+        stats_index: Optional[ProductStatsIndex] = None,
+        vector_index: Optional[VectorIndexStore] = None,
+        user_profiles: Optional[UserProfileStore] = None,
+        categories: Optional[CategoryTree] = None,
+        precomputed: Optional[PrecomputedStore] = None,
+        pipeline: Optional[CandidatePipeline] = None
+    ):
         self.cache_timeout = 3600
+        self.stats_index = stats_index
+        self.vector_index = vector_index
+        self.user_profiles = user_profiles if user_profiles is not None else UserProfileStore()
+        self.categories = categories if categories is not None else category_tree
+        self.precomputed = precomputed
+        self.pipeline = pipeline
+
+    @staticmethod
+    def scope_tag(category: Optional[str]) -> str:
+        """Cache tag shared by every ranked list with this category filter (None for unfiltered)."""
+        return f"ranking:{category.lower() if category else '*'}"
+
+    def products_changed(self, db: Session, product_ids) -> List[str]:
+        """Stop serving precomputed lists these products' new stats can reorder; returns their cache tags.
+
+        That is every unfiltered list plus the lists filtered by any of the
+        products' categories or their ancestors.
+        """
+        product_ids = list(product_ids)
+        index = self.stats_index
+        category_ids, missing = set(), []
+        if index is not None and index.loaded:
+            for product_id, position in zip(product_ids, index.positions(product_ids)):
+                if position is None:
+                    missing.append(product_id)
+                else:
+                    category_ids.add(int(index.category_id[position]))
+        else:
+            missing = product_ids
+        if missing:
+            category_ids.update(row[0] for row in db.query(models.Product.category_id).filter(
+                models.Product.product_id.in_(missing)
+            ))
+
+        names = {
+            self.categories.name(db, ancestor)
+            for category_id in category_ids if category_id is not None and category_id >= 0
+            for ancestor in self.categories.ancestors(db, category_id)
+        }
+        scopes = [None] + sorted(names)
+        if self.precomputed is not None:
+            self.precomputed.mark_scopes_changed(scopes)
+        return [self.scope_tag(scope) for scope in scopes]
+
+    def users_changed(self, user_ids) -> None:
+        """Drop cached profiles of users with new activity, and stop serving their precomputed lists until rebuilt.
+
+        Blocks on Redis; call it from a thread when on the event loop.
+        """
+        user_ids = list(user_ids)
+        self.user_profiles.invalidate_many(user_ids)
+        if self.precomputed is not None:
+            self.precomputed.mark_changed(user_ids)
+
+    def user_changed(self, user_id: int) -> None:
+        """Stop serving precomputed lists for a user with new activity until they are rebuilt."""
+        if self.precomputed is not None:
+            self.precomputed.mark_changed([user_id])
 
     async def get_recommendations(
         self, 
@@ -17,80 +105,499 @@ class RecommendationService:
         limit: int = 5,
         category: Optional[str] = None
     ) -> List[Dict]:
+        return self.recommend(db, user_id, limit, category)
+
+    def recommend(
+        self,
+        db: Session,
+        user_id: int,
+        limit: int = 5,
+        category: Optional[str] = None
+    ) -> List[Dict]:
+        """Synchronous core, also run on async sessions via `AsyncSession.run_sync`."""
         try:
-            # First get relevant category IDs
-            category_ids = []
-            if category:
-                # Get parent category
-                parent_cat = db.query(models.Category).filter(
-                    func.lower(models.Category.name) == category.lower()
-                ).first()
-                
-                if parent_cat:
-                    category_ids.append(parent_cat.category_id)
-                    # Get child categories
-                    child_cats = db.query(models.Category).filter(
-                        models.Category.parent_category_id == parent_cat.category_id
-                    ).all()
-                    category_ids.extend([c.category_id for c in child_cats])
-
-            # Build product query
-            product_query = db.query(models.Product)
-            
+            # First get relevant category IDs (the category and all its descendants)
+            category_ids = self.categories.resolve(db, category) if category else []
+
+            if self.stats_index is not None:
+                self.stats_index.sync(db)
+                precomputed = self._precomputed(db, user_id, limit, category)
+                if precomputed is not None:
+                    return precomputed
+                positions, scores, _ = self.rank(db, user_id, limit, category_ids)
+                with PerformanceMonitor.stage("serialization"):
+                    return self._build_recommendations(db, positions, scores)
+
+            # Read the materialized per-product aggregates
+            avg_rating = func.coalesce(models.ProductStats.avg_rating, 0)
+            interaction_count = func.coalesce(models.ProductStats.interaction_count, 0)
+
+            # Calculate recommendation score in the database
+            rating_score = case(
+                (avg_rating / 5.0 * 0.3 > 0.3, 0.3),
+                else_=avg_rating / 5.0 * 0.3
+            )  # Rating contribution (up to 0.3)
+            popularity_score = case(
+                (interaction_count / 10.0 * 0.2 > 0.2, 0.2),
+                else_=interaction_count / 10.0 * 0.2
+            )  # Popularity contribution (up to 0.2)
+            score = func.round(0.5 + rating_score + popularity_score, 2)  # Base score 0.5
+
+            # Build product query joined with category and stats
+            product_query = db.query(
+                models.Product,
+                models.Category.name.label('category_name'),
+                avg_rating.label('avg_rating'),
+                interaction_count.label('interaction_count'),
+                score.label('score')
+            ).outerjoin(
+                models.Category,
+                models.Product.category_id == models.Category.category_id
+            ).outerjoin(
+                models.ProductStats,
+                models.Product.product_id == models.ProductStats.product_id
+            )
+
             if category_ids:
                 product_query = product_query.filter(
                     models.Product.category_id.in_(category_ids)
                 )
 
-            # Get all matching products
-            products = product_query.all()
-
-            if not products:
-                return []
-
-            recommendations = []
-            
-            for product in products:
-                # Get category info
-                category_info = db.query(models.Category).filter(
-                    models.Category.category_id == product.category_id
-                ).first()
-
-                # Get interaction stats in a separate query
-                interaction_stats = db.query(
-                    func.coalesce(func.avg(models.UserInteraction.rating), 0).label('avg_rating'),
-                    func.count(models.UserInteraction.interaction_id).label('interaction_count')
-                ).filter(
-                    models.UserInteraction.product_id == product.product_id
-                ).first()
-
-                avg_rating = float(interaction_stats[0] if interaction_stats[0] else 0)
-                interaction_count = int(interaction_stats[1] if interaction_stats[1] else 0)
-
-                # Calculate recommendation score
-                score = 0.5  # Base score
-                score += min((avg_rating / 5.0) * 0.3, 0.3)  # Rating contribution (up to 0.3)
-                score += min((interaction_count / 10) * 0.2, 0.2)  # Popularity contribution (up to 0.2)
-
-                recommendations.append({
-                    "product_id": product.product_id,
-                    "name": product.name,
-                    "description": product.description,
-                    "price": float(product.price),
-                    "category_id": product.category_id,
-                    "category_name": category_info.name if category_info else None,
-                    "image_url": product.image_url,
-                    "similarity_score": round(score, 2),
-                    "average_rating": round(avg_rating, 1),
-                    "interaction_count": interaction_count
-                })
+            # Sort by score (descending) and name (ascending), top-k only
+            with PerformanceMonitor.stage("candidates"):
+                rows = product_query.order_by(
+                    desc('score'),
+                    models.Product.name.asc()
+                ).limit(limit).all()
 
-            # Sort by score (descending) and name (ascending)
-            recommendations.sort(key=lambda x: (-x['similarity_score'], x['name']))
-            
-            return recommendations[:limit]
+            with PerformanceMonitor.stage("serialization"):
+                return self._rows_to_recommendations(rows)
 
         except Exception as e:
             logger.error(f"Error generating recommendations: {str(e)}")
-            print(f"Detailed error: {str(e)}")  # For debugging
-            raise
\ No newline at end of file
+            raise
+
+    async def recommend_async(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        limit: int = 5,
+        category: Optional[str] = None
+    ) -> List[Dict]:
+        """`recommend` for async sessions, awaiting the candidate generators rather than blocking on them.
+
+        Database work runs through `run_sync`; the generators run as tasks on
+        the event loop, so one that overruns its budget is cancelled.
+        """
+        if self.pipeline is None or self.stats_index is None:
+            return await db.run_sync(self.recommend, user_id, limit, category)
+        try:
+            category_ids, vector_index, precomputed = await db.run_sync(
+                self._prepare, user_id, limit, category
+            )
+            if precomputed is not None:
+                return precomputed
+            with PerformanceMonitor.stage("candidates"):
+                candidates = await self.pipeline.generate_async(
+                    db, CandidateRequest(user_id, limit, category_ids, vector_index)
+                )
+            return await db.run_sync(self._finish, candidates, limit, category_ids, vector_index)
+        except Exception as e:
+            logger.error(f"Error generating recommendations: {str(e)}")
+            raise
+
+    async def recommend_many_async(
+        self,
+        db: AsyncSession,
+        requests: List[Tuple[int, int, Optional[str]]]
+    ) -> List[Optional[List[Dict]]]:
+        """`recommend_async` for several (user_id, limit, category) requests on one session.
+
+        Preparation and serialization each take one `run_sync` for the whole
+        batch. In between, every request's generators run concurrently with
+        the budgets of a single request, so each result is the one
+        `recommend_async` gives. Unknown users get None.
+        """
+        if self.pipeline is None or self.stats_index is None:
+            return await db.run_sync(self._recommend_each, requests)
+        try:
+            prepared = await db.run_sync(self._prepare_many, requests)
+            live = [offset for offset, found in enumerate(prepared) if found is not None and found[2] is None]
+            with PerformanceMonitor.stage("candidates"):
+                candidate_sets = await asyncio.gather(*[
+                    self.pipeline.generate_async(db, CandidateRequest(
+                        requests[offset][0], requests[offset][1], prepared[offset][0], prepared[offset][1]
+                    ))
+                    for offset in live
+                ])
+            return await db.run_sync(self._finish_many, requests, prepared, dict(zip(live, candidate_sets)))
+        except Exception as e:
+            logger.error(f"Error generating {len(requests)} recommendations: {str(e)}")
+            raise
+
+    def _recommend_each(self, db: Session, requests: List[Tuple[int, int, Optional[str]]]) -> List[Optional[List[Dict]]]:
+        known = self._known_users(db, [user_id for user_id, _, _ in requests])
+        return [
+            self.recommend(db, user_id, limit, category) if user_id in known else None
+            for user_id, limit, category in requests
+        ]
+
+    def _prepare(
+        self,
+        db: Session,
+        user_id: int,
+        limit: int,
+        category: Optional[str]
+    ) -> Tuple[List[int], object, Optional[List[Dict]]]:
+        """Category ids and vector index to rank with, and the precomputed list if one is published."""
+        category_ids = self.categories.resolve(db, category) if category else []
+        self.stats_index.sync(db)
+        vector_index = self.vector_index.get() if self.vector_index is not None else None
+        return category_ids, vector_index, self._precomputed(db, user_id, limit, category)
+
+    def _prepare_many(self, db: Session, requests: List[Tuple[int, int, Optional[str]]]) -> List[Optional[Tuple]]:
+        """`_prepare` for each request, None for unknown users."""
+        known = self._known_users(db, [user_id for user_id, _, _ in requests])
+        return [
+            self._prepare(db, user_id, limit, category) if user_id in known else None
+            for user_id, limit, category in requests
+        ]
+
+    def _finish(
+        self,
+        db: Session,
+        candidates: CandidateSet,
+        limit: int,
+        category_ids: List[int],
+        vector_index
+    ) -> List[Dict]:
+        with PerformanceMonitor.stage("scoring"):
+            positions, scores = self._rerank(candidates, limit, category_ids, vector_index)
+        with PerformanceMonitor.stage("serialization"):
+            return self._build_recommendations(db, positions, scores)
+
+    def _finish_many(
+        self,
+        db: Session,
+        requests: List[Tuple[int, int, Optional[str]]],
+        prepared: List[Optional[Tuple]],
+        candidate_sets: Dict[int, CandidateSet]
+    ) -> List[Optional[List[Dict]]]:
+        """`_finish` for the requests that were ranked live, loading their product rows together."""
+        with PerformanceMonitor.stage("scoring"):
+            rankings = {
+                offset: self._rerank(candidates, requests[offset][1], prepared[offset][0], prepared[offset][1])
+                for offset, candidates in candidate_sets.items()
+            }
+        with PerformanceMonitor.stage("serialization"):
+            products = self._load_products(db, {
+                int(self.stats_index.product_ids[position])
+                for positions, _ in rankings.values() for position in positions
+            })
+            return [
+                self._build_recommendations(db, *rankings[offset], products=products) if offset in rankings
+                else found[2] if found is not None else None
+                for offset, found in enumerate(prepared)
+            ]
+
+    @staticmethod
+    def _known_users(db: Session, user_ids) -> Set[int]:
+        return {row[0] for row in db.query(models.User.user_id).filter(models.User.user_id.in_(sorted(set(user_ids))))}
+
+    @staticmethod
+    def _rows_to_recommendations(rows) -> List[Dict]:
+        recommendations = []
+
+        for product, category_name, avg_rating_value, count_value, score_value in rows:
+            avg_rating_value = float(avg_rating_value or 0)
+            recommendations.append({
+                "product_id": product.product_id,
+                "name": product.name,
+                "description": product.description,
+                "price": float(product.price),
+                "category_id": product.category_id,
+                "category_name": category_name,
+                "image_url": product.image_url,
+                "similarity_score": round(float(score_value), 2),
+                "average_rating": round(avg_rating_value, 1),
+                "interaction_count": int(count_value or 0)
+            })
+
+        return recommendations
+
+    def recommend_many(
+        self,
+        db: Session,
+        requests: List[Tuple[int, int, Optional[str]]]
+    ) -> Iterator[Tuple[int, Optional[List[Dict]]]]:
+        """Recommendations for many (user_id, limit, category) requests, yielded in order, chunk by chunk.
+
+        Each request gets what `recommend` returns for it: the precomputed
+        list when one is published, otherwise `rank_many`, which runs the
+        same candidates and re-ranking for the whole chunk. Catalog data and
+        product rows are shared by the chunk. Unknown users yield None.
+        """
+        index = self.stats_index
+        index.sync(db)
+        vector_index = self.vector_index.get() if self.vector_index is not None else None
+        resolved: Dict[Optional[str], List[int]] = {}
+
+        for start in range(0, len(requests), BATCH_CHUNK_SIZE):
+            chunk = requests[start:start + BATCH_CHUNK_SIZE]
+            known = self._known_users(db, [user_id for user_id, _, _ in chunk])
+            for _, _, category in chunk:
+                if category not in resolved:
+                    resolved[category] = self.categories.resolve(db, category) if category else []
+
+            rankings: Dict[int, Tuple[List[int], Optional[np.ndarray]]] = {}
+            live = []
+            for offset, (user_id, limit, category) in enumerate(chunk):
+                if user_id not in known:
+                    continue
+                found = self.precomputed.lookup(user_id, category, limit) if self.precomputed is not None else None
+                if found is not None and None not in index.positions(found[0]):
+                    rankings[offset] = (index.positions(found[0]), np.asarray(found[1]))
+                else:
+                    live.append(offset)
+            ranked = self.rank_many(db, [
+                CandidateRequest(chunk[offset][0], chunk[offset][1], resolved[chunk[offset][2]], vector_index)
+                for offset in live
+            ])
+            for offset, (positions, scores, _) in zip(live, ranked):
+                rankings[offset] = (positions, scores)
+
+            with PerformanceMonitor.stage("serialization"):
+                products = self._load_products(db, {
+                    int(index.product_ids[position])
+                    for positions, _ in rankings.values() for position in positions
+                })
+                results = [
+                    (user_id, self._build_recommendations(db, *rankings[offset], products=products)
+                        if offset in rankings else None)
+                    for offset, (user_id, _, _) in enumerate(chunk)
+                ]
+            yield from results
+
+    def rank_many(self, db: Session, requests: List[CandidateRequest]) -> List[Tuple[List[int], Optional[np.ndarray], bool]]:
+        """`rank` for several requests, with candidates generated for all of them at once.
+
+        Each result is what `rank` returns for that request alone.
+        """
+        if self.pipeline is None:
+            return [self.rank(db, r.user_id, r.limit, r.category_ids) for r in requests]
+        if not requests:
+            return []
+        with PerformanceMonitor.stage("candidates"):
+            candidate_sets = self.pipeline.generate_many(db, requests)
+        results = []
+        with PerformanceMonitor.stage("scoring"):
+            for request, candidates in zip(requests, candidate_sets):
+                positions, scores = self._rerank(candidates, request.limit, request.category_ids, request.vector_index)
+                results.append((positions, scores, candidates.personalized))
+        return results
+
+    def rank(
+        self,
+        db: Session,
+        user_id: int,
+        limit: int,
+        category_ids: List[int]
+    ) -> Tuple[List[int], Optional[np.ndarray], bool]:
+        """Stats index positions and scores of the best products, and whether they are user-specific.
+
+        Requires a loaded stats index. Scores are None for plain popularity rankings.
+        """
+        if self.pipeline is not None:
+            vector_index = self.vector_index.get() if self.vector_index is not None else None
+            with PerformanceMonitor.stage("candidates"):
+                candidates = self.pipeline.generate(
+                    db, CandidateRequest(user_id, limit, category_ids, vector_index)
+                )
+            with PerformanceMonitor.stage("scoring"):
+                positions, scores = self._rerank(candidates, limit, category_ids, vector_index)
+            return positions, scores, candidates.personalized
+
+        similar = self._similar_products(db, user_id, limit, category_ids)
+        if similar is not None:
+            return similar[0], similar[1], True
+        with PerformanceMonitor.stage("candidates"):
+            return self.stats_index.top_k(limit, category_ids), None, False
+
+    def _rerank(
+        self,
+        candidates: CandidateSet,
+        limit: int,
+        category_ids: List[int],
+        vector_index
+    ) -> Tuple[List[int], np.ndarray]:
+        """Full scoring of the merged candidates only.
+
+        For personalized candidates, popularity is blended with relevance: the
+        stronger of profile similarity and the affinity the generators reported
+        (co-purchases, recent views). Otherwise plain popularity.
+        """
+        index = self.stats_index
+        indexed = index.positions(candidates.product_ids)
+        kept = np.array([offset for offset, p in enumerate(indexed) if p is not None], dtype=np.int64)
+        positions = np.array([indexed[offset] for offset in kept], dtype=np.int64)
+        relevance = candidates.affinity[kept]
+        if category_ids and len(positions):
+            allowed = np.isin(index.category_id[positions], category_ids)
+            positions, relevance = positions[allowed], relevance[allowed]
+        if not len(positions):
+            return [], np.empty(0)
+
+        scores = index.scores(positions)
+        if candidates.profile is not None and vector_index is not None:
+            similarities = np.zeros(len(positions), dtype=np.float32)
+            vectors, found = vector_index.vectors_for(index.product_ids[positions])
+            if len(vectors):
+                profile = normalize(np.asarray(candidates.profile, dtype=np.float32).reshape(1, -1))[0]
+                similarities[found] = vectors @ profile
+            relevance = np.maximum(relevance, np.clip(similarities, 0, 1))
+        if candidates.personalized:
+            scores = SIMILARITY_WEIGHT * relevance + (1 - SIMILARITY_WEIGHT) * scores
+
+        # Ties go to the alphabetically first name, as in the stats index ranking
+        order = np.lexsort((index.name_rank[positions], -scores))[:limit]
+        return positions[order].tolist(), scores[order]
+
+    def _precomputed(
+        self,
+        db: Session,
+        user_id: int,
+        limit: int,
+        category: Optional[str]
+    ) -> Optional[List[Dict]]:
+        """Serve a published list when there is one for this request."""
+        if self.precomputed is None:
+            return None
+        found = self.precomputed.lookup(user_id, category, limit)
+        if found is None:
+            return None
+        product_ids, scores = found
+        positions = self.stats_index.positions(product_ids)
+        if None in positions:
+            return None  # Catalog changed since the lists were built
+        with PerformanceMonitor.stage("serialization"):
+            return self._build_recommendations(db, positions, np.asarray(scores))
+
+    def _similar_products(
+        self,
+        db: Session,
+        user_id: int,
+        limit: int,
+        category_ids: List[int]
+    ) -> Optional[Tuple[List[int], np.ndarray]]:
+        """Rank the user's nearest neighbour products by similarity and popularity.
+
+        Returns None when there is no vector index or no profile for the user.
+        """
+        vector_index = self.vector_index.get() if self.vector_index is not None else None
+        if vector_index is None:
+            return None
+        with PerformanceMonitor.stage("candidates"):
+            profile = self.user_profiles.get(db, user_id, vector_index.dim)
+            if profile is None:
+                return None
+
+            k = max(limit * (SIMILARITY_OVERSAMPLE if category_ids else 2), SIMILARITY_MIN_CANDIDATES)
+            product_ids, similarities = vector_index.search(profile, k)
+
+        with PerformanceMonitor.stage("scoring"):
+            return self._score_neighbours(product_ids, similarities, limit, category_ids)
+
+    def _score_neighbours(
+        self,
+        product_ids: np.ndarray,
+        similarities: np.ndarray,
+        limit: int,
+        category_ids: List[int]
+    ) -> Tuple[List[int], np.ndarray]:
+        index = self.stats_index
+        allowed = set(category_ids)
+        positions, kept = [], []
+        for offset, position in enumerate(index.positions(product_ids)):
+            if position is None:
+                continue
+            if allowed and int(index.category_id[position]) not in allowed:
+                continue
+            positions.append(position)
+            kept.append(offset)
+
+        scores = SIMILARITY_WEIGHT * np.clip(similarities[kept], 0, 1) \
+            + (1 - SIMILARITY_WEIGHT) * index.scores(positions)
+        order = np.argsort(-scores, kind="stable")[:limit]
+        positions = [positions[i] for i in order]
+        scores = scores[order]
+
+        # Top up with popular products when too few neighbours matched
+        if len(positions) < limit:
+            seen = set(positions)
+            fill = [p for p in index.top_k(limit + len(seen), category_ids) if p not in seen]
+            fill = fill[:limit - len(positions)]
+            positions += fill
+            scores = np.concatenate([scores, index.scores(fill)])
+
+        return positions, scores
+
+    def _build_recommendations(
+        self,
+        db: Session,
+        positions: List[int],
+        scores: Optional[np.ndarray] = None,
+        products: Optional[Dict[int, models.Product]] = None
+    ) -> List[Dict]:
+        """Load only the top-k product rows (unless preloaded) and merge them with indexed stats."""
+        if not positions:
+            return []
+
+        index = self.stats_index
+        product_ids = [int(index.product_ids[p]) for p in positions]
+        if products is None:
+            products = self._load_products(db, product_ids)
+        if scores is None:
+            scores = index.scores(positions)
+
+        recommendations = []
+        for offset, (position, product_id) in enumerate(zip(positions, product_ids)):
+            if product_id not in products:
+                continue  # Deleted since the index was loaded
+            product = products[product_id]
+            recommendations.append({
+                "product_id": product.product_id,
+                "name": product.name,
+                "description": product.description,
+                "price": float(product.price),
+                "category_id": product.category_id,
+                "category_name": self.categories.name(db, product.category_id),
+                "image_url": product.image_url,
+                "similarity_score": round(float(scores[offset]), 2),
+                "average_rating": round(float(index.avg_rating[position]), 1),
+                "interaction_count": int(index.interaction_count[position])
+            })
+
+        return recommendations
+
+    @staticmethod
+    def _load_products(db: Session, product_ids) -> Dict[int, models.Product]:
+        if not product_ids:
+            return {}
+        rows = db.query(models.Product).filter(
+            models.Product.product_id.in_(list(product_ids))
+        ).all()
+        return {product.product_id: product for product in rows}
+
+def create_service(redis_client=None, precomputed: Optional[PrecomputedStore] = None) -> RecommendationService:
+    """The service as the API runs it, so offline jobs rank the same way."""
+    from app.models.database import AsyncSessionLocal
+
+    stats_index = ProductStatsIndex(snapshot_store=catalog_snapshot)
+    user_profiles = UserProfileStore(redis_client=redis_client)
+    return RecommendationService(
+        stats_index=stats_index,
+        vector_index=VectorIndexStore(),
+        user_profiles=user_profiles,
+        precomputed=precomputed,
+        pipeline=default_pipeline(stats_index, user_profiles, AsyncSessionLocal) if USE_CANDIDATE_PIPELINE else None
+    )
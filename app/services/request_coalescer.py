@@ -0,0 +1,100 @@
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from app.core.monitoring import RECOMMENDATION_BATCH_SIZE
+import asyncio
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+COALESCE_WINDOW_MS = float(os.getenv("RECOMMENDATION_COALESCE_MS", "0"))  # 0 disables coalescing
+COALESCE_MAX_BATCH = int(os.getenv("RECOMMENDATION_COALESCE_MAX", "64"))
+
+Key = Tuple[int, int, Optional[str]]  # (user_id, limit, category)
+
+class RequestCoalescer:
+    """Runs concurrent recommendation requests as one `recommend_many_async` call.
+
+    Each request in the batch is ranked exactly as it would be on its own;
+    the batch shares a session, the user lookup and the product rows.
+    A batch starts `window` seconds after its first request arrives, or as
+    soon as `max_batch` distinct keys are waiting. Identical
+    (user_id, limit, category) keys, whether waiting or already being
+    computed, share one computation and one result.
+    """
+
+    def __init__(
+        self,
+        service,
+        session_factory: Callable,
+        window: float = 0.002,
+        max_batch: int = 64
+    ):
+        self.service = service
+        self.session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[Key, asyncio.Future] = {}
+        self._inflight: Dict[Key, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def recommend(self, user_id: int, limit: int, category: Optional[str]) -> Optional[List[Dict]]:
+        """Recommendations for the request, or None when the user does not exist."""
+        key = (user_id, limit, category)
+        future = self._pending.get(key) or self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._pending[key] = loop.create_future()
+            if len(self._pending) >= self.max_batch:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._dispatch)
+        # One waiter giving up must not cancel the result for the others
+        return await asyncio.shield(future)
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        self._inflight.update(batch)
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: Dict[Key, asyncio.Future]) -> None:
+        RECOMMENDATION_BATCH_SIZE.observe(len(batch))
+        try:
+            await self._compute(batch)
+        finally:
+            for key, future in batch.items():
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+    async def _compute(self, batch: Dict[Key, asyncio.Future]) -> None:
+        try:
+            async with self.session_factory() as db:
+                results = await self.service.recommend_many_async(db, list(batch))
+        except Exception as e:
+            logger.error(f"Error generating {len(batch)} coalesced recommendations: {str(e)}")
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()  # Mark retrieved when every waiter has gone
+            return
+
+        for future, recommendations in zip(batch.values(), results):
+            if not future.done():
+                future.set_result(recommendations)
+
+def create_coalescer(service, session_factory: Callable) -> Optional[RequestCoalescer]:
+    """A coalescer configured from the environment, or None when coalescing is off."""
+    if COALESCE_WINDOW_MS <= 0:
+        return None
+    return RequestCoalescer(
+        service,
+        session_factory,
+        window=COALESCE_WINDOW_MS / 1000,
+        max_batch=COALESCE_MAX_BATCH
+    )
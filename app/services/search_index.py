@@ -0,0 +1,242 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.models import models
+from app.services.embeddings import tokenize
+import numpy as np
+import bisect
+import heapq
+import math
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+NAME_BOOST = 2  # A name token counts as this many description tokens
+READ_CHUNK_SIZE = 5000
+PREFIX_EXPANSIONS = 50  # Most frequent vocabulary terms a partial last word expands to
+
+class SearchIndex:
+    """Inverted index over product name/description with BM25 ranking.
+
+    Kept in sync incrementally from `Product.updated_at`, plus a row count
+    check that catches deleted products; the last query term is matched as
+    a prefix so partially typed words still hit. A prefix expands to the
+    term itself plus the `PREFIX_EXPANSIONS` terms found in most products,
+    which bounds the work a one-letter prefix costs on a large vocabulary.
+    Each product gets a row in dense score arrays, so a query is scored and
+    intersected with NumPy over arrays cached per term until it changes.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, sync_interval: float = 5.0):
+        self.k1 = k1
+        self.b = b
+        self.sync_interval = sync_interval
+        self.ready = False
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # term -> (rows, frequencies, document lengths) of the products containing it
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._rows: Dict[int, int] = {}  # product_id -> row
+        self._row_ids = np.empty(0, dtype=np.int64)  # row -> product_id
+        self._free_rows: List[int] = []
+        self._row_count = 0
+        self._doc_terms: Dict[int, Counter] = {}
+        self._doc_lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._vocabulary: List[str] = []
+        self._vocabulary_stale = False
+        self._watermark: Optional[datetime] = None
+        self._synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def add(self, product_id: int, name: Optional[str], description: Optional[str]) -> None:
+        terms = Counter()
+        for token in tokenize(name or ""):
+            terms[token] += NAME_BOOST
+        for token in tokenize(description or ""):
+            terms[token] += 1
+
+        with self._lock:
+            self.remove(product_id)
+            self._assign_row(product_id)
+            for term, frequency in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._vocabulary_stale = True
+                postings[product_id] = frequency
+                self._arrays.pop(term, None)
+            length = sum(terms.values())
+            self._doc_terms[product_id] = terms
+            self._doc_lengths[product_id] = length
+            self._total_length += length
+
+    def remove(self, product_id: int) -> None:
+        with self._lock:
+            terms = self._doc_terms.pop(product_id, None)
+            if terms is None:
+                return
+            for term in terms:
+                postings = self._postings[term]
+                postings.pop(product_id, None)
+                self._arrays.pop(term, None)
+                if not postings:
+                    del self._postings[term]
+                    self._vocabulary_stale = True
+            self._total_length -= self._doc_lengths.pop(product_id)
+            self._free_rows.append(self._rows.pop(product_id))
+
+    def load(self, db: Session) -> None:
+        """Index the whole catalog."""
+        with self._lock:
+            self._postings, self._doc_terms, self._doc_lengths = {}, {}, {}
+            self._arrays, self._rows, self._free_rows = {}, {}, []
+            self._row_ids = np.empty(0, dtype=np.int64)
+            self._row_count = 0
+            self._total_length = 0
+            self._watermark = None
+            self._vocabulary_stale = True
+            self._apply_changes(db)
+            self.ready = True
+        logger.info(f"Indexed {len(self)} products for search")
+
+    def sync(self, db: Session) -> int:
+        """Re-index products changed since the last load or sync and drop deleted ones."""
+        with self._lock:
+            return self._apply_changes(db) + self._apply_deletions(db)
+
+    def search(self, db: Session, query: str) -> Optional[List[Tuple[int, float]]]:
+        """(product_id, score) pairs matching every query term, best first.
+
+        Returns None when the index cannot answer, so callers fall back to SQL.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return None
+        try:
+            if not self.ready:
+                self.load(db)
+            elif time.monotonic() - self._synced_at >= self.sync_interval:
+                self.sync(db)
+        except Exception as e:
+            logger.error(f"Search index unavailable: {str(e)}")
+            return None
+
+        with self._lock:
+            # Terms add up per row; rows hit by every term match
+            totals = np.zeros(self._row_count)
+            hits = np.zeros(self._row_count, dtype=np.int32)
+            for position, term in enumerate(terms):
+                if position == len(terms) - 1:
+                    rows, scores = self._prefix_scores(term)
+                else:
+                    rows, scores = self._term_scores(term)
+                if not len(rows):
+                    return []
+                totals[rows] += scores
+                hits[rows] += 1
+            rows = np.flatnonzero(hits == len(terms))
+            product_ids, scores = self._row_ids[rows], totals[rows]
+
+        order = np.lexsort((product_ids, -scores))
+        return list(zip(product_ids[order].tolist(), scores[order].tolist()))
+
+    def _term_scores(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows of the products containing the term and their BM25 scores."""
+        arrays = self._term_arrays(term)
+        if arrays is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        rows, frequencies, lengths = arrays
+        documents = len(self._doc_lengths)
+        average_length = self._total_length / documents if documents else 0.0
+        idf = math.log(1 + (documents - len(rows) + 0.5) / (len(rows) + 0.5))
+        k1, b = self.k1, self.b
+        return rows, idf * frequencies * (k1 + 1) / (frequencies + k1 * (1 - b + b * lengths / average_length))
+
+    def _term_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            arrays = self._arrays[term] = (
+                np.array([self._rows[product_id] for product_id in postings], dtype=np.int64),
+                np.fromiter(postings.values(), dtype=np.float64, count=len(postings)),
+                np.array([self._doc_lengths[product_id] for product_id in postings], dtype=np.float64)
+            )
+        return arrays
+
+    def _prefix_scores(self, prefix: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows matching the prefix and, for each, the best score over its expansions."""
+        if self._vocabulary_stale:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_stale = False
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        # Every term with the prefix sorts below prefix + the highest character
+        end = bisect.bisect_left(self._vocabulary, prefix + "\U0010ffff", start)
+        postings = self._postings
+        terms = heapq.nlargest(
+            PREFIX_EXPANSIONS, self._vocabulary[start:end], key=lambda term: len(postings[term])
+        )
+        if prefix in postings and prefix not in terms:
+            terms.append(prefix)  # A complete word always matches itself
+
+        best = np.zeros(self._row_count)  # BM25 scores are always positive
+        for term in terms:
+            rows, scores = self._term_scores(term)
+            best[rows] = np.maximum(best[rows], scores)
+        rows = np.flatnonzero(best)
+        return rows, best[rows]
+
+    def _assign_row(self, product_id: int) -> None:
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = self._row_count
+            self._row_count += 1
+            if row >= len(self._row_ids):
+                self._row_ids = np.concatenate([self._row_ids, np.empty(max(row, 1024), dtype=np.int64)])
+        self._rows[product_id] = row
+        self._row_ids[row] = product_id
+
+    def _apply_changes(self, db: Session) -> int:
+        query = db.query(
+            models.Product.product_id,
+            models.Product.name,
+            models.Product.description,
+            models.Product.updated_at
+        )
+        if self._watermark is not None:
+            query = query.filter(models.Product.updated_at >= self._watermark)
+
+        changed = 0
+        watermark = self._watermark
+        for product_id, name, description, updated_at in query.yield_per(READ_CHUNK_SIZE):
+            self.add(product_id, name, description)
+            changed += 1
+            if updated_at is not None and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+
+        self._watermark = watermark
+        self._synced_at = time.monotonic()
+        return changed
+
+    def _apply_deletions(self, db: Session) -> int:
+        # Every existing product is indexed, so equal counts mean nothing was deleted
+        if db.query(func.count(models.Product.product_id)).scalar() == len(self._doc_lengths):
+            return 0
+        existing = {row[0] for row in db.query(models.Product.product_id).yield_per(READ_CHUNK_SIZE)}
+        deleted = [product_id for product_id in self._doc_lengths if product_id not in existing]
+        for product_id in deleted:
+            self.remove(product_id)
+        if deleted:
+            logger.info(f"Removed {len(deleted)} deleted products from the search index")
+        return len(deleted)
+
+search_index = SearchIndex()
@@ -0,0 +1,266 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+from app.models import models
+from app.services.embeddings import bytes_to_vector
+import numpy as np
+import asyncio
+import threading
+import redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATING = 3  # Weight of an interaction that has no rating yet
+BUILD_CHUNK_SIZE = 500  # Users whose profiles are built per query in get_many
+UPDATE_RETRIES = 5  # Optimistic retries of a profile update racing other writers
+
+def rating_weight(rating: Optional[int]) -> float:
+    return float(rating or DEFAULT_RATING)
+
+class UserProfileStore:
+    """Per-user preference vectors kept as a rating-weighted sum plus total weight.
+
+    Feedback adjusts the sum in O(dim); the full history of a user is only
+    read when no cached profile exists. Redis, when given, is shared by all
+    workers and takes precedence over the in-process LRU. Its client is
+    blocking, so the `_async` methods make their Redis calls in a thread.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        ttl: int = 86400,
+        max_users: int = 100000
+    ):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._profiles: "OrderedDict[int, Tuple[np.ndarray, float]]" = OrderedDict()
+
+    def get(self, db: Session, user_id: int, dim: int) -> Optional[np.ndarray]:
+        """Mean preference vector for the user, or None without any interactions."""
+        entry = self._load(user_id, dim)
+        if entry is None:
+            entry = self._build(db, user_id, dim)
+            if entry is None:
+                return None
+            self._save(user_id, entry)
+
+        total, weight = entry
+        if weight <= 0:
+            return None
+        return total / weight
+
+    async def get_async(self, db: AsyncSession, user_id: int, dim: int) -> Optional[np.ndarray]:
+        """`get` without blocking the event loop; `db` is only used on a cache miss."""
+        entry = await asyncio.to_thread(self._load, user_id, dim)
+        if entry is None:
+            entry = await db.run_sync(self._build, user_id, dim)
+            if entry is None:
+                return None
+            await asyncio.to_thread(self._save, user_id, entry)
+
+        total, weight = entry
+        if weight <= 0:
+            return None
+        return total / weight
+
+    def get_many(self, db: Session, user_ids: List[int], dim: int) -> Dict[int, np.ndarray]:
+        """Preference vectors of those users that have one; missing profiles are built in bulk."""
+        entries: Dict[int, Tuple[np.ndarray, float]] = {}
+        missing = []
+        for user_id in user_ids:
+            entry = self._load(user_id, dim)
+            if entry is None:
+                missing.append(user_id)
+            else:
+                entries[user_id] = entry
+
+        for start in range(0, len(missing), BUILD_CHUNK_SIZE):
+            rows = db.query(
+                models.UserInteraction.user_id,
+                models.ProductEmbedding.vector,
+                models.UserInteraction.rating
+            ).join(
+                models.UserInteraction,
+                models.UserInteraction.product_id == models.ProductEmbedding.product_id
+            ).filter(
+                models.UserInteraction.user_id.in_(missing[start:start + BUILD_CHUNK_SIZE]),
+                models.ProductEmbedding.dim == dim
+            ).order_by(models.UserInteraction.user_id, models.UserInteraction.product_id).all()
+            history: Dict[int, List] = {}
+            for user_id, vector, rating in rows:
+                history.setdefault(user_id, []).append((vector, rating))
+            for user_id, user_rows in history.items():
+                vectors = np.vstack([bytes_to_vector(vector) for vector, _ in user_rows])
+                weights = np.array([rating_weight(rating) for _, rating in user_rows], dtype=np.float32)
+                entries[user_id] = (weights @ vectors, float(weights.sum()))
+                self._save(user_id, entries[user_id])
+
+        return {user_id: total / weight for user_id, (total, weight) in entries.items() if weight > 0}
+
+    def apply_rating(
+        self,
+        db: Session,
+        user_id: int,
+        product_id: int,
+        rating: Optional[int],
+        previous_rating: Optional[int] = None,
+        existed: bool = False
+    ) -> None:
+        """Fold one new or changed interaction into a cached profile."""
+        vector = self._product_vector(db, product_id)
+        if vector is not None:
+            self._add(user_id, vector, rating_weight(rating) - (rating_weight(previous_rating) if existed else 0.0))
+
+    async def apply_rating_async(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        product_id: int,
+        rating: Optional[int],
+        previous_rating: Optional[int] = None,
+        existed: bool = False
+    ) -> None:
+        """`apply_rating` without blocking the event loop."""
+        vector = await db.run_sync(self._product_vector, product_id)
+        if vector is not None:
+            delta = rating_weight(rating) - (rating_weight(previous_rating) if existed else 0.0)
+            await asyncio.to_thread(self._add, user_id, vector, delta)
+
+    def invalidate(self, user_id: int) -> None:
+        self.invalidate_many([user_id])
+
+    def invalidate_many(self, user_ids: Iterable[int]) -> None:
+        """Drop the cached profiles of these users, in one Redis round trip."""
+        user_ids = list(user_ids)
+        with self._lock:
+            for user_id in user_ids:
+                self._profiles.pop(user_id, None)
+        if self.redis_client is not None and user_ids:
+            try:
+                self.redis_client.delete(*[self._key(user_id) for user_id in user_ids])
+            except redis.RedisError as e:
+                logger.warning(f"Error deleting profiles from redis: {str(e)}")
+
+    def _add(self, user_id: int, vector: np.ndarray, delta: float) -> None:
+        """Add `delta` times the vector to a cached profile, atomically; a missing profile is left to be built."""
+        dim = len(vector)
+        if self.redis_client is not None:
+            try:
+                entry = self._add_shared(user_id, vector, delta)
+                if entry is not None:
+                    self._save_local(user_id, entry)
+                return
+            except redis.RedisError as e:
+                logger.warning(f"Error updating profile in redis: {str(e)}")
+
+        with self._lock:
+            entry = self._profiles.get(user_id)
+            if entry is not None and len(entry[0]) == dim:
+                total, weight = entry
+                self._profiles[user_id] = ((total + delta * vector).astype(np.float32), weight + delta)
+
+    def _add_shared(self, user_id: int, vector: np.ndarray, delta: float) -> Optional[Tuple[np.ndarray, float]]:
+        # WATCH/MULTI: retried when another worker updates the profile in between
+        key = self._key(user_id)
+        with self.redis_client.pipeline() as pipe:
+            for _ in range(UPDATE_RETRIES):
+                try:
+                    pipe.watch(key)
+                    entry = self._decode(pipe.get(key), len(vector))
+                    if entry is None:
+                        pipe.unwatch()
+                        return None  # Built from history, including this interaction, on next read
+                    total, weight = entry
+                    entry = (total + delta * vector, weight + delta)
+                    pipe.multi()
+                    pipe.set(key, self._encode(entry), ex=self.ttl)
+                    pipe.execute()
+                    return entry
+                except redis.WatchError:
+                    continue
+        # Still contended: drop it rather than keep a profile missing this rating
+        self.redis_client.delete(key)
+        with self._lock:
+            self._profiles.pop(user_id, None)
+        return None
+
+    def _load(self, user_id: int, dim: int) -> Optional[Tuple[np.ndarray, float]]:
+        if self.redis_client is not None:
+            try:
+                data = self.redis_client.get(self._key(user_id))
+                if data is not None:
+                    return self._decode(data, dim)
+            except redis.RedisError as e:
+                logger.warning(f"Error reading profile from redis: {str(e)}")
+
+        with self._lock:
+            entry = self._profiles.get(user_id)
+            if entry is None or len(entry[0]) != dim:
+                return None
+            self._profiles.move_to_end(user_id)
+            return entry[0].copy(), entry[1]
+
+    def _save(self, user_id: int, entry: Tuple[np.ndarray, float]) -> None:
+        self._save_local(user_id, entry)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.set(self._key(user_id), self._encode(entry), ex=self.ttl)
+            except redis.RedisError as e:
+                logger.warning(f"Error writing profile to redis: {str(e)}")
+
+    def _save_local(self, user_id: int, entry: Tuple[np.ndarray, float]) -> None:
+        total, weight = entry
+        with self._lock:
+            self._profiles[user_id] = (total.astype(np.float32), weight)
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.max_users:
+                self._profiles.popitem(last=False)
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"profile:{user_id}"
+
+    @staticmethod
+    def _encode(entry: Tuple[np.ndarray, float]) -> bytes:
+        total, weight = entry
+        return np.append(total, weight).astype(np.float32).tobytes()
+
+    @staticmethod
+    def _decode(data: Optional[bytes], dim: int) -> Optional[Tuple[np.ndarray, float]]:
+        if data is None:
+            return None
+        values = np.frombuffer(data, dtype=np.float32)
+        if len(values) != dim + 1:
+            return None
+        return values[:-1].copy(), float(values[-1])
+
+    @staticmethod
+    def _build(db: Session, user_id: int, dim: int) -> Optional[Tuple[np.ndarray, float]]:
+        rows = db.query(
+            models.ProductEmbedding.vector,
+            models.UserInteraction.rating
+        ).join(
+            models.UserInteraction,
+            models.UserInteraction.product_id == models.ProductEmbedding.product_id
+        ).filter(
+            models.UserInteraction.user_id == user_id,
+            models.ProductEmbedding.dim == dim
+        ).order_by(models.UserInteraction.product_id).all()  # Same summation order as get_many
+        if not rows:
+            return None
+
+        vectors = np.vstack([bytes_to_vector(vector) for vector, _ in rows])
+        weights = np.array([rating_weight(rating) for _, rating in rows], dtype=np.float32)
+        return weights @ vectors, float(weights.sum())
+
+    @staticmethod
+    def _product_vector(db: Session, product_id: int) -> Optional[np.ndarray]:
+        embedding = db.query(models.ProductEmbedding.vector).filter(
+            models.ProductEmbedding.product_id == product_id
+        ).first()
+        return bytes_to_vector(embedding[0]) if embedding else None
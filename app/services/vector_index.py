@@ -0,0 +1,164 @@
+from sqlalchemy.orm import Session
+from typing import Optional, Tuple
+from app.services import artifacts
+from app.services.embeddings import normalize
+import numpy as np
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "vector_index"
+BRUTE_FORCE_THRESHOLD = 5000  # Below this an exact scan is faster than probing
+ASSIGN_CHUNK_SIZE = 10000
+
+class VectorIndex:
+    """IVF index: vectors grouped by nearest centroid, searched by probing a few lists.
+
+    With no centroids it degrades to an exact brute-force scan.
+    """
+
+    def __init__(
+        self,
+        product_ids: np.ndarray,
+        vectors: np.ndarray,
+        centroids: Optional[np.ndarray] = None,
+        offsets: Optional[np.ndarray] = None
+    ):
+        self.product_ids = product_ids
+        self.vectors = vectors
+        self.centroids = centroids
+        self.offsets = offsets
+        self._id_order: Optional[np.ndarray] = None
+        self._sorted_ids: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    @classmethod
+    def build(
+        cls,
+        product_ids: np.ndarray,
+        vectors: np.ndarray,
+        n_lists: Optional[int] = None,
+        iterations: int = 10,
+        seed: int = 0
+    ) -> "VectorIndex":
+        vectors = normalize(np.asarray(vectors, dtype=np.float32))
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if n_lists is None:
+            if len(vectors) < BRUTE_FORCE_THRESHOLD:
+                return cls(product_ids, vectors)
+            n_lists = int(np.sqrt(len(vectors)))
+
+        centroids = _kmeans(vectors, n_lists, iterations, seed)
+        assignments = _assign(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=len(centroids))
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(product_ids[order], vectors[order], centroids, offsets)
+
+    def search(self, query: np.ndarray, k: int, n_probe: int = 8) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (product_ids, cosine similarities) of the k nearest vectors."""
+        if k <= 0 or not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        if self.centroids is None:
+            rows = np.arange(len(self))
+            similarities = self.vectors @ query
+        else:
+            probes = _top(self.centroids @ query, n_probe)
+            rows = np.concatenate([
+                np.arange(self.offsets[c], self.offsets[c + 1]) for c in probes
+            ])
+            similarities = self.vectors[rows] @ query
+
+        top = _top(similarities, k)
+        return np.asarray(self.product_ids[rows[top]]), similarities[top]
+
+    def vectors_for(self, product_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(vectors, found) for the given ids; `vectors` only has rows where `found` is True."""
+        if self._id_order is None:
+            order = np.argsort(self.product_ids, kind="stable")
+            self._sorted_ids = np.asarray(self.product_ids[order])
+            self._id_order = order
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if not len(self):
+            return np.empty((0, 0), dtype=np.float32), np.zeros(len(product_ids), dtype=bool)
+        slots = np.minimum(np.searchsorted(self._sorted_ids, product_ids), len(self) - 1)
+        found = self._sorted_ids[slots] == product_ids
+        return np.asarray(self.vectors[self._id_order[slots[found]]]), found
+
+    def save(self, directory: str) -> None:
+        np.save(os.path.join(directory, "product_ids.npy"), self.product_ids)
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        if self.centroids is not None:
+            np.save(os.path.join(directory, "centroids.npy"), self.centroids)
+            np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+
+    @classmethod
+    def load(cls, directory: str) -> "VectorIndex":
+        """Memory-map a saved index read-only, so workers share the page cache."""
+        product_ids = np.load(os.path.join(directory, "product_ids.npy"), mmap_mode="r")
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        centroids = offsets = None
+        if os.path.exists(os.path.join(directory, "centroids.npy")):
+            centroids = np.load(os.path.join(directory, "centroids.npy"))
+            offsets = np.load(os.path.join(directory, "offsets.npy"))
+        return cls(product_ids, vectors, centroids, offsets)
+
+class VectorIndexStore(artifacts.ArtifactStore):
+    """Hands out the currently published index, swapping when a rebuild lands."""
+
+    def __init__(self, check_interval: float = 30.0):
+        super().__init__(INDEX_NAME, VectorIndex.load, check_interval)
+
+def build_vector_index(db: Session) -> Optional[str]:
+    """Build an index from stored product embeddings and publish it."""
+    from app.services.embedding_updater import load_product_embeddings
+
+    product_ids, vectors = load_product_embeddings(db)
+    if not len(product_ids):
+        logger.info("No product embeddings, skipping vector index build")
+        return None
+
+    index = VectorIndex.build(product_ids, vectors)
+    build_dir = artifacts.new_version_dir(INDEX_NAME)
+    index.save(build_dir)
+    return artifacts.publish(INDEX_NAME, build_dir)
+
+def _top(values: np.ndarray, k: int) -> np.ndarray:
+    if len(values) > k:
+        top = np.argpartition(-values, k - 1)[:k]
+    else:
+        top = np.arange(len(values))
+    return top[np.argsort(-values[top])]
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_SIZE):
+        chunk = vectors[start:start + ASSIGN_CHUNK_SIZE]
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+def _kmeans(vectors: np.ndarray, n_lists: int, iterations: int, seed: int, sample: int = 50000) -> np.ndarray:
+    """Spherical k-means on a sample of the vectors."""
+    rng = np.random.default_rng(seed)
+    n_lists = max(1, min(n_lists, len(vectors)))
+    train = vectors[rng.choice(len(vectors), min(sample, len(vectors)), replace=False)]
+    centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _assign(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, train)
+        counts = np.bincount(assignments, minlength=n_lists)
+        filled = counts > 0
+        centroids[filled] = normalize(sums[filled])
+
+    return centroids
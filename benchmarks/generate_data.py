@@ -0,0 +1,211 @@
+"""Synthetic catalog generator for benchmarks.
+
+    python -m benchmarks.generate_data --url sqlite:///bench.db --products 10000 --users 1000
+
+Interactions follow a Zipf distribution over products, so a few products are
+very popular and most are rarely seen, as in real traffic.
+"""
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from datetime import datetime
+from typing import Dict, List
+import argparse
+import json
+import logging
+import os
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WORDS = (
+    "red blue green black white silver wireless bluetooth smart portable compact "
+    "premium classic modern vintage organic cotton leather steel wooden glass "
+    "phone laptop tablet camera speaker headphones charger cable keyboard mouse "
+    "monitor lamp chair desk bottle jacket shoe watch backpack novel cookbook "
+    "history science fantasy mystery guide kit set pack pro mini max ultra lite"
+).split()
+INSERT_CHUNK_SIZE = 10000
+PASSWORD_HASH = "!"  # Benchmark users never log in with a password
+
+def generate(
+    url: str,
+    products: int = 10000,
+    users: int = 1000,
+    category_depth: int = 3,
+    category_fanout: int = 4,
+    interactions_per_user: float = 20.0,
+    zipf_exponent: float = 1.1,
+    rating_share: float = 0.3,
+    extra_words: int = 0,
+    seed: int = 42
+) -> Dict:
+    """Create the schema at `url` and fill it with a synthetic catalog.
+
+    `extra_words` adds a vocabulary of that many random words (think model
+    numbers and brand names), a few per description, so search runs against
+    a realistically large vocabulary.
+    """
+    from app.models.database import Base
+    from app.models import models
+    from app.services.product_stats import rebuild_product_stats
+
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+
+    categories = _categories(category_depth, category_fanout)
+    leaves = [c["category_id"] for c in categories if c["leaf"]]
+    now = datetime.utcnow()
+
+    with engine.begin() as conn:
+        conn.execute(insert(models.Category.__table__), [
+            {key: c[key] for key in ("category_id", "name", "parent_category_id")} for c in categories
+        ])
+        _insert_chunked(conn, models.User.__table__, (
+            {
+                "user_id": user_id,
+                "username": f"user{user_id}",
+                "email": f"user{user_id}@example.com",
+                "password_hash": PASSWORD_HASH,
+                "created_at": now
+            }
+            for user_id in range(1, users + 1)
+        ))
+
+        words = np.array(WORDS)
+        extra = _random_words(rng, extra_words)
+        product_categories = rng.choice(leaves, size=products)
+        prices = np.round(rng.lognormal(3.0, 1.0, size=products), 2) + 0.01
+        _insert_chunked(conn, models.Product.__table__, (
+            {
+                "product_id": product_id,
+                "name": " ".join(words[rng.choice(len(words), 3, replace=False)]).title(),
+                "description": " ".join(words[rng.choice(len(words), 12)])
+                + ("".join(" " + extra[i] for i in rng.choice(len(extra), 3)) if len(extra) else ""),
+                "price": float(prices[product_id - 1]),
+                "category_id": int(product_categories[product_id - 1]),
+                "created_at": now,
+                "updated_at": now
+            }
+            for product_id in range(1, products + 1)
+        ))
+
+        user_ids, product_ids = _zipf_interactions(rng, users, products, interactions_per_user, zipf_exponent)
+        count = len(user_ids)
+        ratings = rng.integers(1, 6, size=count)
+        rated = rng.random(count) < rating_share
+        views = rng.geometric(0.4, size=count)
+        purchases = rng.binomial(1, 0.1, size=count)
+        _insert_chunked(conn, models.UserInteraction.__table__, (
+            {
+                "user_id": int(user_ids[i]),
+                "product_id": int(product_ids[i]),
+                "rating": int(ratings[i]) if rated[i] else None,
+                "view_count": int(views[i]),
+                "purchase_count": int(purchases[i]),
+                "interaction_date": now
+            }
+            for i in range(count)
+        ))
+
+    db = sessionmaker(bind=engine)()
+    try:
+        rebuild_product_stats(db)
+    finally:
+        db.close()
+    engine.dispose()
+
+    summary = {
+        "products": products,
+        "users": users,
+        "categories": len(categories),
+        "interactions": count,
+        "extra_words": len(extra),
+        "seconds": round(time.perf_counter() - started, 2)
+    }
+    logger.info(f"Generated synthetic catalog: {summary}")
+    return summary
+
+def _categories(depth: int, fanout: int) -> List[Dict]:
+    """A `fanout`-ary category tree `depth` levels deep; products go in the leaves."""
+    categories = []
+    level = [None]
+    for depth_level in range(1, depth + 1):
+        next_level = []
+        for parent_id in level:
+            for _ in range(fanout):
+                category_id = len(categories) + 1
+                categories.append({
+                    "category_id": category_id,
+                    "name": f"Category {category_id}",
+                    "parent_category_id": parent_id,
+                    "leaf": depth_level == depth
+                })
+                next_level.append(category_id)
+        level = next_level
+    return categories
+
+def _random_words(rng, count: int) -> np.ndarray:
+    """Distinct lowercase words of 4 to 9 letters."""
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    words = set()
+    while len(words) < count:
+        words.add("".join(letters[rng.integers(0, 26, size=int(rng.integers(4, 10)))]))
+    return np.array(sorted(words))
+
+def _zipf_interactions(rng, users: int, products: int, per_user: float, exponent: float):
+    """Distinct (user_id, product_id) pairs with Zipf-distributed product popularity."""
+    weights = 1.0 / np.arange(1, products + 1) ** exponent
+    cdf = np.cumsum(weights / weights.sum())
+    popularity = rng.permutation(products) + 1  # Rank -> product id
+
+    counts = np.maximum(rng.poisson(per_user, size=users), 1)
+    user_ids = np.repeat(np.arange(1, users + 1), counts)
+    ranks = np.minimum(np.searchsorted(cdf, rng.random(len(user_ids))), products - 1)
+    product_ids = popularity[ranks]
+
+    pairs = np.unique(user_ids.astype(np.int64) * (products + 1) + product_ids)
+    return pairs // (products + 1), pairs % (products + 1)
+
+def _insert_chunked(conn, table, rows) -> None:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= INSERT_CHUNK_SIZE:
+            conn.execute(insert(table), chunk)
+            chunk = []
+    if chunk:
+        conn.execute(insert(table), chunk)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic catalog for benchmarks")
+    parser.add_argument("--url", default="sqlite:///benchmark.db")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--category-depth", type=int, default=3)
+    parser.add_argument("--category-fanout", type=int, default=4)
+    parser.add_argument("--interactions-per-user", type=float, default=20.0)
+    parser.add_argument("--zipf-exponent", type=float, default=1.1)
+    parser.add_argument("--extra-words", type=int, default=0, help="Extra random vocabulary for search")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # app.models.database builds its engines from DATABASE_URL on import
+    os.environ.setdefault("DATABASE_URL", args.url)
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(generate(
+        args.url,
+        products=args.products,
+        users=args.users,
+        category_depth=args.category_depth,
+        category_fanout=args.category_fanout,
+        interactions_per_user=args.interactions_per_user,
+        zipf_exponent=args.zipf_exponent,
+        extra_words=args.extra_words,
+        seed=args.seed
+    ), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Latency/throughput benchmarks for the API hot paths.
+
+    python -m benchmarks.run_benchmarks --sizes small,medium --output results.json
+
+Each data size runs in its own process against a freshly generated SQLite
+catalog, driving the full FastAPI app in-process. The response cache is
+disabled so every request exercises the underlying code path.
+"""
+from typing import Callable, Dict, List
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+SIZES = {
+    "small": {"products": 1000, "users": 200},
+    "medium": {"products": 10000, "users": 2000},
+    "large": {"products": 100000, "users": 10000},
+    # Search at catalog scale: a vocabulary of 200k+ terms makes prefix expansion expensive
+    "search_large": {"products": 200000, "users": 1000, "extra_words": 200000}
+}
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_size(size: str, iterations: int, warmup: int, seed: int, data_dir: str) -> Dict:
+    """Generate a catalog of the given size and benchmark it in a child process."""
+    url = f"sqlite:///{os.path.join(data_dir, f'benchmark-{size}.db')}"
+    result_file = os.path.join(data_dir, f"result-{size}.json")
+    env = dict(
+        os.environ,
+        DATABASE_URL=url,
+        RECSYS_ARTIFACT_DIR=os.path.join(data_dir, f"artifacts-{size}")
+    )
+    subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.run_benchmarks", "--worker",
+            "--sizes", size,
+            "--iterations", str(iterations),
+            "--warmup", str(warmup),
+            "--seed", str(seed),
+            "--output", result_file
+        ],
+        cwd=PROJECT_ROOT,
+        env=env,
+        check=True
+    )
+    with open(result_file) as f:
+        return json.load(f)
+
+def worker(size: str, iterations: int, warmup: int, seed: int) -> Dict:
+    from benchmarks.generate_data import generate, WORDS
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    dataset = generate(os.environ["DATABASE_URL"], seed=seed, **SIZES[size])
+
+    from fastapi.testclient import TestClient
+    from app.core import security
+    from app.core.cache import response_cache
+    from app.models import models
+    from app.models.database import SessionLocal
+    import main
+
+    queries = [0]
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _count_query(*args):
+        queries[0] += 1
+
+    db = SessionLocal()
+    try:
+        category_names = [name for (name,) in db.query(models.Category.name)]
+    finally:
+        db.close()
+
+    rng = random.Random(seed)
+    users = SIZES[size]["users"]
+    products = SIZES[size]["products"]
+    tokens = {}
+
+    def auth_header(user_id: int) -> Dict[str, str]:
+        if user_id not in tokens:
+            tokens[user_id] = security.create_access_token(data={"sub": f"user{user_id}@example.com"})
+        return {"Authorization": f"Bearer {tokens[user_id]}"}
+
+    with TestClient(main.app) as client:
+        # Measure the code paths themselves, not cache hits
+        response_cache.redis = None
+        response_cache.local_size = 0
+
+        scenarios = {
+            "get_recommendations": lambda: client.get("/products/recommendations", params={
+                "user_id": rng.randint(1, users),
+                "limit": 5,
+                "category": rng.choice(category_names) if rng.random() < 0.5 else None
+            }),
+            "search_products": lambda: client.get("/products/search", params={
+                "query": " ".join(rng.sample(WORDS, rng.randint(1, 2)))
+            }),
+            # A partially typed last word of one or two letters, matched as a prefix
+            "search_prefix": lambda: client.get("/products/search", params={
+                "query": f"{rng.choice(WORDS)} {rng.choice(LETTERS)}{rng.choice(['', *'aeiou'])}"
+            }),
+            "submit_feedback": lambda: _submit_feedback(client, rng, users, products, auth_header)
+        }
+        results = [
+            _measure(name, call, iterations, warmup, queries)
+            for name, call in scenarios.items()
+        ]
+
+    return {"size": size, "dataset": dataset, "scenarios": results}
+
+def _submit_feedback(client, rng, users: int, products: int, auth_header: Callable):
+    user_id = rng.randint(1, users)
+    return client.post(
+        "/products/feedback",
+        json={
+            "user_id": user_id,
+            "product_id": rng.randint(1, products),
+            "rating": rng.randint(1, 5),
+            "feedback_text": "benchmark"
+        },
+        headers=auth_header(user_id)
+    )
+
+def _measure(name: str, call: Callable, iterations: int, warmup: int, queries: List[int]) -> Dict:
+    for _ in range(warmup):
+        call()
+
+    latencies, query_counts = [], []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        before = queries[0]
+        request_started = time.perf_counter()
+        response = call()
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        query_counts.append(queries[0] - before)
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array(latencies)
+    return {
+        "scenario": name,
+        "iterations": iterations,
+        "errors": errors,
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p90": round(float(np.percentile(latencies, 90)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+            "mean": round(float(latencies.mean()), 3),
+            "max": round(float(latencies.max()), 3)
+        },
+        "throughput_rps": round(iterations / elapsed, 1),
+        "queries_per_request": round(float(np.mean(query_counts)), 2)
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recommendations, search and feedback")
+    parser.add_argument("--sizes", default="small,medium", help=f"Comma-separated, from: {', '.join(SIZES)}")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Write JSON results here instead of stdout")
+    parser.add_argument("--data-dir", default=None, help="Keep generated databases in this directory")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"Unknown sizes: {', '.join(unknown)}")
+
+    if args.worker:
+        result = worker(sizes[0], args.iterations, args.warmup, args.seed)
+        with open(args.output, "w") as f:
+            json.dump(result, f)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        os.makedirs(data_dir, exist_ok=True)
+        results = [run_size(size, args.iterations, args.warmup, args.seed, data_dir) for size in sizes]
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "seed": args.seed
+        },
+        "results": results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Serialization cost of the hot endpoints' responses, per 1,000 items.
+
+    python -m benchmarks.serialization --items 1000 --repeats 50
+
+"before" is what FastAPI does with a `response_model`: validate the data,
+serialize it in JSON mode and encode it with `json.dumps`. "after" is the
+fast path: project each item onto the model's fields and encode the list
+with a single orjson call.
+"""
+from typing import Callable, Dict, List
+from pydantic import TypeAdapter
+import argparse
+import datetime
+import json
+import random
+import statistics
+import time
+
+def recommendation_items(count: int, rng: random.Random) -> List[Dict]:
+    return [
+        {
+            "product_id": product_id,
+            "name": f"Product {product_id}",
+            "description": " ".join(rng.choice(("red", "wireless", "phone", "cable", "slim")) for _ in range(12)),
+            "price": round(rng.uniform(1, 500), 2),
+            "category_id": rng.randint(1, 50),
+            "category_name": "Phones",
+            "average_rating": round(rng.uniform(1, 5), 2),
+            "interaction_count": rng.randint(0, 500),
+            "similarity_score": round(rng.random(), 2),
+            "image_url": f"https://example.com/{product_id}.jpg"
+        }
+        for product_id in range(1, count + 1)
+    ]
+
+def product_items(count: int, rng: random.Random) -> List[Dict]:
+    created_at = datetime.datetime(2024, 1, 1, 12, 30)
+    return [
+        {
+            "product_id": product_id,
+            "name": f"Product {product_id}",
+            "description": " ".join(rng.choice(("red", "wireless", "phone", "cable", "slim")) for _ in range(12)),
+            "price": round(rng.uniform(1, 500), 2),
+            "category_id": 7,
+            "image_url": None,
+            "created_at": created_at,
+            "category": {"category_id": 7, "name": "Phones", "parent_category_id": 1},
+            "feedback": [
+                {
+                    "feedback_id": product_id * 10 + i,
+                    "user_id": rng.randint(1, 1000),
+                    "product_id": product_id,
+                    "rating": rng.randint(1, 5),
+                    "feedback_text": "Works as described",
+                    "created_at": created_at
+                }
+                for i in range(3)
+            ]
+        }
+        for product_id in range(1, count + 1)
+    ]
+
+def pydantic_path(model) -> Callable[[List[Dict]], bytes]:
+    adapter = TypeAdapter(List[model])
+
+    def encode(items: List[Dict]) -> bytes:
+        data = adapter.dump_python(adapter.validate_python(items), mode="json")
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return encode
+
+def measure(encode: Callable[[List[Dict]], bytes], items: List[Dict], repeats: int) -> Dict:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        encode(items)
+        timings.append(time.perf_counter() - started)
+    per_1k = 1000.0 / len(items) * 1000.0
+    return {
+        "median_ms_per_1k": round(statistics.median(timings) * per_1k, 3),
+        "min_ms_per_1k": round(min(timings) * per_1k, 3)
+    }
+
+def run(items: int, repeats: int, seed: int) -> Dict:
+    from app.schemas import schemas
+    from app.core.serialization import encode_list, PRODUCT_FIELDS, RECOMMENDATION_FIELDS
+
+    rng = random.Random(seed)
+    cases = {
+        "recommendations": (recommendation_items(items, rng), schemas.RecommendationResponse, RECOMMENDATION_FIELDS),
+        "search_expanded": (product_items(items, rng), schemas.ProductResponse, PRODUCT_FIELDS)
+    }
+    results = {}
+    for name, (data, model, fields) in cases.items():
+        before = pydantic_path(model)
+        after = lambda items, fields=fields: encode_list(items, fields)
+        if json.loads(before(data)) != json.loads(after(data)):
+            raise AssertionError(f"Fast path output differs for {name}")
+        result = {
+            "before": measure(before, data, repeats),
+            "after": measure(after, data, repeats)
+        }
+        result["speedup"] = round(result["before"]["median_ms_per_1k"] / result["after"]["median_ms_per_1k"], 1)
+        results[name] = result
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response serialization")
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(run(args.items, args.repeats, args.seed), indent=2))
+
+if __name__ == "__main__":
+    main()
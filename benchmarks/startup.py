@@ -0,0 +1,89 @@
+"""Import time and time-to-ready of a fresh API worker.
+
+    python -m benchmarks.startup --size small --runs 5
+
+Generates a catalog once, then starts the app `--runs` times, each in a new
+process: "import" is the time to import `main`, "ready" is the time from
+the startup event until /health/ready answers 200.
+"""
+from typing import Dict
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure_once() -> Dict:
+    started = time.perf_counter()
+    import main
+    imported = time.perf_counter() - started
+
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        started = time.perf_counter()
+        while client.get("/health/ready").status_code != 200:
+            time.sleep(0.005)
+        ready = time.perf_counter() - started
+        steps = client.get("/health/ready").json()["steps"]
+    return {"import_seconds": imported, "ready_seconds": ready, "steps": steps}
+
+def summarize(runs, key: str) -> Dict:
+    values = [run[key] for run in runs]
+    return {
+        "median": round(statistics.median(values), 3),
+        "min": round(min(values), 3),
+        "max": round(max(values), 3)
+    }
+
+def main():
+    from benchmarks.run_benchmarks import SIZES
+
+    parser = argparse.ArgumentParser(description="Measure API import time and time-to-ready")
+    parser.add_argument("--size", default="small", choices=list(SIZES))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure_once()))
+        return
+
+    from benchmarks.generate_data import generate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'startup.db')}",
+            RECSYS_ARTIFACT_DIR=os.path.join(tmp, "artifacts")
+        )
+        os.environ.update(env)
+        generate(env["DATABASE_URL"], seed=args.seed, **SIZES[args.size])
+
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.startup", "--worker"],
+                cwd=PROJECT_ROOT,
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(json.dumps({
+        "size": args.size,
+        "runs": args.runs,
+        "import_seconds": summarize(runs, "import_seconds"),
+        "ready_seconds": summarize(runs, "ready_seconds"),
+        "steps": runs[-1]["steps"]
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
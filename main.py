@@ -1,14 +1,19 @@
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api.endpoints import products, auth
-from app.models.database import Base, engine
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
+from app.core import security
+from app.core.cache import init_cache, REDIS_URL, REDIS_OPTIONS
+from app.core.monitoring import MetricsMiddleware, metrics_response, STARTUP_SECONDS
+from app.core.startup import Warmup, deferred, with_session
 from redis import asyncio as aioredis
 from fastapi.openapi.utils import get_openapi
+import asyncio
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Tables are created by `python -m app.scripts.init_db`, not on every start
 
 app = FastAPI(
     title="Product Recommendation API",
@@ -46,16 +51,66 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+app.add_middleware(MetricsMiddleware)
+
+async def start_recommendation_service() -> None:
+    """Create the recommendation service off the loop, then share precomputed invalidations."""
+    service = await asyncio.to_thread(products.get_recommendation_service)
+    service.precomputed.start_sync()
+
+# Preloaded in this order before the worker reports ready. The numpy-backed
+# services are imported by these steps, not with this module.
+warmup = Warmup([
+    ("auth", security.preload),
+    ("recommendation_service", start_recommendation_service),
+    ("category_tree", with_session(deferred("app.services.category_tree", "category_tree.load"))),
+    ("catalog_snapshot", deferred("app.services.catalog_snapshot", "catalog_snapshot.get")),
+    ("stats_index", with_session(lambda db: products.get_recommendation_service().stats_index.load(db))),
+    ("vector_index", lambda: products.get_recommendation_service().vector_index.get()),
+    ("precomputed", lambda: products.get_recommendation_service().precomputed.get()),
+    ("search_index", with_session(deferred("app.services.search_index", "search_index.load")))
+])
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for this worker."""
+    return metrics_response()
+
+@app.get("/health/live", include_in_schema=False)
+async def health_live():
+    """The process is up and serving requests."""
+    return {"status": "alive"}
+
+@app.get("/health/ready", include_in_schema=False)
+async def health_ready():
+    """200 once warm-up has finished; 503 until then, so the load balancer waits."""
+    return JSONResponse(
+        status_code=200 if warmup.ready else 503,
+        content=dict(warmup.status(), status="ready" if warmup.ready else "warming_up")
+    )
 
 @app.on_event("startup")
 async def startup():
-    redis = aioredis.from_url("redis://localhost", encoding="utf8", decode_responses=True)
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    init_cache(aioredis.from_url(REDIS_URL, **REDIS_OPTIONS))
+    warmup.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await warmup.stop()
+    # Write out interactions still held by the write-behind buffer
+    await products.interaction_buffer.stop()
+    service = products.recommendation_service
+    if service is not None:
+        await service.precomputed.stop_sync()
+        if service.pipeline is not None:
+            await service.pipeline.stop()
 
 
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(products.router, prefix="/products", tags=["Products"])
 
+STARTUP_SECONDS.labels(phase="import").set(time.perf_counter() - _import_started)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
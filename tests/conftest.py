@@ -0,0 +1,68 @@
+"""Shared fixtures: a small synthetic catalog in a temporary SQLite database.
+
+The database, artifact directory and generator budget are read when `app`
+is imported, so they are set here, before any test module imports it.
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+
+import pytest
+
+DATA_DIR = tempfile.mkdtemp(prefix="recsys-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DATA_DIR, 'catalog.db')}"
+os.environ["RECSYS_ARTIFACT_DIR"] = os.path.join(DATA_DIR, "artifacts")
+# Results must not depend on how fast this machine runs a generator
+os.environ["CANDIDATE_GENERATOR_BUDGET_MS"] = "60000"
+
+CATALOG = {"products": 300, "users": 60, "category_depth": 2, "category_fanout": 3, "seed": 7}
+
+@pytest.fixture(scope="session")
+def catalog():
+    """Generated catalog with product embeddings, a vector index and a factor model published."""
+    from benchmarks.generate_data import generate
+    from app.models.database import SessionLocal
+    from app.services.embedding_updater import update_product_embeddings
+    from app.services.factorization import train_and_publish
+    from app.services.vector_index import build_vector_index
+
+    summary = generate(os.environ["DATABASE_URL"], **CATALOG)
+    db = SessionLocal()
+    try:
+        update_product_embeddings(db)
+        build_vector_index(db)
+        train_and_publish(db, factors=8, iterations=3)
+    finally:
+        db.close()
+    yield summary
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+@pytest.fixture
+def db(catalog):
+    from app.models.database import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def service(catalog):
+    """The recommendation service as the API builds it, without Redis."""
+    from app.services.recommendation import create_service
+
+    return create_service()
+
+@pytest.fixture
+def run():
+    """Runs a coroutine on a fresh event loop, then drops the async connections bound to it."""
+    from app.models.database import async_engine
+
+    def run(coroutine):
+        async def main():
+            try:
+                return await coroutine
+            finally:
+                await async_engine.dispose()
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,51 @@
+import random
+
+from app.models import models
+from app.models.database import AsyncSessionLocal
+from app.services import artifacts
+from app.services.precomputed import PRECOMPUTED_NAME, PrecomputedStore, build_precomputed
+from app.services.recommendation import BATCH_CHUNK_SIZE, create_service
+
+def _requests(count: int, seed: int = 11):
+    rng = random.Random(seed)
+    return [
+        (rng.randint(1, 70), rng.choice([1, 5, 10, 20]), rng.choice([None, "Category 2", "category 7", "Nope"]))
+        for _ in range(count)
+    ]
+
+def _one_by_one(service, run, requests):
+    async def rank():
+        results = []
+        for user_id, limit, category in requests:
+            async with AsyncSessionLocal() as db:
+                if await db.get(models.User, user_id) is None:
+                    results.append(None)
+                else:
+                    results.append(await service.recommend_async(db, user_id, limit, category))
+        return results
+    return run(rank())
+
+def test_batch_matches_single_requests(service, db, run):
+    requests = _requests(3 * BATCH_CHUNK_SIZE + 5)
+
+    batch = list(service.recommend_many(db, requests))
+
+    assert [user_id for user_id, _ in batch] == [user_id for user_id, _, _ in requests]
+    assert [recommendations for _, recommendations in batch] == _one_by_one(service, run, requests)
+
+def test_batch_serves_precomputed_lists_like_single_requests(db, run):
+    build_dir = artifacts.new_version_dir(PRECOMPUTED_NAME)
+    build_precomputed(db, create_service()).save(build_dir)
+    artifacts.publish(PRECOMPUTED_NAME, build_dir)
+    service = create_service(precomputed=PrecomputedStore())
+    # A changed user is ranked live again, by both paths
+    service.precomputed.mark_changed([4])
+    requests = _requests(2 * BATCH_CHUNK_SIZE, seed=12) + [(4, 5, None), (4, 10, "Category 2")]
+
+    batch = [recommendations for _, recommendations in service.recommend_many(db, requests)]
+
+    assert any(
+        service.precomputed.lookup(user_id, category, limit) is not None
+        for user_id, limit, category in requests
+    )
+    assert batch == _one_by_one(service, run, requests)
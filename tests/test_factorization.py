@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+from app.services import factorization
+from app.services.factorization import train
+
+def _reference_solve(confidence: sp.csr_matrix, fixed: np.ndarray, regularization: float) -> np.ndarray:
+    """Textbook implicit ALS half-step, one row at a time."""
+    factors = fixed.shape[1]
+    solved = np.zeros((confidence.shape[0], factors))
+    for row in range(confidence.shape[0]):
+        weights = confidence[row].toarray().ravel()
+        if not weights.any():
+            continue
+        c = np.where(weights > 0, weights, 1.0)
+        p = (weights > 0).astype(float)
+        a = fixed.T @ (c[:, None] * fixed) + regularization * np.eye(factors)
+        solved[row] = np.linalg.solve(a, fixed.T @ (c * p))
+    return solved
+
+def test_blocked_solve_matches_per_row_solve(monkeypatch):
+    # Small blocks, so rows of different lengths land in different padded blocks
+    monkeypatch.setattr(factorization, "SOLVE_CHUNK_SIZE", 4)
+    rng = np.random.default_rng(3)
+    confidence = sp.random(40, 25, density=0.2, random_state=4, format="csr", dtype=np.float32)
+    confidence.data = 1.0 + 10.0 * confidence.data
+    fixed = rng.standard_normal((25, 6)).astype(np.float32)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        solved = factorization._solve(confidence, fixed, 0.05, pool)
+
+    np.testing.assert_allclose(solved, _reference_solve(confidence, fixed.astype(float), 0.05), rtol=1e-3, atol=1e-4)
+
+def test_trained_factors_rank_seen_items_above_unseen(db):
+    model, report = train(db, factors=16, iterations=10, warm_start=False)
+    strengths, user_ids, item_ids = factorization.load_interactions(db)
+
+    assert report["users"] == len(user_ids) and report["items"] == len(item_ids)
+    scores = model.user_factors @ model.item_factors.T
+    seen = strengths.toarray() > 0
+    assert scores[seen].mean() > scores[~seen].mean() + 0.3
+    products, top_scores = model.recommend(int(user_ids[0]), 5)
+    assert set(products) <= set(item_ids.tolist())
+    assert list(top_scores) == sorted(top_scores, reverse=True)
@@ -0,0 +1,109 @@
+import asyncio
+import contextlib
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.models import models
+from app.models.database import Base
+from app.schemas.schemas import InteractionEvent
+from app.services.interaction_buffer import BufferFull, InteractionBuffer, write_interactions
+
+@pytest.fixture
+def sessions(tmp_path):
+    """(sync, async) session factories on a database of its own with one user and two products."""
+    path = tmp_path / "interactions.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(models.Category(category_id=1, name="Phones"))
+        db.add(models.User(user_id=1, username="buyer", email="buyer@example.com", password_hash="!"))
+        db.add_all([models.Product(product_id=i, name=f"Phone {i}", price=10.0 * i, category_id=1) for i in (1, 2)])
+        db.commit()
+    # No pooling: each test runs its own event loop
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    yield Session, sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+    engine.dispose()
+
+def _interaction(db, user_id, product_id):
+    return db.query(models.UserInteraction).filter_by(user_id=user_id, product_id=product_id).one_or_none()
+
+def _stats(db, product_id):
+    return db.get(models.ProductStats, product_id)
+
+def test_increments_are_upserted_with_their_stats(sessions):
+    Session, _ = sessions
+    with Session() as db:
+        write_interactions(db, {(1, 1): [2, 0, None], (1, 2): [1, 1, 4]})
+        write_interactions(db, {(1, 1): [3, 1, 5], (1, 2): [1, 0, 2]})
+
+        first, second = _interaction(db, 1, 1), _interaction(db, 1, 2)
+        assert (first.view_count, first.purchase_count, first.rating) == (5, 1, 5)
+        assert (second.view_count, second.purchase_count, second.rating) == (2, 1, 2)
+        stats = _stats(db, 2)
+        assert (stats.interaction_count, stats.view_count, stats.rating_sum, stats.rating_count) == (1, 2, 2, 1)
+        assert stats.avg_rating == 2.0
+
+def test_unknown_users_and_products_are_dropped(sessions):
+    Session, _ = sessions
+    with Session() as db:
+        write_interactions(db, {(1, 1): [1, 0, None], (99, 1): [1, 0, None], (1, 99): [1, 0, None]})
+
+        assert db.query(models.UserInteraction).count() == 1
+        assert _stats(db, 1).view_count == 1
+
+def test_failed_flush_is_requeued_and_written_later(sessions, run):
+    Session, AsyncSessionFactory = sessions
+    attempts = []
+
+    def flaky_session():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise ConnectionError("database unavailable")
+        return AsyncSessionFactory()
+
+    async def ingest():
+        buffer = InteractionBuffer(flaky_session, flush_interval=60)
+        await buffer.add([InteractionEvent(user_id=1, product_id=1, views=2, rating=3)])
+        with pytest.raises(ConnectionError):
+            await buffer.flush()
+        assert buffer.pending == 1
+        await buffer.add([InteractionEvent(user_id=1, product_id=1, views=1, purchases=1)])
+        await buffer.stop()
+        assert buffer.pending == 0
+
+    run(ingest())
+    with Session() as db:
+        interaction = _interaction(db, 1, 1)
+        assert (interaction.view_count, interaction.purchase_count, interaction.rating) == (3, 1, 3)
+
+def test_full_buffer_rejects_the_whole_batch(sessions, run):
+    _, AsyncSessionFactory = sessions
+
+    async def ingest():
+        release = asyncio.Event()
+
+        @contextlib.asynccontextmanager
+        async def slow_session():
+            await release.wait()
+            async with AsyncSessionFactory() as db:
+                yield db
+
+        buffer = InteractionBuffer(slow_session, max_pending=2, flush_interval=60, enqueue_timeout=0.05)
+        await buffer.add([InteractionEvent(user_id=1, product_id=1, views=1)])
+        flushing = asyncio.create_task(buffer.flush())  # Holds the flush lock until released
+        await asyncio.sleep(0)
+        await buffer.add([InteractionEvent(user_id=1, product_id=1, views=1), InteractionEvent(user_id=1, product_id=2)])
+        with pytest.raises(BufferFull):
+            await buffer.add([InteractionEvent(user_id=1, product_id=2, views=1), InteractionEvent(user_id=2, product_id=1)])
+        pending = buffer.pending
+        release.set()
+        await flushing
+        await buffer.stop()
+        return pending
+
+    assert run(ingest()) == 2
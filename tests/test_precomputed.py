@@ -0,0 +1,68 @@
+import fakeredis
+import pytest
+
+from app.services import artifacts
+from app.services.precomputed import PRECOMPUTED_NAME, PrecomputedStore, build_precomputed
+from app.services.recommendation import create_service
+
+@pytest.fixture
+def published(db):
+    """Publish precomputed lists for the catalog; returns a user that has one."""
+    store = build_precomputed(db, create_service())
+    build_dir = artifacts.new_version_dir(PRECOMPUTED_NAME)
+    store.save(build_dir)
+    artifacts.publish(PRECOMPUTED_NAME, build_dir)
+    return next(user_id for user_id in range(1, 61) if store.is_personalized(user_id))
+
+@pytest.fixture
+def workers():
+    """Two workers' stores sharing one Redis."""
+    server = fakeredis.FakeServer()
+    return (
+        PrecomputedStore(redis_client=fakeredis.FakeRedis(server=server)),
+        PrecomputedStore(redis_client=fakeredis.FakeRedis(server=server))
+    )
+
+def test_changed_user_is_not_served_by_any_worker_after_sync(published, workers):
+    first, second = workers
+    assert first.lookup(published, None, 5) is not None
+    assert second.lookup(published, None, 5) is not None
+
+    first.mark_changed([published])
+    assert first.lookup(published, None, 5) is None
+    assert second.lookup(published, None, 5) is not None
+
+    first.sync()
+    second.sync()
+    assert second.lookup(published, None, 5) is None
+
+def test_changed_category_is_shared(published, workers):
+    first, second = workers
+    first.mark_scopes_changed(["Category 2", None])
+
+    first.sync()
+    second.sync()
+    assert set(second._changed_scopes) == {"category 2", ""}
+
+def test_failed_push_is_retried(published, workers, caplog):
+    first, second = workers
+    healthy = first.redis_client
+    down = fakeredis.FakeServer()
+    down.connected = False
+    first.redis_client = fakeredis.FakeRedis(server=down)
+    first.mark_changed([published])
+
+    first.sync()  # Logged, not raised; the change stays queued
+    assert "Error syncing precomputed changes" in caplog.text
+    first.redis_client = healthy
+    first.sync()
+    second.sync()
+
+    assert second.lookup(published, None, 5) is None
+
+def test_without_redis_changes_stay_local(published):
+    store = PrecomputedStore()
+    store.mark_changed([published])
+
+    store.sync()
+    assert store.lookup(published, None, 5) is None
@@ -0,0 +1,68 @@
+import asyncio
+import random
+
+from app.models import models
+from app.models.database import AsyncSessionLocal
+from app.services.request_coalescer import RequestCoalescer
+
+def _requests(count: int, seed: int = 5):
+    """(user_id, limit, category) mixes with unknown users, categories and repeats."""
+    rng = random.Random(seed)
+    return [
+        (rng.randint(1, 70), rng.choice([1, 5, 10, 20]), rng.choice([None, "Category 1", "category 5", "Nope"]))
+        for _ in range(count)
+    ]
+
+async def _one_by_one(service, requests):
+    results = []
+    for user_id, limit, category in requests:
+        async with AsyncSessionLocal() as db:
+            if await db.get(models.User, user_id) is None:
+                results.append(None)
+            else:
+                results.append(await service.recommend_async(db, user_id, limit, category))
+    return results
+
+def test_coalesced_requests_match_single_requests(service, run):
+    requests = _requests(150)
+
+    async def compare():
+        coalescer = RequestCoalescer(service, AsyncSessionLocal, window=0.005, max_batch=64)
+        coalesced = await asyncio.gather(*[coalescer.recommend(*request) for request in requests])
+        return coalesced, await _one_by_one(service, requests)
+
+    coalesced, single = run(compare())
+    assert any(result for result in single)
+    assert any(result is None for result in single)
+    assert coalesced == single
+
+def test_identical_requests_share_one_computation(service, run):
+    batches = []
+    recommend_many_async = service.recommend_many_async
+
+    async def counting(db, keys):
+        batches.append(list(keys))
+        return await recommend_many_async(db, keys)
+    service.recommend_many_async = counting
+
+    async def herd():
+        coalescer = RequestCoalescer(service, AsyncSessionLocal, window=0.005, max_batch=64)
+        return await asyncio.gather(*[coalescer.recommend(3, 5, None) for _ in range(20)])
+
+    results = run(herd())
+    assert batches == [[(3, 5, None)]]
+    assert all(result == results[0] for result in results)
+
+def test_failed_batch_reaches_every_waiter(service, run):
+    async def failing(db, keys):
+        raise RuntimeError("scoring failed")
+    service.recommend_many_async = failing
+
+    async def herd():
+        coalescer = RequestCoalescer(service, AsyncSessionLocal, window=0.005, max_batch=64)
+        return await asyncio.gather(
+            coalescer.recommend(1, 5, None), coalescer.recommend(2, 5, None), return_exceptions=True
+        )
+
+    results = run(herd())
+    assert [str(result) for result in results] == ["scoring failed", "scoring failed"]
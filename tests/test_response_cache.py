@@ -0,0 +1,87 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.core.cache import ResponseCache
+
+def _counting(value):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return value
+    return compute, calls
+
+def _tags(items):
+    return [f"product:{item['product_id']}" for item in items]
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResponseCache()
+    compute, calls = _counting([{"product_id": 1}])
+
+    async def herd():
+        return await asyncio.gather(*[
+            cache.get_or_compute("recommendations", {"user_id": 1}, compute, ttl=60) for _ in range(10)
+        ])
+
+    results = asyncio.run(herd())
+    assert len(calls) == 1
+    assert results == [[{"product_id": 1}]] * 10
+
+def test_tag_invalidation_reaches_every_worker():
+    server = fakeredis.FakeServer()
+    first = ResponseCache(fakeredis.FakeAsyncRedis(server=server))
+    second = ResponseCache(fakeredis.FakeAsyncRedis(server=server), local_size=0)
+    compute, calls = _counting([{"product_id": 7}, {"product_id": 8}])
+    other, other_calls = _counting([{"product_id": 9}])
+
+    async def scenario():
+        await first.get_or_compute("search", {"query": "phone"}, compute, ttl=60, tags=_tags)
+        await first.get_or_compute("search", {"query": "lamp"}, other, ttl=60, tags=_tags)
+        # Served from Redis, not recomputed, by the other worker
+        await second.get_or_compute("search", {"query": "phone"}, compute, ttl=60, tags=_tags)
+        assert len(calls) == 1
+
+        await second.invalidate_tags(["product:8"])
+        first.clear_local()  # Other workers' local tiers only expire
+        await first.get_or_compute("search", {"query": "phone"}, compute, ttl=60, tags=_tags)
+        await first.get_or_compute("search", {"query": "lamp"}, other, ttl=60, tags=_tags)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+    assert len(other_calls) == 1
+
+def test_local_invalidation_drops_only_tagged_entries():
+    cache = ResponseCache()
+    compute, calls = _counting([{"product_id": 1}])
+    other, other_calls = _counting([{"product_id": 2}])
+
+    async def scenario():
+        for _ in range(2):
+            await cache.get_or_compute("recommendations", {"user_id": 1}, compute, ttl=60, tags=_tags)
+            await cache.get_or_compute("recommendations", {"user_id": 2}, other, ttl=60, tags=_tags)
+            await cache.invalidate_tags(["product:1"])
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+    assert len(other_calls) == 1
+
+def test_errors_are_not_cached():
+    cache = ResponseCache()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+        return []
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute("recommendations", {"user_id": 1}, flaky, ttl=60)
+        return await cache.get_or_compute("recommendations", {"user_id": 1}, flaky, ttl=60)
+
+    assert asyncio.run(scenario()) == []
+    assert len(attempts) == 2
@@ -0,0 +1,48 @@
+from app.services import search_index as search_index_module
+from app.services.search_index import SearchIndex
+
+def _index(products):
+    index = SearchIndex()
+    for product_id, (name, description) in products.items():
+        index.add(product_id, name, description)
+    index.ready = True
+    index._synced_at = float("inf")  # Never sync from the (absent) database
+    return index
+
+def test_all_terms_must_match_and_last_one_as_prefix():
+    index = _index({
+        1: ("Red Phone", "slim charger"),
+        2: ("Blue Phone", "fast charger"),
+        3: ("Red Lamp", "desk")
+    })
+
+    def matches(query):
+        return {product_id for product_id, _ in index.search(None, query)}
+
+    assert matches("red") == {1, 3}
+    assert matches("red ph") == {1}
+    assert matches("charg") == {1, 2}
+    assert index.search(None, "red nosuch") == []
+
+def test_prefix_expands_to_the_most_frequent_terms(monkeypatch):
+    monkeypatch.setattr(search_index_module, "PREFIX_EXPANSIONS", 2)
+    index = _index({
+        1: ("cable", ""), 2: ("cable", ""), 3: ("cable", ""),
+        4: ("camera", ""), 5: ("camera", ""),
+        6: ("cap", ""),
+        7: ("ca", "")
+    })
+
+    matched = {product_id for product_id, _ in index.search(None, "ca")}
+
+    # "cap" is the rarest expansion and is dropped; "ca" itself always matches
+    assert matched == {1, 2, 3, 4, 5, 7}
+
+def test_removed_products_stop_matching_and_rows_are_reused():
+    index = _index({1: ("red phone", ""), 2: ("red lamp", "")})
+    index.remove(1)
+    index.add(3, "red cable", "")
+
+    assert {product_id for product_id, _ in index.search(None, "red")} == {2, 3}
+    assert index.search(None, "phone") == []
+    assert index._row_count == 2
@@ -0,0 +1,89 @@
+import pytest
+
+from app.services.category_tree import category_tree
+from app.services.product_search import (
+    MAX_PAGE_SIZE, InvalidSearchRequest, encode_cursor, search_page, stream_search
+)
+
+SORTS = ["relevance", "price_asc", "price_desc", "rating"]
+
+@pytest.fixture
+def stats_index(service, db):
+    service.stats_index.load(db)
+    return service.stats_index
+
+def _all_pages(db, limit, **params):
+    pages, cursor = [], None
+    while True:
+        page, cursor = search_page(db, limit=limit, cursor=cursor, **params)
+        pages.append(page)
+        if cursor is None:
+            return pages
+
+@pytest.mark.parametrize("sort_by", SORTS)
+@pytest.mark.parametrize("query", ["phone", "smart c", None])
+@pytest.mark.parametrize("indexed", [True, False])
+def test_pages_cover_every_match_once_in_order(db, stats_index, sort_by, query, indexed):
+    params = dict(query=query, sort_by=sort_by, stats_index=stats_index if indexed else None)
+    expected = [item["product_id"] for item in stream_search(db, **params)]
+
+    pages = _all_pages(db, 7, **params)
+
+    assert len(expected) > 7
+    assert all(len(page) == 7 for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= 7
+    assert [item["product_id"] for page in pages for item in page] == expected
+    if len(expected) <= MAX_PAGE_SIZE:
+        page, cursor = search_page(db, limit=MAX_PAGE_SIZE, **params)
+        assert [item["product_id"] for item in page] == expected and cursor is None
+
+@pytest.mark.parametrize("sort_by", ["price_asc", "price_desc", "rating"])
+@pytest.mark.parametrize("indexed", [True, False])
+def test_pages_are_sorted_and_filtered(db, stats_index, sort_by, indexed):
+    pages = _all_pages(
+        db, 5, query="phone", category="Category 1", min_price=10, max_price=60,
+        sort_by=sort_by, stats_index=stats_index if indexed else None
+    )
+    items = [item for page in pages for item in page]
+    category_ids = set(category_tree.matching(db, "Category 1"))
+
+    assert items
+    assert all(10 <= item["price"] <= 60 for item in items)
+    assert all(item["category_id"] in category_ids for item in items)
+    if sort_by == "price_asc":
+        keys = [(item["price"], item["product_id"]) for item in items]
+    elif sort_by == "price_desc":
+        keys = [(-item["price"], item["product_id"]) for item in items]
+    else:
+        keys = [(-stats_index.avg_rating[stats_index.positions([item["product_id"]])[0]], item["product_id"])
+                for item in items]
+    assert keys == sorted(keys)
+
+def test_no_matches_is_one_empty_page(db, stats_index):
+    assert search_page(db, "nosuchword", stats_index=stats_index) == ([], None)
+
+def test_cursor_is_tied_to_its_sort_order(db, stats_index):
+    _, cursor = search_page(db, "phone", sort_by="price_asc", limit=3, stats_index=stats_index)
+
+    with pytest.raises(InvalidSearchRequest):
+        search_page(db, "phone", sort_by="price_desc", limit=3, cursor=cursor, stats_index=stats_index)
+    with pytest.raises(InvalidSearchRequest):
+        search_page(db, "phone", sort_by="price_asc", limit=3, cursor="not-a-cursor", stats_index=stats_index)
+
+def test_cursor_resumes_after_its_position(db, stats_index):
+    params = dict(query="phone", sort_by="price_asc", stats_index=stats_index)
+    items = [item for page in _all_pages(db, 50, **params) for item in page]
+    last = items[9]
+
+    page, _ = search_page(db, limit=5, cursor=encode_cursor("price_asc", last["price"], last["product_id"]), **params)
+
+    assert [item["product_id"] for item in page] == [item["product_id"] for item in items[10:15]]
+
+def test_projection_loads_relationships_only_when_expanded(db, stats_index):
+    plain, _ = search_page(db, "phone", limit=3, stats_index=stats_index)
+    expanded, _ = search_page(db, "phone", limit=3, expand=("category", "feedback"), stats_index=stats_index)
+
+    assert plain[0]["category"] is None and plain[0]["feedback"] is None
+    assert [item["product_id"] for item in expanded] == [item["product_id"] for item in plain]
+    assert expanded[0]["category"]["category_id"] == expanded[0]["category_id"]
+    assert isinstance(expanded[0]["feedback"], list)